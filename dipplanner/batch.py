@@ -0,0 +1,138 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Plan many dives, in parallel on several processes.
+
+A dive chain is a list of repetitive dives, in the same form as the dives
+of :class:`dipplanner.parse_cli_args.DipplannerCliArguments`:
+
+    .. code-block:: python
+
+        chain = [{'tanks': {}, 'segments': {}, 'surface_interval': 0},
+                 {'tanks': {}, 'segments': {}, 'surface_interval': 3600}]
+
+The dives of a chain are always calculated sequentially (each one depends
+on the previous one), but independent chains can be calculated on a
+process pool.
+
+Contains:
+plan_chain -- function
+plan_chains -- function
+"""
+import logging
+import copy
+from concurrent.futures import ProcessPoolExecutor
+
+# local imports
+from dipplanner import settings
+from dipplanner.dive import Dive
+from dipplanner.plan_settings import current_settings
+
+LOGGER = logging.getLogger("dipplanner.batch")
+
+
+def plan_chain(chain, plan_settings=None, cache=None):
+    """Calculate the dives of a repetitive dive chain, in order.
+
+    Dive errors do not stop the calculation: they are stored in the
+    dive_exceptions of each dive (see
+    :meth:`dipplanner.dive.Dive.do_dive_without_exceptions`)
+
+    :param list chain: list of dives (dict with 'tanks', 'segments' and
+                       'surface_interval' keys)
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+    :param cache: [OPTIONAL] cache of the already calculated dives. The
+                  dives of the chain are then calculated on copies of the
+                  given tanks and segments, and each dive keeps its own
+                  model (instead of sharing the model of the chain).
+    :type cache: :class:`dipplanner.plan_cache.PlanCache`
+
+    :returns: list of calculated dives
+    :rtype: list of :class:`dipplanner.dive.Dive`
+    """
+    profiles = []
+    previous_dive = None
+    for dive in chain:
+        if cache is not None:
+            previous_dive = cache.plan(dive['segments'].values(),
+                                       dive['tanks'].values(),
+                                       previous_dive,
+                                       dive['surface_interval'],
+                                       plan_settings)
+            profiles.append(previous_dive)
+            continue
+        current_dive = Dive(dive['segments'].values(),
+                            dive['tanks'].values(),
+                            previous_dive,
+                            plan_settings)
+        if dive['surface_interval']:
+            current_dive.do_surface_interval(dive['surface_interval'])
+
+        current_dive.do_dive_without_exceptions()
+        profiles.append(current_dive)
+        previous_dive = current_dive
+    return profiles
+
+
+def _plan_chain_with_settings(arguments):
+    """Calculate a dive chain in a worker process.
+
+    The worker first applies the global settings of the calling process.
+
+    :param tuple arguments: (global settings, dive chain, plan settings)
+
+    :returns: list of calculated dives
+    :rtype: list of :class:`dipplanner.dive.Dive`
+    """
+    global_settings, chain, plan_settings = arguments
+    for name, value in global_settings._asdict().items():
+        setattr(settings, name, value)
+    return plan_chain(chain, plan_settings)
+
+
+def plan_chains(chains, jobs=None, plan_settings=None):
+    """Calculate independent dive chains.
+
+    The chains are calculated on a pool of jobs processes, using the
+    settings of the calling process.
+    The given dives, tanks and segments are not modified: each chain is
+    calculated on its own copy.
+
+    :param list chains: list of dive chains (see :func:`plan_chain`)
+    :param int jobs: number of processes. If None, uses the number of cpus,
+                     if 1, the chains are calculated in this process.
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+
+    :returns: list of the calculated dives of each chain, in the order of
+              chains
+    :rtype: list of list of :class:`dipplanner.dive.Dive`
+    """
+    chains = list(chains)
+    if jobs == 1 or len(chains) <= 1:
+        return [plan_chain(copy.deepcopy(chain), plan_settings)
+                for chain in chains]
+
+    LOGGER.info("planning %s dive chains on %s processes",
+                len(chains), jobs or "all")
+    global_settings = current_settings()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            _plan_chain_with_settings,
+            [(global_settings, chain, plan_settings) for chain in chains]))
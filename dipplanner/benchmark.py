@@ -0,0 +1,356 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Benchmarks of the planning engine.
+
+Times the calculation of representative dives (air, trimix, deep hypoxic
+trimix, CCR, repetitive dives), of the final ascent, of the no flight
+time and of the model primitives.
+
+The results can be saved as JSON and compared to a saved baseline:
+
+    .. code-block:: sh
+
+        python -m dipplanner.benchmark --output baseline.json
+        # ... change the code ...
+        python -m dipplanner.benchmark --baseline baseline.json
+
+The comparison exits with status 1 if a benchmark is slower than the
+baseline by more than the threshold.
+Times depend on the machine: the baseline must be saved on the machine
+running the comparison, so no baseline is shipped with dipplanner.
+
+Contains:
+BENCHMARKS -- dict
+run_benchmark -- function
+run_benchmarks -- function
+compare -- function
+main -- function
+"""
+import gc
+import sys
+import copy
+import json
+import time
+import platform
+import argparse
+from collections import OrderedDict
+
+# local imports
+from dipplanner import settings
+from dipplanner.dive import Dive
+from dipplanner.segment import SegmentDive
+from dipplanner.tank import Tank
+from dipplanner.model.buhlmann.model import Model
+
+
+def _air_tanks():
+    """Tanks of the air dives."""
+    return [Tank(tank_vol=18.0, tank_pressure=200, tank_rule="10b"),
+            Tank(1.0, 0.0, tank_vol=7.0, tank_pressure=200,
+                 tank_rule="10b")]
+
+
+def _trimix_tanks():
+    """Tanks of the normoxic trimix dives."""
+    return [Tank(0.21, 0.30, tank_vol=20.0, tank_pressure=200,
+                 tank_rule="10b"),
+            Tank(0.8, 0.0, tank_vol=7.0, tank_pressure=200,
+                 tank_rule="10b"),
+            Tank(0.5, 0.0, tank_vol=7.0, tank_pressure=200,
+                 tank_rule="10b")]
+
+
+def _hypoxic_tanks():
+    """Tanks of the deep hypoxic trimix dives."""
+    return [Tank(0.10, 0.50, tank_vol=30.0, tank_pressure=200),
+            Tank(0.21, 0.30, tank_vol=24.0, tank_pressure=200),
+            Tank(0.5, 0.0, tank_vol=7.0, tank_pressure=200,
+                 tank_rule="10b"),
+            Tank(1.0, 0.0, tank_vol=7.0, tank_pressure=200,
+                 tank_rule="10b")]
+
+
+def _ccr_tanks():
+    """Tanks of the CCR dives."""
+    return [Tank(tank_vol=3.0, tank_pressure=200, tank_rule='10b')]
+
+
+def _oxygen_tank():
+    """Oxygen tank, used to accelerate the no flight time."""
+    return Tank(1.0, 0.0, tank_vol=7.0, tank_pressure=200)
+
+
+def _dive(tanks, levels, setpoint=0.0, previous=None):
+    """Build a dive on the first tank.
+
+    :param list tanks: tanks of the dive
+    :param list levels: list of (depth in meter, time in minutes)
+    :param float setpoint: setpoint of the segments
+    :param previous: previous dive, for repetitive dives
+    :type previous: :class:`dipplanner.dive.Dive`
+
+    :returns: the dive, not calculated yet
+    :rtype: :class:`dipplanner.dive.Dive`
+    """
+    return Dive([SegmentDive(depth, minutes * 60, tanks[0], setpoint)
+                 for depth, minutes in levels], tanks, previous)
+
+
+def _do_dive(tanks_factory, levels, setpoint=0.0):
+    """Benchmark of a full dive.
+
+    :returns: function calculating the dive
+    """
+    dive = _dive(tanks_factory(), levels, setpoint)
+    return dive.do_dive
+
+
+def _do_repetitive_dive():
+    """Benchmark of the second dive of a repetitive dive."""
+    first = _dive(_air_tanks(), [(40, 20)])
+    first.do_dive()
+    second = _dive(_air_tanks(), [(30, 25)], previous=first)
+
+    def repetitive_dive():
+        """surface interval, then second dive."""
+        second.do_surface_interval(90 * 60)
+        second.do_dive()
+    return repetitive_dive
+
+
+def _ascend(tanks_factory, levels):
+    """Benchmark of the final ascent of a dive."""
+    dive = _dive(tanks_factory(), levels)
+    dive.do_dive_segments()
+    dive.in_final_ascent = True
+    return lambda: dive.ascend(0.0)
+
+
+def _no_flight_time(tanks_factory, levels, tank=None):
+    """Benchmark of the no flight time after a dive."""
+    dive = _dive(tanks_factory(), levels)
+    dive.do_dive()
+    if tank is not None:
+        tank = tank()
+    return lambda: dive.no_flight_time(tank=tank, exact=True)
+
+
+def _model(method, *args):
+    """Benchmark of a primitive of the model, on a loaded model."""
+    model = Model()
+    model.const_depth(4.0, 25 * 60, 0.0, 0.79, 0.0)
+    return lambda: getattr(model, method)(*args)
+
+
+def _model_copy():
+    """Benchmark of the copy of a model."""
+    model = Model()
+    return lambda: copy.deepcopy(model)
+
+
+def _model_restore():
+    """Benchmark of the restore of a model snapshot."""
+    model = Model()
+    snapshot = model.snapshot()
+    return lambda: model.restore(snapshot)
+
+
+#: benchmarks: name -> (setup function, arguments of the setup function)
+#: the setup function returns the function to be timed.
+BENCHMARKS = OrderedDict([
+    ('do_dive.air', (_do_dive, (_air_tanks, [(30, 25)]))),
+    ('do_dive.air_deco', (_do_dive, (_air_tanks, [(50, 30)]))),
+    ('do_dive.air_multilevel', (_do_dive, (_air_tanks,
+                                           [(40, 10), (30, 10), (20, 10)]))),
+    ('do_dive.trimix', (_do_dive, (_trimix_tanks, [(60, 30)]))),
+    ('do_dive.hypoxic_trimix', (_do_dive, (_hypoxic_tanks, [(100, 25)]))),
+    ('do_dive.ccr', (_do_dive, (_ccr_tanks, [(40, 40)], 1.2))),
+    ('do_dive.repetitive', (_do_repetitive_dive, ())),
+    ('ascend.air', (_ascend, (_air_tanks, [(50, 30)]))),
+    ('ascend.hypoxic_trimix', (_ascend, (_hypoxic_tanks, [(100, 25)]))),
+    ('no_flight_time.air', (_no_flight_time, (_air_tanks, [(50, 40)]))),
+    ('no_flight_time.oxygen', (_no_flight_time, (_air_tanks, [(50, 40)],
+                                                 _oxygen_tank))),
+    ('model.const_depth', (_model, ('const_depth', 3.0, 60, 0.0, 0.79,
+                                    0.0))),
+    ('model.asc_desc', (_model, ('asc_desc', 3.0, 0.0, -1.0, 0.0, 0.79,
+                                 0.0))),
+    ('model.ceiling', (_model, ('ceiling', ))),
+    ('model.stop_time', (_model, ('stop_time', 0.6, 0.0, 0.79, 0.0, 3.0,
+                                  1, 300000))),
+    ('model.copy', (_model_copy, ())),
+    ('model.snapshot', (_model, ('snapshot', ))),
+    ('model.restore', (_model_restore, ())),
+])
+
+
+def _time_run(name, number):
+    """Time number calls of a benchmark.
+
+    The model primitives are called number times on the same model, the
+    other benchmarks are prepared number times (a dive is calculated only
+    once).
+
+    :param str name: name of the benchmark (key of :data:`BENCHMARKS`)
+    :param int number: number of calls
+
+    :returns: time of all the calls, in seconds
+    :rtype: float
+    """
+    setup, arguments = BENCHMARKS[name]
+    if name.startswith('model.'):
+        functions = [setup(*arguments)] * number
+    else:
+        functions = [setup(*arguments) for _ in range(number)]
+    # like timeit: the garbage collector does not run during the timing
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for function in functions:
+            function()
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def run_benchmark(name, repeat=10, min_time=0.02):
+    """Time one benchmark.
+
+    The number of calls in each run is chosen so that a run lasts at least
+    min_time. A first run (not timed) warms up the caches.
+
+    :param str name: name of the benchmark (key of :data:`BENCHMARKS`)
+    :param int repeat: number of runs
+    :param float min_time: minimum duration of a run, in seconds
+
+    :returns: {'min': best time, 'median': median time, 'number': number
+              of calls by run}. The times are in seconds, for one call
+    :rtype: dict
+    """
+    number = 1
+    while _time_run(name, number) < min_time:
+        number *= 2
+    times = sorted(_time_run(name, number) / number for _ in range(repeat))
+    return {'min': times[0],
+            'median': times[len(times) // 2],
+            'number': number}
+
+
+def run_benchmarks(names=None, repeat=10):
+    """Time several benchmarks.
+
+    :param list names: names of the benchmarks (default: all)
+    :param int repeat: number of runs of each benchmark
+
+    :returns: results, with the python and dipplanner versions
+    :rtype: dict
+    """
+    if names is None:
+        names = list(BENCHMARKS.keys())
+    return {'version': settings.__VERSION__,
+            'python': platform.python_version(),
+            'benchmarks': OrderedDict(
+                (name, run_benchmark(name, repeat)) for name in names)}
+
+
+def compare(results, baseline, threshold=0.2):
+    """Compare results to a baseline.
+
+    Benchmarks are compared on their best time.
+
+    :param dict results: results of :func:`run_benchmarks`
+    :param dict baseline: results of :func:`run_benchmarks`
+    :param float threshold: tolerated slow down (0.2: 20% slower)
+
+    :returns: list of (name, baseline time, time, ratio, regression)
+              for the benchmarks in both results
+    :rtype: list of tuple
+    """
+    comparison = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        base_time = baseline['benchmarks'][name]['min']
+        ratio = result['min'] / base_time
+        comparison.append((name, base_time, result['min'], ratio,
+                           ratio > 1.0 + threshold))
+    return comparison
+
+
+def main(cli_arguments=None):
+    """Run the benchmarks from the command line.
+
+    :param list cli_arguments: list of arguments, like sys.argv
+
+    :returns: 1 if a benchmark is slower than the baseline, else 0
+    :rtype: int
+    """
+    if cli_arguments is None:
+        cli_arguments = sys.argv
+    parser = argparse.ArgumentParser(
+        prog="python -m dipplanner.benchmark",
+        description="Benchmarks of the dipplanner planning engine")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="number of runs of each benchmark")
+    parser.add_argument("--output", metavar="FILE",
+                        help="save the results in this JSON file")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="tolerated slow down, default: 0.2 (20%%)")
+    parser.add_argument("--list", action="store_true",
+                        help="list the benchmarks")
+    args = parser.parse_args(cli_arguments[1:])
+
+    if args.list:
+        print("\n".join(BENCHMARKS.keys()))
+        return 0
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error("unknown benchmark(s): %s" % ", ".join(unknown))
+
+    results = run_benchmarks(args.names or None, args.repeat)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline is None:
+        for name, result in results['benchmarks'].items():
+            print("%-28s %12.1f us" % (name, result['min'] * 1e6))
+        return 0
+
+    with open(args.baseline, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    status = 0
+    for name, base_time, new_time, ratio, regression in compare(
+            results, baseline, args.threshold):
+        print("%-28s %12.1f us %12.1f us %6.2fx%s" % (
+            name, base_time * 1e6, new_time * 1e6, ratio,
+            "  REGRESSION" if regression else ""))
+        if regression:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
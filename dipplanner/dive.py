@@ -24,16 +24,18 @@ previous dive in order to calculate the next one.
 """
 import logging
 import copy
-# dependencies imports
-from jinja2 import Environment, PackageLoader
+import itertools
+import math
+from collections import namedtuple
 
 # local imports
-from dipplanner import settings
+from dipplanner.plan_settings import PlanSettingsMixin
 from dipplanner.dipp_exception import DipplannerException
 from dipplanner.model.buhlmann.model_exceptions import ModelException
 from dipplanner.tank import Tank
 from dipplanner.segment import SegmentDive, SegmentDeco, SegmentAscDesc
 from dipplanner.model.buhlmann.model import Model as BuhlmannModel
+from dipplanner.templating import render
 
 from dipplanner.tools import calculate_pp_h2o_surf
 from dipplanner.tools import depth_to_pressure
@@ -97,7 +99,41 @@ class InfiniteDeco(DipplannerException):
             "Raising an exception: InfiniteDeco ! (%s)", description)
 
 
-class Dive():
+#: state of a dive after one of its input segments (see
+#: :meth:`Dive.replan`):
+#: model: snapshot of the model (see
+#: :meth:`dipplanner.model.buhlmann.model.Model.snapshot`)
+#: run_time, current_depth, current_tank, pp_o2, metadata: same as the
+#: attributes of the dive
+#: run_time_flag: True if the next segment time is still a run time (see
+#: settings.RUN_TIME)
+#: nb_output_segments: number of output segments
+#: tanks: tanks of the dive, in their order during the dive
+DiveCheckpoint = namedtuple('DiveCheckpoint',
+                            ('model', 'run_time', 'current_depth',
+                             'current_tank', 'pp_o2', 'run_time_flag',
+                             'metadata', 'nb_output_segments', 'tanks'))
+
+
+def _same_input_segment(segment, other):
+    """Return True if two input segments give the same dive.
+
+    :param segment: input segment
+    :type segment: :class:`dipplanner.segment.Segment`
+    :param other: other input segment
+    :type other: :class:`dipplanner.segment.Segment`
+
+    :returns: True if the segments are the same
+    :rtype: bool
+    """
+    return (segment is other or
+            (segment.type == other.type and segment.depth == other.depth and
+             segment.time == other.time and segment.tank is other.tank and
+             segment.setpoint == other.setpoint and
+             segment.plan_settings == other.plan_settings))
+
+
+class Dive(PlanSettingsMixin):
     """Conducts dive based on inputSegments, knownGases, and an existing model.
 
     Iterates through dive segments updating the Model. When all
@@ -132,9 +168,13 @@ class Dive():
     * surface_interval -- for surf. int. in seconds
     * no_flight_time_value -- calculated no flight time
     * metadata -- description for the dive
+    * plan_settings -- settings of the plan, or None for the global settings
+    * checkpoints -- (list) state of the dive after each processed input
+      segment (:class:`DiveCheckpoint`), used by :meth:`replan`
     """
 
-    def __init__(self, known_segments, known_tanks, previous_profile=None):
+    def __init__(self, known_segments, known_tanks, previous_profile=None,
+                 plan_settings=None):
         """Init for Dive class.
 
         For fist dive, instanciate the profile class with no model
@@ -147,6 +187,9 @@ class Dive():
         :type known_tanks: list of :class:`dipplanner.tank.Tank`
         :param previous_profile: model object of the precedent dive
         :type previous_profile: :class:`dipplanner.model`
+        :param plan_settings: settings of the plan (default: the settings of
+                              the previous profile, or the global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
         .. note:: the initialisation should not fail. If something if wrong, it
                   MUST still instantiate itself, with errors in his own object
@@ -158,11 +201,16 @@ class Dive():
         # initiate dive exception list
         self.dive_exceptions = []
 
+        if plan_settings is None and previous_profile is not None:
+            plan_settings = previous_profile.plan_settings
+        self.plan_settings = plan_settings
+
         if previous_profile is None:
             # new dive : new model
             self.is_repetitive_dive = False
             try:
-                self.model = BuhlmannModel()  # buhlman model by default
+                # buhlman model by default
+                self.model = BuhlmannModel(self.plan_settings)
             except DipplannerException as exc:
                 self.dive_exceptions.append(
                     InstanciationError(
@@ -213,6 +261,12 @@ class Dive():
         self.in_final_ascent = False
         self.run_time = 0  # in second
         self.metadata = ""
+        self.checkpoints = []
+        # state before the first input segment, see replan
+        self._start_state = None
+        # tanks of the output segments before their copy at the end of
+        # the dive, in the order of self.tanks, see segment_tank_indexes
+        self._segment_tanks = None
 
     def __repr__(self):
         """Return a str representing the result of the dive.
@@ -260,16 +314,9 @@ class Dive():
                   using the choosen template
         :rtype: str
         """
-        env = Environment(loader=PackageLoader('dipplanner', 'templates'))
         if template is None:
-            tpl = env.get_template(settings.TEMPLATE)
-        else:
-            tpl = env.get_template(template)
-        # pylint: disable=no-member
-        text = tpl.render(settings=settings,
-                          dives=[self, ])
-        # pylint: enable=no-member
-        return text
+            template = self.settings.TEMPLATE
+        return render(template, self.settings, [self, ])
 
     def do_surface_interval(self, time):
         """Conduct a surface interval.
@@ -287,7 +334,7 @@ class Dive():
 
         self.surface_interval = time
 
-        if settings.AUTOMATIC_TANK_REFILL:
+        if self.settings.AUTOMATIC_TANK_REFILL:
             self.refill_tanks()
 
     def get_surface_interval(self):
@@ -335,6 +382,32 @@ class Dive():
     def do_dive(self):
         """Process the dive.
 
+        :raises NothingToProcess: if there is no input segment to process
+        :raises ModelException: <Exceptions from model>
+        """
+        self.do_dive_segments()
+        self.do_final_ascent()
+
+    def do_dive_segments(self):
+        """Process the input segments of the dive, without the final ascent.
+
+        After this call, the dive is at the depth of the last input segment,
+        and :meth:`do_final_ascent` terminates the dive.
+
+        :raises NothingToProcess: if there is no input segment to process
+        :raises ModelException: <Exceptions from model>
+        """
+        for _ in self._dive_segments_steps():
+            pass
+
+    def _dive_segments_steps(self):
+        """Process the input segments of the dive, without the final ascent.
+
+        see :meth:`do_dive_segments`
+
+        :returns: each output segment, as soon as it is calculated
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+
         :raises NothingToProcess: if there is no input segment to process
         :raises ModelException: <Exceptions from model>
         """
@@ -345,7 +418,12 @@ class Dive():
         for seg in self.input_segments:
             seg.check()
 
-        run_time_flag = settings.RUN_TIME
+        run_time_flag = self.settings.RUN_TIME
+        self._start_state = (self.model.snapshot(), self.metadata,
+                             list(self.input_segments), list(self.tanks),
+                             [(tank.used_gas, tank.remaining_gas)
+                              for tank in self.tanks])
+        self.checkpoints = []
 
         # sets initial state
         #
@@ -383,7 +461,7 @@ class Dive():
                     if (tank.mod >= self.input_segments[0].depth and
                             tank.get_end_for_given_depth(
                                 self.input_segments[0].depth) <
-                            settings.DEFAULT_MAX_END):
+                            self.settings.DEFAULT_MAX_END):
                         # ok we have a winner
                         self.logger.info(
                             "Changed tank for descent to:%s", str(tank))
@@ -405,56 +483,77 @@ class Dive():
                             tank.get_end_for_given_depth(
                                 self.input_segments[0].depth))
 
-                        if settings.TRAVEL_SWITCH == 'late':
+                        if self.settings.TRAVEL_SWITCH == 'late':
                             depth = min(tank.mod, tank.get_mod_for_given_end(
-                                settings.DEFAULT_MAX_END))
+                                self.settings.DEFAULT_MAX_END))
                             self.input_segments.insert(0, SegmentDive(
                                 depth=depth,
                                 tank=self.input_segments[0].tank,
-                                time=0))
+                                time=0, plan_settings=self.plan_settings))
                             self.input_segments.insert(0, SegmentDive(
-                                depth=depth, tank=tank, time=0))
+                                depth=depth, tank=tank, time=0,
+                                plan_settings=self.plan_settings))
                             self.current_tank = tank
                             break
                         else:  # early
                             depth = self.input_segments[0].tank.get_min_od(
-                                min_ppo2=settings.DEFAULT_MIN_PPO2)
+                                min_ppo2=self.settings.DEFAULT_MIN_PPO2)
                             self.input_segments.insert(0, SegmentDive(
                                 depth=depth,
                                 tank=self.input_segments[0].tank,
-                                time=0))
+                                time=0, plan_settings=self.plan_settings))
                             self.input_segments.insert(0, SegmentDive(
-                                depth=depth, tank=tank, time=0))
+                                depth=depth, tank=tank, time=0,
+                                plan_settings=self.plan_settings))
                             self.current_tank = tank
                             break
         self.tanks.sort()
-        for seg in self.input_segments:
+        yield from self._input_segments_steps(0, run_time_flag)
+
+    def _input_segments_steps(self, start, run_time_flag):
+        """Process the input segments, from one of them.
+
+        A checkpoint of the dive is saved after each input segment.
+
+        :param int start: index of the first input segment to process
+        :param bool run_time_flag: True if the time of the next segment is
+                                   a run time (see settings.RUN_TIME)
+
+        :returns: each output segment, as soon as it is calculated
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+
+        :raises ModelException: <Exceptions from model>
+        """
+        for seg in self.input_segments[start:]:
             if seg.type == 'const':  # only dive segment allowed for input
                 delta_depth = float(seg.depth) - float(self.current_depth)
                 # Ascend or descend to dive segment,
                 # using existing gas and ppO2 settings
                 if delta_depth > 0.0:  # descent
-                    self.model.asc_desc(depth_to_pressure(self.current_depth),
-                                        depth_to_pressure(seg.depth),
-                                        settings.DESCENT_RATE,
-                                        self.current_tank.f_he,
-                                        self.current_tank.f_n2,
-                                        self.pp_o2)
+                    self.model.asc_desc(
+                        self._depth_to_pressure(self.current_depth),
+                        self._depth_to_pressure(seg.depth),
+                        self.settings.DESCENT_RATE,
+                        self.current_tank.f_he,
+                        self.current_tank.f_n2,
+                        self.pp_o2)
                     self.output_segments.append(
                         SegmentAscDesc(self.current_depth,
                                        seg.depth,
-                                       settings.DESCENT_RATE,
+                                       self.settings.DESCENT_RATE,
                                        self.current_tank,
-                                       self.pp_o2))
+                                       self.pp_o2,
+                                       plan_settings=self.plan_settings))
+                    yield self.output_segments[-1]
                     self.run_time += abs(float(delta_depth) /
-                                         (float(settings.DESCENT_RATE)))
+                                         (float(self.settings.DESCENT_RATE)))
                     self.logger.debug("descent time : %ss",
                                       float(delta_depth) /
-                                      settings.DESCENT_RATE)
+                                      self.settings.DESCENT_RATE)
                 else:  # ascent
                     # call ascend method of this class
                     # for decompression calculation
-                    self.ascend(seg.depth)
+                    yield from self._ascend_steps(seg.depth)
 
                 # we are now at the desired depth : process the dive segment
                 self.current_depth = seg.depth  # new depth
@@ -463,16 +562,19 @@ class Dive():
                 if seg.time > 0:  # only do this if it's not a waypoint
                     if run_time_flag:
                         run_time_flag = False  # do this one only
-                        self.model.const_depth(depth_to_pressure(seg.depth),
-                                               seg.time - self.run_time,
-                                               self.current_tank.f_he,
-                                               self.current_tank.f_n2,
-                                               self.pp_o2)
+                        self.model.const_depth(
+                            self._depth_to_pressure(seg.depth),
+                            seg.time - self.run_time,
+                            self.current_tank.f_he,
+                            self.current_tank.f_n2,
+                            self.pp_o2)
                         self.output_segments.append(
                             SegmentDive(seg.depth,
                                         seg.time - self.run_time,
                                         self.current_tank,
-                                        self.pp_o2))
+                                        self.pp_o2,
+                                        plan_settings=self.plan_settings))
+                        yield self.output_segments[-1]
                         self.metadata += "Dive to %s for %ss\n" % (
                             seg.depth, seg.time - self.run_time)
                         self.logger.debug("Dive to %s for %ss",
@@ -484,16 +586,19 @@ class Dive():
                         self.logger.debug(
                             "update run time : %ss", self.run_time)
                     else:
-                        self.model.const_depth(depth_to_pressure(seg.depth),
-                                               seg.time,
-                                               self.current_tank.f_he,
-                                               self.current_tank.f_n2,
-                                               self.pp_o2)
+                        self.model.const_depth(
+                            self._depth_to_pressure(seg.depth),
+                            seg.time,
+                            self.current_tank.f_he,
+                            self.current_tank.f_n2,
+                            self.pp_o2)
                         self.output_segments.append(
                             SegmentDive(seg.depth,
                                         seg.time,
                                         self.current_tank,
-                                        self.pp_o2))
+                                        self.pp_o2,
+                                        plan_settings=self.plan_settings))
+                        yield self.output_segments[-1]
                         self.metadata += "Dive to %s for %ss\n" % (seg.depth,
                                                                    seg.time)
                         self.logger.debug("Dive to %s for %ss",
@@ -506,8 +611,150 @@ class Dive():
                         SegmentDive(seg.depth,
                                     seg.time,
                                     self.current_tank,
-                                    self.pp_o2))
+                                    self.pp_o2,
+                                    plan_settings=self.plan_settings))
+                    yield self.output_segments[-1]
+            self.checkpoints.append(DiveCheckpoint(
+                self.model.snapshot(), self.run_time, self.current_depth,
+                self.current_tank, self.pp_o2, run_time_flag, self.metadata,
+                len(self.output_segments), list(self.tanks)))
+
+    def extend_last_segment(self, seg_time):
+        """Stay longer at the depth of the last input segment.
+
+        Can only be used after :meth:`do_dive_segments` and before
+        :meth:`do_final_ascent`: the dive is then the same as if the
+        last input segment was seg_time longer.
+
+        :param float seg_time: additional time (in seconds)
+
+        :raises ProcessingError: if the last input segment is a waypoint
+        """
+        seg = self.input_segments[-1]
+        last_output = self.output_segments[-1]
+        if seg.time <= 0 or last_output.type != 'const':
+            raise ProcessingError("can not extend a waypoint")
+        self.model.const_depth(self._depth_to_pressure(seg.depth),
+                               seg_time,
+                               self.current_tank.f_he,
+                               self.current_tank.f_n2,
+                               self.pp_o2)
+        last_line = "Dive to %s for %ss\n" % (seg.depth, last_output.time)
+        if self.metadata.endswith(last_line):
+            self.metadata = self.metadata[:-len(last_line)]
+        self.metadata += "Dive to %s for %ss\n" % (
+            seg.depth, last_output.time + seg_time)
+        self.output_segments[-1] = SegmentDive(
+            seg.depth, last_output.time + seg_time, self.current_tank,
+            self.pp_o2, plan_settings=self.plan_settings)
+        seg.time += seg_time
+        self.run_time += seg_time
+        if len(self.checkpoints) == len(self.input_segments):
+            self.checkpoints[-1] = self.checkpoints[-1]._replace(
+                model=self.model.snapshot(), run_time=self.run_time,
+                metadata=self.metadata,
+                nb_output_segments=len(self.output_segments))
+        self.logger.debug("extend last segment by %ss", seg_time)
+
+    def replan(self, known_segments):
+        """Calculate the dive again, with other input segments.
+
+        The dive is not calculated again from the surface: it restarts
+        from the checkpoint of the last input segment which is the same
+        as before (same type, depth, time, tank object, setpoint and
+        settings), with the model, run time, tanks and output segments of
+        this checkpoint. Only the changed input segments and the final
+        ascent are calculated. The result is the same as a new dive
+        calculated with these input segments.
+
+        The gas consumption of the tanks is calculated again from the
+        start of the dive (see :meth:`do_gas_calcs`).
+
+            .. code-block:: python
+
+                dive.do_dive()
+                segments[-1] = SegmentDive(30, 10 * 60, tank)
+                dive.replan(segments)
+
+        :param known_segments: new input segments of the dive, using the
+                               tanks of the dive
+        :type known_segments: list of :class:`dipplanner.segment.Segment`
+
+        :returns: number of input segments which are not calculated again
+        :rtype: int
 
+        :raises NothingToProcess: if there is no input segment to process
+        :raises ModelException: <Exceptions from model>
+        """
+        segments = [segment for segment in known_segments if segment.in_use]
+        if self._start_state is None:
+            # the dive was never calculated
+            self.input_segments = segments
+            self.do_dive()
+            return 0
+        (model, metadata, planned_segments, tanks,
+         tanks_gas) = self._start_state
+        # travel segments added at the start of the dive
+        added = len(self.input_segments) - len(planned_segments)
+        unchanged = 0
+        for segment, planned_segment in zip(segments, planned_segments):
+            if not _same_input_segment(segment, planned_segment):
+                break
+            unchanged += 1
+        unchanged = min(unchanged, len(self.checkpoints) - added)
+
+        # back to the start of the dive
+        self.tanks = list(tanks)
+        self._segment_tanks = None
+        for tank, (used_gas, remaining_gas) in zip(tanks, tanks_gas):
+            tank.used_gas = used_gas
+            tank.remaining_gas = remaining_gas
+        self.in_final_ascent = False
+        self.no_flight_time_value = None
+        self.full_desat_time_value = None
+        if unchanged <= 0:
+            self.logger.debug("replan the whole dive")
+            self.model.restore(model)
+            self.metadata = metadata
+            self.input_segments = segments
+            self.output_segments = []
+            self.run_time = 0
+            self.do_dive()
+            return 0
+
+        self.logger.debug("replan the dive after %s input segments",
+                          unchanged)
+        for segment in segments[unchanged:]:
+            segment.check()
+        checkpoint = self.checkpoints[added + unchanged - 1]
+        del self.checkpoints[added + unchanged:]
+        self._start_state = (model, metadata,
+                             planned_segments[:unchanged] +
+                             segments[unchanged:], tanks, tanks_gas)
+        self.input_segments = (self.input_segments[:added + unchanged] +
+                               segments[unchanged:])
+        self.model.restore(checkpoint.model)
+        self.run_time = checkpoint.run_time
+        self.current_depth = checkpoint.current_depth
+        self.current_tank = checkpoint.current_tank
+        self.pp_o2 = checkpoint.pp_o2
+        self.metadata = checkpoint.metadata
+        self.tanks = list(checkpoint.tanks)
+        del self.output_segments[checkpoint.nb_output_segments:]
+        for _ in self._input_segments_steps(added + unchanged,
+                                            checkpoint.run_time_flag):
+            pass
+        self.do_final_ascent()
+        return unchanged
+
+    def do_final_ascent(self):
+        """Ascend to the surface and terminate the dive.
+
+        Calculate the run time of each output segment and the gas
+        consumption.
+
+        :raises ModelException: <Exceptions from model>
+        """
         # all input segment are now processed: process to ascend to the surface
         self.in_final_ascent = True
         # ascend to the surface
@@ -517,6 +764,26 @@ class Dive():
         for output_seg in self.output_segments:
             total_time += output_seg.time
             output_seg.run_time = total_time
+        # recalculate the gas consumptions
+        self.do_gas_calcs()
+        self._end_dive(total_time)
+
+    def _final_ascent_steps(self):
+        """Ascend to the surface.
+
+        :returns: each output segment, as soon as it is calculated
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+
+        :raises ModelException: <Exceptions from model>
+        """
+        self.in_final_ascent = True
+        yield from self._ascend_steps(0.0)
+
+    def _end_dive(self, total_time):
+        """Terminate the dive, after its final ascent and gas calculations.
+
+        :param float total_time: sum of the time of all output segments
+        """
         if total_time != self.run_time:
             self.logger.warning("dive run_time (%ss) differs from"
                                 " all segments time (%ss)",
@@ -524,16 +791,75 @@ class Dive():
 
         # write metadata into the model
         self.model.metadata = self.metadata
-        # recalculate the gas consumptions
-        self.do_gas_calcs()
         # save the tanks parameters : next dives may use the same tanks,
         # but we need here to duplicate tank object within this dive in
         # order to save the tank parameters for this dive only
         saved_tanks = []
         for tank in self.tanks:
             saved_tanks.append(copy.deepcopy(tank))
+        self._segment_tanks = self.tanks
         self.tanks = saved_tanks
 
+    def iter_dive(self):
+        """Process the dive, segment by segment.
+
+        Same dive as :meth:`do_dive`, but each output segment is returned
+        as soon as it is calculated, with its run time set and its gas
+        already consumed in its tank: the output can be used (or the
+        dive stopped) before the end of the plan.
+
+        The dive is terminated (like after :meth:`do_dive`) only when
+        all the segments have been returned: if the iteration is stopped
+        before, the dive stays unfinished.
+
+            .. code-block:: python
+
+                for segment in dive.iter_dive():
+                    if segment.run_time > 90 * 60:
+                        break
+
+        :returns: each output segment, in order
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+
+        :raises NothingToProcess: if there is no input segment to process
+        :raises ModelException: <Exceptions from model>
+        """
+        return self._iter_segments(itertools.chain(
+            self._dive_segments_steps(), self._final_ascent_steps()))
+
+    def iter_final_ascent(self):
+        """Ascend to the surface and terminate the dive, segment by segment.
+
+        Same as :meth:`do_final_ascent` (after :meth:`do_dive_segments`),
+        but the output segments are returned like in :meth:`iter_dive`:
+        first the segments already calculated, then each segment of the
+        final ascent.
+
+        :returns: each output segment, in order
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+
+        :raises ModelException: <Exceptions from model>
+        """
+        return self._iter_segments(itertools.chain(
+            list(self.output_segments), self._final_ascent_steps()))
+
+    def _iter_segments(self, segments):
+        """Set the run time and consume the gas of each new segment.
+
+        :param segments: output segments, as they are calculated
+        :type segments: iterable of :class:`dipplanner.segment.Segment`
+
+        :returns: each output segment, in order
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+        """
+        total_time = 0
+        for segment in segments:
+            total_time += segment.time
+            segment.run_time = total_time
+            segment.tank.consume_gas(segment.gas_used)
+            yield segment
+        self._end_dive(total_time)
+
     def get_no_flight_hhmmss(self):
         """Return no flight time (if calculated) in hhmmss format.
 
@@ -555,14 +881,15 @@ class Dive():
             return ""
 
     def no_flight_time_wo_exception(self,
-                                    altitude=settings.FLIGHT_ALTITUDE,
-                                    tank=None):
+                                    altitude=None,
+                                    tank=None, exact=False):
         """Call no_flight_time, and handle exceptions internally.
 
         do not raise any "dive related" exception: add the
         exception inside self.dive_exceptions instead.
 
         :param int altitude: in meter : altitude used for the calculation
+                             (default: settings.FLIGHT_ALTITUDE)
         :param float flight_ascent_rate: in m/s
         :param tank: [optionnal]
                      it is possible to provide a tank while calling
@@ -571,12 +898,14 @@ class Dive():
                      In this case, we will 'consume' the tank
                      When the tank is empty, it automatically switch to air
         :type tank: :class:`dipplanner.tank.Tank`
+        :param bool exact: if True, the result is rounded up to the second
+                           instead of the minute
 
         :returns: no fight time in seconds
         :rtype: int
         """
         try:
-            result = self.no_flight_time(altitude, tank)
+            result = self.no_flight_time(altitude, tank, exact)
         except DipplannerException as exc:
             self.dive_exceptions.append(exc)
         except Exception as exc:  # unknown generic exception
@@ -585,15 +914,19 @@ class Dive():
         else:
             return result
 
-    def no_flight_time(self, altitude=settings.FLIGHT_ALTITUDE, tank=None):
+    def no_flight_time(self, altitude=None, tank=None, exact=False):
         """Evaluate the no flight time.
 
         by 'ascending' to the choosen flight altitude.
         Ascending will generate the necessary 'stop' at the current depth
         (which is 0m) .
-        The stop time represents the no flight time
+        The stop time represents the no flight time.
+        The stop time on air is solved per compartment
+        (see :meth:`dipplanner.model.buhlmann.model.Model.time_to_ceiling`)
+        instead of stepping the model.
 
         :param int altitude: in meter : altitude used for the calculation
+                             (default: settings.FLIGHT_ALTITUDE)
         :param float flight_ascent_rate: in m/ms
         :param tank: (optionnal)
                     it is possible to provide a tank while calling
@@ -602,6 +935,8 @@ class Dive():
                     In this case, we will 'consume' the tank
                     When the tank is empty, it automatically switch to air
         :type tank: :class:`dipplanner.tank.Tank`
+        :param bool exact: if True, the result is rounded up to the second
+                           instead of the minute
 
         :returns: no fight time in seconds
         :rtype: int
@@ -609,14 +944,16 @@ class Dive():
         :raises InfiniteDeco: if the no flight time can not achieve enough
                               decompression to be able to go to give altitude
         """
+        if altitude is None:
+            altitude = self.settings.FLIGHT_ALTITUDE
         no_flight_time = 0
         deco_uses_tank = False  # set to true when deco is using a tank
         # need to change gaz to air:
         # create a 'dummy' air tank
         no_flight_air_tank = Tank(
-            tank_vol=settings.ABSOLUTE_MAX_TANK_SIZE,
-            tank_pressure=settings.ABSOLUTE_MAX_TANK_PRESSURE,
-            tank_rule="30b")
+            tank_vol=self.settings.ABSOLUTE_MAX_TANK_SIZE,
+            tank_pressure=self.settings.ABSOLUTE_MAX_TANK_PRESSURE,
+            tank_rule="30b", plan_settings=self.plan_settings)
 
         if tank is not None:
             no_flight_tank = tank
@@ -626,23 +963,27 @@ class Dive():
         else:
             no_flight_tank = no_flight_air_tank
 
-        next_stop_pressure = altitude_or_depth_to_absolute_pressure(altitude)
+        next_stop_pressure = altitude_or_depth_to_absolute_pressure(
+            altitude, plan_settings=self.plan_settings)
         # bigger stop time to speed up calculation
         # (precision is not necesary here)
         stop_time = 60  # in second -
 
-        model_copy = copy.deepcopy(self.model)
-        model_ceiling = model_copy.ceiling_in_pabs()
-        while model_ceiling > next_stop_pressure:
-            # loop for "deco" calculation based on the new ceiling
-            model_copy.const_depth(0.0,
-                                   stop_time,
-                                   no_flight_tank.f_he,  # f_he
-                                   no_flight_tank.f_n2,  # f_n2
-                                   0.0)  # ppo2 (for cc)
-            no_flight_time += stop_time
-            model_ceiling = model_copy.ceiling_in_pabs()
-            if deco_uses_tank:
+        # the tank is consumed minute by minute: step the model until
+        # the tank is empty, the remaining time is solved below.
+        # The model is restored at the end.
+        snapshot = self.model.snapshot()
+        try:
+            model_ceiling = self.model.ceiling_in_pabs()
+            while deco_uses_tank and model_ceiling > next_stop_pressure:
+                # loop for "deco" calculation based on the new ceiling
+                self.model.const_depth(0.0,
+                                       stop_time,
+                                       no_flight_tank.f_he,  # f_he
+                                       no_flight_tank.f_n2,  # f_n2
+                                       0.0)  # ppo2 (for cc)
+                no_flight_time += stop_time
+                model_ceiling = self.model.ceiling_in_pabs()
                 if no_flight_tank.remaining_gas <= 0:
                     no_flight_tank = no_flight_air_tank
                     deco_uses_tank = False
@@ -652,13 +993,41 @@ class Dive():
                                      no_flight_time)
                 else:
                     no_flight_tank.consume_gas(
-                        settings.DECO_CONSUMPTION_RATE * stop_time)
-            if no_flight_time > 300000:
-                raise InfiniteDeco("Infinite deco error")
+                        self.settings.DECO_CONSUMPTION_RATE * stop_time)
+                if no_flight_time > 300000:
+                    raise InfiniteDeco("Infinite deco error")
+
+            if model_ceiling > next_stop_pressure:
+                remaining_time = self.model.time_to_ceiling(
+                    next_stop_pressure,
+                    no_flight_tank.f_he,
+                    no_flight_tank.f_n2,
+                    300000 - no_flight_time)
+                if remaining_time is None:
+                    raise InfiniteDeco("Infinite deco error")
+                no_flight_time += self._round_up_time(remaining_time, exact)
+                if no_flight_time > 300000:
+                    raise InfiniteDeco("Infinite deco error")
+        finally:
+            self.model.restore(snapshot)
 
         self.no_flight_time_value = no_flight_time
         return no_flight_time
 
+    @staticmethod
+    def _round_up_time(seconds, exact):
+        """Round up a time to the second or to the minute.
+
+        :param float seconds: time in seconds
+        :param bool exact: if True, round to the second, else to the minute
+
+        :returns: rounded time in seconds
+        :rtype: int
+        """
+        if exact:
+            return int(math.ceil(seconds))
+        return int(math.ceil(seconds / 60)) * 60
+
     def get_full_desat_hhmmss(self):
         """Return full desat time (if calculated) in hhmmss format.
 
@@ -672,7 +1041,7 @@ class Dive():
         else:
             return seconds_to_hhmmss(self.full_desat_time())
 
-    def full_desat_time(self):
+    def full_desat_time(self, exact=False):
         """Evaluate the full desat time.
 
         By doing deco at const depth of 0m until all compartement
@@ -681,6 +1050,11 @@ class Dive():
         So we need to setup an arbitrary "margin": when sur-saturation falls
         below this margin, we consider that the compartment is not satured
         anymore.
+        The time is solved per compartment (see
+        :meth:`dipplanner.model.buhlmann.model.Model.time_to_desaturation`).
+
+        :param bool exact: if True, the result is rounded up to the second
+                           instead of the minute
 
         :returns: full desat time in seconds
         :rtype: int
@@ -688,40 +1062,35 @@ class Dive():
         :raises InfiniteDeco: if the no flight time can not achieve enough
                               decompression to be able to go to give altitude
         """
-        # TODO: DONE FOR TESTS HERE:
-        return 0
-
-        full_desat_time = 0
-        margin = 0.01 + calculate_pp_h2o_surf(settings.SURFACE_TEMP)
-
-        # bigger stop time to speed up calculation
-        # (precision is not necesary here)
-        stop_time = 60  # in second
-
-        model_copy = copy.deepcopy(self.model)
-        full_desat = False
-        while not full_desat:
-            # loop for "deco" calculation based on the new ceiling
-            model_copy.const_depth(pressure=0.0,
-                                   seg_time=stop_time,
-                                   f_he=0.0,
-                                   f_n2=settings.DEFAULT_AIR_FN2,
-                                   pp_o2=0.0)
-            full_desat_time += stop_time
-
-            if full_desat_time > 300000:
-                raise InfiniteDeco("Infinite deco error")
-
-            full_desat = True
-            for comp in model_copy.tissues:
-                if (comp.pp_n2 > settings.DEFAULT_AIR_FN2 + margin or
-                        comp.pp_he > margin):
-                    full_desat = False
-                    break
+        margin = 0.01 + calculate_pp_h2o_surf(self.settings.SURFACE_TEMP)
+
+        full_desat_time = self.model.time_to_desaturation(
+            margin, self.settings.DEFAULT_AIR_FN2 + margin,
+            0.0, self.settings.DEFAULT_AIR_FN2)
+        if full_desat_time is None:
+            raise InfiniteDeco("Infinite deco error")
+        if exact:
+            full_desat_time = self._round_up_time(full_desat_time, exact)
+        else:
+            # at least one stop time (precision is not necesary here)
+            full_desat_time = max(60, self._round_up_time(full_desat_time,
+                                                          exact))
+        if full_desat_time > 300000:
+            raise InfiniteDeco("Infinite deco error")
 
         self.full_desat_time_value = full_desat_time
         return full_desat_time
 
+    def _depth_to_pressure(self, depth):
+        """Convert a depth in pressure with the settings of this dive.
+
+        :param float depth: in meter
+
+        :returns: depth pressure in bar
+        :rtype: float
+        """
+        return depth_to_pressure(depth, plan_settings=self.plan_settings)
+
     def ascend(self, target_depth):
         """Ascend to target depth, decompressing if necessary.
 
@@ -732,13 +1101,28 @@ class Dive():
 
         :param float target_depth: in meter, target depth for the ascend
 
+        :raises ModelException: <Exceptions from model>
+        """
+        for _ in self._ascend_steps(target_depth):
+            pass
+
+    def _ascend_steps(self, target_depth):
+        """Ascend to target depth, decompressing if necessary.
+
+        see :meth:`ascend`
+
+        :param float target_depth: in meter, target depth for the ascend
+
+        :returns: each output segment, as soon as it is calculated
+        :rtype: generator of :class:`dipplanner.segment.Segment`
+
         :raises ModelException: <Exceptions from model>
         """
         force_deco_stop = False
         in_deco_cycle = False
         deco_stop_time = 0
 
-        if self.in_final_ascent and settings.USE_OC_DECO:
+        if self.in_final_ascent and self.settings.USE_OC_DECO:
             self.set_deco_gas(self.current_depth)
 
         if self.current_depth < target_depth:
@@ -746,28 +1130,28 @@ class Dive():
             raise ProcessingError("Not allowed to ascend while descending !")
 
         # Set initial stop to be the next integral stop depth
-        if self.current_depth % settings.STOP_DEPTH_INCREMENT > 0:
+        if self.current_depth % self.settings.STOP_DEPTH_INCREMENT > 0:
             # we are not on a stop depth already : go to the next stop depth
             next_stop_depth = (int(self.current_depth /
-                                   settings.STOP_DEPTH_INCREMENT) *
-                               settings.STOP_DEPTH_INCREMENT)
+                                   self.settings.STOP_DEPTH_INCREMENT) *
+                               self.settings.STOP_DEPTH_INCREMENT)
         else:
             next_stop_depth = int(self.current_depth -
-                                  settings.STOP_DEPTH_INCREMENT)
+                                  self.settings.STOP_DEPTH_INCREMENT)
 
         self.logger.debug("next_stop_depth: %s", next_stop_depth)
         # hack in case we are overshooting or hit last stop or any of
         # the other bizzar combinations ...
         if (next_stop_depth < target_depth or
-                self.current_depth < settings.LAST_STOP_DEPTH):
+                self.current_depth < self.settings.LAST_STOP_DEPTH):
             next_stop_depth = target_depth
             self.logger.debug("new next_stop_depth: %s", next_stop_depth)
-        elif next_stop_depth == settings.LAST_STOP_DEPTH:
+        elif next_stop_depth == self.settings.LAST_STOP_DEPTH:
             self.logger.warning("next_stop_depth==LAST_STOP_DEPTH !")
             next_stop_depth = target_depth
             self.logger.debug("new next_stop_depth: %s", next_stop_depth)
-        elif next_stop_depth < settings.LAST_STOP_DEPTH:
-            next_stop_depth = settings.LAST_STOP_DEPTH
+        elif next_stop_depth < self.settings.LAST_STOP_DEPTH:
+            next_stop_depth = self.settings.LAST_STOP_DEPTH
             self.logger.debug("new next_stop_depth: %s", next_stop_depth)
 
         # Initialise ascent segment start depth
@@ -778,7 +1162,8 @@ class Dive():
         self.model.gradient.set_gf_at_depth(next_stop_depth)
 
         # Remember maxM-Value and controlling compartment
-        max_mv = self.model.m_value(depth_to_pressure(self.current_depth))
+        max_mv = self.model.m_value(
+            self._depth_to_pressure(self.current_depth))
         control = self.model.control_compartment()
 
         while self.current_depth > target_depth:
@@ -787,7 +1172,7 @@ class Dive():
             # can we move to the proposed next stop depth ?
             model_ceiling = self.model.ceiling()
             self.logger.debug("model ceiling: %s", model_ceiling)
-            while force_deco_stop or next_stop_depth < model_ceiling:
+            if force_deco_stop or next_stop_depth < model_ceiling:
                 in_deco_cycle = True
                 # Only used for first entry into deco stop
                 force_deco_stop = False
@@ -801,9 +1186,11 @@ class Dive():
                         self.output_segments.append(
                             SegmentAscDesc(start_depth,
                                            self.current_depth,
-                                           settings.ASCENT_RATE,
+                                           self.settings.ASCENT_RATE,
                                            self.current_tank,
-                                           self.pp_o2))
+                                           self.pp_o2,
+                                           plan_settings=self.plan_settings))
+                        yield self.output_segments[-1]
                     in_ascent_cycle = False
 
                 # set m-value gradient under the following conditions:
@@ -811,7 +1198,8 @@ class Dive():
                 #     we do a decompression cycle
                 #   - otherwise wait until we are finally
                 #     surfacing before setting it
-                if ((not settings.MULTILEVEL_MODE or self.in_final_ascent) and
+                if ((not self.settings.MULTILEVEL_MODE or
+                     self.in_final_ascent) and
                         (not self.model.gradient.gf_set)):
                     self.model.gradient.set_gf_slope_at_depth(
                         self.current_depth)
@@ -819,32 +1207,28 @@ class Dive():
                     self.logger.debug("...set m-value gradient: %s",
                                       self.model.gradient.gf)
 
-                # calculate stop_time
-                # if (deco_stop_time == 0 and
-                #         self.run_time % settings.STOP_TIME_INCREMENT > 0):
-                #     stop_time = (
-                #         int(self.run_time / settings.STOP_TIME_INCREMENT) *
-                #         settings.STOP_TIME_INCREMENT +
-                #         settings.STOP_TIME_INCREMENT - self.run_time)
-                #     print("+++++ ", stop_time)
-                #     if stop_time == 0:
-                #         stop_time = settings.STOP_TIME_INCREMENT  # in second
-                # else:
-                stop_time = settings.STOP_TIME_INCREMENT  # in second
-
-                # execute the stop
-                self.model.const_depth(depth_to_pressure(self.current_depth),
-                                       stop_time,
-                                       self.current_tank.f_he,
-                                       self.current_tank.f_n2,
-                                       self.pp_o2)
-
-                deco_stop_time += stop_time
+                # find the stop time: smallest multiple of
+                # STOP_TIME_INCREMENT after which the ceiling clears the
+                # next stop depth
+                deco_stop_time = self.model.stop_time(
+                    self._depth_to_pressure(self.current_depth),
+                    self.current_tank.f_he,
+                    self.current_tank.f_n2,
+                    self.pp_o2,
+                    next_stop_depth,
+                    self.settings.STOP_TIME_INCREMENT,
+                    300000)
                 # sanity check for infinite loop
-                if deco_stop_time > 300000:
+                if deco_stop_time is None:
                     raise InfiniteDeco("Infinite deco error")
 
-                model_ceiling = self.model.ceiling()
+                # execute the stop
+                self.model.const_depth(
+                    self._depth_to_pressure(self.current_depth),
+                    deco_stop_time,
+                    self.current_tank.f_he,
+                    self.current_tank.f_n2,
+                    self.pp_o2)
 
             # finished decompression loop
             if in_deco_cycle:
@@ -854,57 +1238,64 @@ class Dive():
                 self.logger.debug(
                     "update run time with deco time: %ss at %sm (runtime:%s)",
                     deco_stop_time, self.current_depth, self.run_time)
-                if settings.FORCE_ALL_STOPS:
+                if self.settings.FORCE_ALL_STOPS:
                     force_deco_stop = True
 
                 # write deco segment
                 deco_segment = SegmentDeco(self.current_depth,
                                            deco_stop_time,
                                            self.current_tank,
-                                           self.pp_o2)
+                                           self.pp_o2,
+                                           plan_settings=self.plan_settings)
                 deco_segment.mv_max = max_mv
                 deco_segment.gf_used = self.model.gradient.gf
                 deco_segment.control_compartment = control
                 self.output_segments.append(deco_segment)
+                yield deco_segment
                 in_deco_cycle = False
                 deco_stop_time = 0
 
             if in_ascent_cycle:
                 self.logger.debug("...in ascent cycle, do asc from %s to %s",
                                   self.current_depth, next_stop_depth)
-                self.model.asc_desc(depth_to_pressure(self.current_depth),
-                                    depth_to_pressure(next_stop_depth),
-                                    -settings.ASCENT_RATE,
-                                    self.current_tank.f_he,
-                                    self.current_tank.f_n2,
-                                    self.pp_o2)
+                self.model.asc_desc(
+                    self._depth_to_pressure(self.current_depth),
+                    self._depth_to_pressure(next_stop_depth),
+                    -self.settings.ASCENT_RATE,
+                    self.current_tank.f_he,
+                    self.current_tank.f_n2,
+                    self.pp_o2)
                 self.run_time += abs((float(self.current_depth) -
                                       float(next_stop_depth)) /
-                                     float(settings.ASCENT_RATE))
+                                     float(self.settings.ASCENT_RATE))
                 self.logger.debug("update run time : %ss", self.run_time)
             else:
                 self.logger.debug("...in deco cycle, do asc from %s to %s",
                                   self.current_depth, next_stop_depth)
-                self.model.asc_desc(depth_to_pressure(self.current_depth),
-                                    depth_to_pressure(next_stop_depth),
-                                    -settings.DECO_ASCENT_RATE,
-                                    self.current_tank.f_he,
-                                    self.current_tank.f_n2,
-                                    self.pp_o2)
+                self.model.asc_desc(
+                    self._depth_to_pressure(self.current_depth),
+                    self._depth_to_pressure(next_stop_depth),
+                    -self.settings.DECO_ASCENT_RATE,
+                    self.current_tank.f_he,
+                    self.current_tank.f_n2,
+                    self.pp_o2)
                 self.run_time += abs((float(self.current_depth) -
                                       float(next_stop_depth)) /
-                                     float(settings.DECO_ASCENT_RATE))
+                                     float(self.settings.DECO_ASCENT_RATE))
                 self.logger.debug("update run time : %ss", self.run_time)
                 self.output_segments.append(
                     SegmentAscDesc(self.current_depth,
                                    next_stop_depth,
-                                   settings.DECO_ASCENT_RATE,
+                                   self.settings.DECO_ASCENT_RATE,
                                    self.current_tank,
-                                   self.pp_o2))
+                                   self.pp_o2,
+                                   plan_settings=self.plan_settings))
+                yield self.output_segments[-1]
 
             # now we moved up the the next depth
             self.current_depth = next_stop_depth
-            max_mv = self.model.m_value(depth_to_pressure(self.current_depth))
+            max_mv = self.model.m_value(
+                self._depth_to_pressure(self.current_depth))
             control = self.model.control_compartment()
 
             # Check and switch deco gas
@@ -917,34 +1308,37 @@ class Dive():
                     self.output_segments.append(
                         SegmentAscDesc(start_depth,
                                        self.current_depth,
-                                       settings.ASCENT_RATE,
+                                       self.settings.ASCENT_RATE,
                                        temp_tank,
-                                       self.pp_o2))
+                                       self.pp_o2,
+                                       plan_settings=self.plan_settings))
+                    yield self.output_segments[-1]
                     start_depth = self.current_depth
 
             # set next rounded stop depth
             next_stop_depth = int(
-                self.current_depth) - settings.STOP_DEPTH_INCREMENT
+                self.current_depth) - self.settings.STOP_DEPTH_INCREMENT
 
             self.logger.debug("next stop depth: %s, target depth: %s",
                               next_stop_depth, target_depth)
 
             # check in cas we are overshooting or hit last stop
             if (next_stop_depth < target_depth or
-                    self.current_depth < settings.LAST_STOP_DEPTH):
+                    self.current_depth < self.settings.LAST_STOP_DEPTH):
                 self.logger.debug("next_stop_depth (%s) < target_depth (%s)",
                                   next_stop_depth, target_depth)
                 next_stop_depth = target_depth
-            elif self.current_depth < settings.LAST_STOP_DEPTH:
+            elif self.current_depth < self.settings.LAST_STOP_DEPTH:
                 self.logger.debug("current_depth (%s) < LAST_STOP_DEPTH (%s)",
                                   self.current_depth,
-                                  settings.LAST_STOP_DEPTH)
+                                  self.settings.LAST_STOP_DEPTH)
                 next_stop_depth = target_depth
-            elif (next_stop_depth < settings.LAST_STOP_DEPTH and
+            elif (next_stop_depth < self.settings.LAST_STOP_DEPTH and
                   next_stop_depth > 0):
                 self.logger.debug("next_stop_depth (%s) < "
                                   "settings.LAST_STOP_DEPTH (%s)",
-                                  next_stop_depth, settings.LAST_STOP_DEPTH)
+                                  next_stop_depth,
+                                  self.settings.LAST_STOP_DEPTH)
                 next_stop_depth = target_depth
 
             if self.model.gradient.gf_set:  # update gf for next stop
@@ -958,9 +1352,10 @@ class Dive():
             self.output_segments.append(
                 SegmentAscDesc(start_depth,
                                self.current_depth,
-                               -settings.ASCENT_RATE,
+                               -self.settings.ASCENT_RATE,
                                self.current_tank,
-                               self.pp_o2))
+                               self.pp_o2, plan_settings=self.plan_settings))
+            yield self.output_segments[-1]
 
     def do_gas_calcs(self):
         """Estimate gas consumption for all output segments.
@@ -975,6 +1370,25 @@ class Dive():
         for seg in self.output_segments:
             seg.tank.consume_gas(seg.gas_used)
 
+    def segment_tank_indexes(self):
+        """Return the tank of each output segment, as an index in tanks.
+
+        At the end of the dive, the tanks of the dive are copies of the
+        tanks of its segments: the tanks are matched by identity with the
+        tanks before the copy, so several tanks with the same gas are not
+        mixed up.
+
+        :returns: index in self.tanks of the tank of each output segment
+                  (-1 if none)
+        :rtype: list of int
+        """
+        tanks = self.tanks
+        if self._segment_tanks is not None:
+            tanks = self._segment_tanks
+        tank_indexes = {id(tank): index for index, tank in enumerate(tanks)}
+        return [tank_indexes.get(id(segment.tank), -1)
+                for segment in self.output_segments]
+
     def set_deco_gas(self, depth):
         """Select appropriate deco gas for the depth specified.
 
@@ -997,7 +1411,7 @@ class Dive():
         # if so just return doing nothing
         if not self.in_final_ascent:
             return False
-        if not settings.USE_OC_DECO:
+        if not self.settings.USE_OC_DECO:
             return False
         if len(self.tanks) == 0:
             return False
@@ -0,0 +1,111 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Calculate a deco table: one square dive per depth and bottom time.
+
+All the dives of the same depth share the same descent and the beginning
+of the same bottom segment: the descent is calculated only once per
+depth, the bottom segment is extended from one bottom time to the next,
+and only the final ascent is calculated for each cell of the table.
+
+Contains:
+dive_table -- function
+"""
+import logging
+import copy
+from collections import OrderedDict
+
+# local imports
+from dipplanner.dipp_exception import DipplannerException
+from dipplanner.dive import Dive
+from dipplanner.segment import SegmentDive
+
+LOGGER = logging.getLogger("dipplanner.dive_table")
+
+
+def dive_table(depths, times, tanks, dive_tank=None, setpoint=0.0,
+               previous_profile=None, plan_settings=None):
+    """Calculate the dives of a deco table.
+
+    Each cell of the table is a square dive, and gives the same result
+    as:
+
+        .. code-block:: python
+
+            dive = Dive([SegmentDive(depth, time, dive_tank, setpoint)],
+                        tanks, previous_profile, plan_settings)
+            dive.do_dive_without_exceptions()
+
+    Dive errors do not stop the calculation: they are stored in the
+    dive_exceptions of each dive.
+    The given tanks are not modified.
+
+    :param list depths: depths of the table (in meter)
+    :param list times: bottom times of the table (in seconds)
+    :param list tanks: tanks of the dives
+    :type tanks: list of :class:`dipplanner.tank.Tank`
+    :param dive_tank: tank used for the bottom segment
+                      (default: the first tank)
+    :type dive_tank: :class:`dipplanner.tank.Tank`
+    :param float setpoint: setpoint of the bottom segment (0 if OC)
+    :param previous_profile: previous dive, for repetitive dives
+    :type previous_profile: :class:`dipplanner.dive.Dive`
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+
+    :returns: calculated dives, with (depth, time) keys, ordered by depth
+              then time
+    :rtype: OrderedDict of :class:`dipplanner.dive.Dive`
+    """
+    tanks = list(tanks)
+    if dive_tank is None:
+        dive_tank = tanks[0]
+    times = sorted(times)
+    table = OrderedDict()
+    for depth in depths:
+        # each depth uses its own tanks and model
+        (depth_tanks, depth_tank, previous) = copy.deepcopy(
+            (tanks, dive_tank, previous_profile))
+        prefix = Dive([SegmentDive(depth, times[0], depth_tank, setpoint,
+                                   plan_settings=plan_settings)],
+                      depth_tanks, previous, plan_settings)
+        prefix_time = times[0]
+        try:
+            if prefix.dive_exceptions:
+                raise prefix.dive_exceptions[0]
+            prefix.do_dive_segments()
+        except DipplannerException as exc:
+            LOGGER.info("unable to dive at %sm: %s", depth, exc)
+            # exceptions can not be copied: add it to each copy
+            prefix.dive_exceptions = []
+            for time in times:
+                table[(depth, time)] = copy.deepcopy(prefix)
+                table[(depth, time)].dive_exceptions.append(exc)
+            continue
+
+        for time in times:
+            if time > prefix_time:
+                prefix.extend_last_segment(time - prefix_time)
+                prefix_time = time
+            dive = copy.deepcopy(prefix)
+            try:
+                dive.do_final_ascent()
+            except DipplannerException as exc:
+                dive.dive_exceptions.append(exc)
+            table[(depth, time)] = dive
+    return table
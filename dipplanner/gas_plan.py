@@ -0,0 +1,374 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Gas consumption of a calculated dive, over arrays of its segments.
+
+The output segments of a calculated dive are extracted once in flat
+arrays (ambiant pressure, time, run time, tank and consumption rate of
+each segment). The gas consumption of the dive can then be calculated
+again, in one pass over these arrays, for other consumption rates or
+other tank rules, without planning the dive again:
+
+    .. code-block:: python
+
+        dive.do_dive()
+        gas_plan = GasPlan.from_dive(dive)
+        result = gas_plan.consumption(dive_rate=25.0 / 60)
+        if result.violation_time is not None:
+            print("rule of tank %s violated at %ss" % (
+                result.violation_tank, result.violation_time))
+
+With the rates of the dive, the used and remaining gas of each tank are
+the ones calculated by :meth:`dipplanner.dive.Dive.do_gas_calcs`.
+
+The gas consumption of a segment is linear in the consumption rate, and
+the ambiant pressure of an ascent or a descent is linear in time: the
+instant where the remaining gas of a tank goes below its rule is
+solved exactly inside the segment.
+
+The gas used in each tank is the sum of the pressure and time of its
+segments multiplied by their rate: these sums are calculated once, and
+:meth:`GasPlan.sweep` evaluates the tank rules for a vector of
+consumption rates (and reserve fractions) with a few operations per
+rate, for example for gas reserve curves:
+
+    .. code-block:: python
+
+        for result in gas_plan.sweep([rate / 60 for rate in range(12, 31)],
+                                     reserve_fractions=[1 / 3, 0.5]):
+            print(result.dive_rate, result.reserve_fraction,
+                  all(result.rules_ok))
+
+Contains:
+GasConsumption -- namedtuple
+GasSweepResult -- namedtuple
+GasPlan -- class
+"""
+import logging
+import math
+from array import array
+from collections import namedtuple
+
+# local imports
+from dipplanner.segment import SegmentDive, SegmentDeco, SegmentAscDesc
+from dipplanner.tools import depth_to_pressure
+
+LOGGER = logging.getLogger("dipplanner.gas_plan")
+
+#: gas consumption of a dive:
+#: used_gas, remaining_gas: list of the used and remaining gas of each tank
+#: at the end of the dive, in liter
+#: timeline: remaining gas in the tank of each segment, at the end of the
+#: segment, in liter (array, nan for segments without gas consumption)
+#: violation_time: first run time where the remaining gas of a tank is
+#: below its rule, in seconds (None if the rules are respected)
+#: violation_tank: index of this tank (None if the rules are respected)
+GasConsumption = namedtuple('GasConsumption',
+                            ('used_gas', 'remaining_gas', 'timeline',
+                             'violation_time', 'violation_tank'))
+
+#: gas consumption of a dive for one consumption rate and reserve:
+#: dive_rate, deco_rate: consumption rates, in liter/s
+#: reserve_fraction: minimum remaining gas, as a fraction of the gas of
+#: each tank (None for the rules of the tanks)
+#: used_gas, remaining_gas: list of the used and remaining gas of each tank
+#: at the end of the dive, in liter
+#: rules_ok: list of the result of the rule of each tank (see
+#: :meth:`dipplanner.tank.Tank.check_rule`)
+GasSweepResult = namedtuple('GasSweepResult',
+                            ('dive_rate', 'deco_rate', 'reserve_fraction',
+                             'used_gas', 'remaining_gas', 'rules_ok'))
+
+
+def _time_to_consume(gas, rate, start_pressure, pressure_change, time):
+    """Return the time to consume a quantity of gas during a segment.
+
+    The ambiant pressure goes linearly from start_pressure to
+    start_pressure + pressure_change during the segment: the gas consumed
+    after t seconds is
+    rate * (start_pressure * t + pressure_change * t ** 2 / (2 * time)).
+
+    :param float gas: gas to consume, in liter (less than the gas of the
+                      whole segment)
+    :param float rate: consumption rate, in liter/s
+    :param float start_pressure: ambiant pressure at the start, in bar
+    :param float pressure_change: pressure change during the segment, in
+                                  bar
+    :param float time: duration of the segment, in seconds
+
+    :returns: time from the start of the segment, in seconds
+    :rtype: float
+    """
+    half_slope = rate * pressure_change / (2.0 * time)
+    linear = rate * start_pressure
+    # stable root of half_slope * t ** 2 + linear * t - gas = 0
+    return 2.0 * gas / (linear + math.sqrt(max(
+        0.0, linear * linear + 4.0 * half_slope * gas)))
+
+
+class GasPlan():
+    """Output segments of a calculated dive, as arrays for gas planning.
+
+    Segments in CCR mode (setpoint > 0) and segments without gas
+    consumption (waypoints) have no tank: they do not use any gas.
+
+    *Attributes:*
+        * tanks (list) -- tanks of the dive
+          (:class:`dipplanner.tank.Tank`)
+        * start_gas (array) -- gas in each tank at the start of the dive,
+          in liter
+        * min_gas (array) -- minimum remaining gas of each tank (rule of
+          the tank), in liter
+        * tank_indexes (array) -- index in tanks of the tank of each
+          segment (-1 if the segment does not use gas)
+        * deco (array) -- 1 if the segment uses the deco consumption rate,
+          0 if it uses the dive consumption rate
+        * volumes (array) -- mean ambiant pressure multiplied by the time
+          of each segment, in bar.s
+        * start_pressures (array) -- ambiant pressure at the start of each
+          segment, in bar
+        * pressure_changes (array) -- end pressure minus start pressure of
+          each segment, in bar
+        * times (array) -- duration of each segment, in seconds
+        * run_times (array) -- run time at the end of each segment, in
+          seconds
+        * dive_rate (float) -- dive consumption rate of the dive, in liter/s
+        * deco_rate (float) -- deco consumption rate of the dive, in liter/s
+    """
+
+    def __init__(self, tanks, start_gas, min_gas, dive_rate, deco_rate):
+        """Init of GasPlan, without any segment.
+
+        :param tanks: tanks of the dive
+        :type tanks: list of :class:`dipplanner.tank.Tank`
+        :param start_gas: gas in each tank at the start of the dive, in liter
+        :type start_gas: list of float
+        :param min_gas: minimum remaining gas of each tank, in liter
+        :type min_gas: list of float
+        :param float dive_rate: dive consumption rate, in liter/s
+        :param float deco_rate: deco consumption rate, in liter/s
+        """
+        self.tanks = list(tanks)
+        self.start_gas = array('d', start_gas)
+        self.min_gas = array('d', min_gas)
+        self.dive_rate = float(dive_rate)
+        self.deco_rate = float(deco_rate)
+        self.tank_indexes = array('h')
+        self.deco = array('b')
+        self.volumes = array('d')
+        self.start_pressures = array('d')
+        self.pressure_changes = array('d')
+        self.times = array('d')
+        self.run_times = array('d')
+
+    def __len__(self):
+        """Return the number of segments.
+
+        :returns: number of segments
+        :rtype: int
+        """
+        return len(self.times)
+
+    def append(self, tank_index, deco, start_pressure, end_pressure,
+               mean_pressure, time, run_time):
+        """Add a segment at the end of the plan.
+
+        :param int tank_index: index in tanks of the tank of the segment
+                               (-1 if the segment does not use gas)
+        :param bool deco: True if the segment uses the deco consumption rate
+        :param float start_pressure: ambiant pressure at the start, in bar
+        :param float end_pressure: ambiant pressure at the end, in bar
+        :param float mean_pressure: mean ambiant pressure, in bar
+        :param float time: duration of the segment, in seconds
+        :param float run_time: run time at the end of the segment, in
+                               seconds
+        """
+        self.tank_indexes.append(tank_index)
+        self.deco.append(1 if deco else 0)
+        self.volumes.append(mean_pressure * time)
+        self.start_pressures.append(start_pressure)
+        self.pressure_changes.append(end_pressure - start_pressure)
+        self.times.append(time)
+        self.run_times.append(run_time)
+
+    @classmethod
+    def from_dive(cls, dive):
+        """Extract the gas plan of a calculated dive.
+
+        :param dive: calculated dive (see
+                     :meth:`dipplanner.dive.Dive.do_dive`)
+        :type dive: :class:`dipplanner.dive.Dive`
+
+        :returns: gas plan of the dive
+        :rtype: :class:`GasPlan`
+        """
+        plan_settings = dive.settings
+        gas_plan = cls(dive.tanks, [0.0] * len(dive.tanks),
+                       [tank.min_gas for tank in dive.tanks],
+                       plan_settings.DIVE_CONSUMPTION_RATE,
+                       plan_settings.DECO_CONSUMPTION_RATE)
+        for segment, tank_index in zip(dive.output_segments,
+                                       dive.segment_tank_indexes()):
+            # same pressures as in the gas_used of each segment type
+            conf = segment.settings
+            surface = conf.AMBIANT_PRESSURE_SURFACE
+            if isinstance(segment, SegmentAscDesc):
+                start_pressure = depth_to_pressure(
+                    float(segment.start_depth),
+                    plan_settings=segment.plan_settings) + surface
+                end_pressure = depth_to_pressure(
+                    float(segment.end_depth),
+                    plan_settings=segment.plan_settings) + surface
+                mean_pressure = depth_to_pressure(
+                    (float(segment.start_depth) +
+                     float(segment.end_depth)) / 2.0,
+                    plan_settings=segment.plan_settings) + surface
+            else:
+                start_pressure = end_pressure = mean_pressure = (
+                    depth_to_pressure(segment.depth,
+                                      plan_settings=segment.plan_settings) +
+                    surface)
+            if (segment.setpoint > 0 or
+                    not isinstance(segment, (SegmentDive, SegmentDeco,
+                                             SegmentAscDesc))):
+                tank_index = -1
+            gas_plan.append(tank_index, isinstance(segment, SegmentDeco),
+                            start_pressure, end_pressure, mean_pressure,
+                            segment.time, segment.run_time)
+        # the tanks of the dive are already consumed: add back the gas used
+        # during this dive
+        used_gas = gas_plan.consumption().used_gas
+        for index, tank in enumerate(gas_plan.tanks):
+            gas_plan.start_gas[index] = tank.remaining_gas + used_gas[index]
+        LOGGER.debug("gas plan of %s segments and %s tanks", len(gas_plan),
+                     len(gas_plan.tanks))
+        return gas_plan
+
+    def consumption(self, dive_rate=None, deco_rate=None, min_gas=None):
+        """Calculate the gas consumption of the dive.
+
+        :param float dive_rate: dive consumption rate, in liter/s
+                                (default: rate of the dive)
+        :param float deco_rate: deco consumption rate, in liter/s
+                                (default: rate of the dive)
+        :param min_gas: minimum remaining gas of each tank, in liter
+                        (default: rules of the tanks)
+        :type min_gas: list of float
+
+        :returns: gas consumption of the dive
+        :rtype: :class:`GasConsumption`
+        """
+        rates = (float(self.dive_rate if dive_rate is None else dive_rate),
+                 float(self.deco_rate if deco_rate is None else deco_rate))
+        if min_gas is None:
+            min_gas = self.min_gas
+        used_gas = [0.0] * len(self.tanks)
+        remaining_gas = list(self.start_gas)
+        timeline = array('d', [math.nan]) * len(self)
+        violation_time = None
+        violation_tank = None
+        for tank_index, tank_gas in enumerate(remaining_gas):
+            if tank_gas < min_gas[tank_index]:
+                violation_time = 0.0
+                violation_tank = tank_index
+                break
+
+        for position, (tank_index, deco, volume) in enumerate(
+                zip(self.tank_indexes, self.deco, self.volumes)):
+            if tank_index < 0:
+                continue
+            rate = rates[deco]
+            gas = volume * rate
+            tank_gas = remaining_gas[tank_index]
+            used_gas[tank_index] += gas
+            remaining_gas[tank_index] = tank_gas - gas
+            timeline[position] = tank_gas - gas
+            if (violation_time is None and
+                    tank_gas - gas < min_gas[tank_index]):
+                time = self.times[position]
+                violation_time = (
+                    self.run_times[position] - time +
+                    min(time, _time_to_consume(
+                        tank_gas - min_gas[tank_index], rate,
+                        self.start_pressures[position],
+                        self.pressure_changes[position], time)))
+                violation_tank = tank_index
+        return GasConsumption(used_gas, remaining_gas, timeline,
+                              violation_time, violation_tank)
+
+    def tank_volumes(self):
+        """Return the pressure multiplied by the time spent on each tank.
+
+        The gas used in a tank is
+        dive_rate * dive volume + deco_rate * deco volume.
+
+        :returns: list of (dive volume, deco volume) of each tank, in bar.s
+        :rtype: list of tuple
+        """
+        volumes = [[0.0, 0.0] for _ in self.tanks]
+        for tank_index, deco, volume in zip(self.tank_indexes, self.deco,
+                                            self.volumes):
+            if tank_index >= 0:
+                volumes[tank_index][deco] += volume
+        return [tuple(tank_volumes) for tank_volumes in volumes]
+
+    def sweep(self, dive_rates, deco_rates=None, reserve_fractions=None):
+        """Evaluate the tank rules for several consumption rates.
+
+        The deco obligations do not depend on the consumption rates: the
+        dive is not planned again.
+
+        :param dive_rates: dive consumption rates, in liter/s
+        :type dive_rates: list of float
+        :param deco_rates: deco consumption rate for each dive rate, in
+                           liter/s (default: the deco rate of the dive,
+                           scaled like the dive rate)
+        :type deco_rates: list of float
+        :param reserve_fractions: minimum remaining gas, as a fraction of
+                                  the gas of each tank (default: the rules
+                                  of the tanks)
+        :type reserve_fractions: list of float
+
+        :returns: one result per dive rate and per reserve fraction,
+                  ordered by dive rate
+        :rtype: list of :class:`GasSweepResult`
+        """
+        dive_rates = [float(rate) for rate in dive_rates]
+        if deco_rates is None:
+            deco_rates = [rate * self.deco_rate / self.dive_rate
+                          if self.dive_rate else self.deco_rate
+                          for rate in dive_rates]
+        reserves = [(None, list(self.min_gas))]
+        if reserve_fractions is not None:
+            reserves = [(fraction, [tank.total_gas * fraction
+                                    for tank in self.tanks])
+                        for fraction in reserve_fractions]
+        tank_volumes = self.tank_volumes()
+        results = []
+        for dive_rate, deco_rate in zip(dive_rates, deco_rates):
+            used_gas = [dive_volume * dive_rate + deco_volume * deco_rate
+                        for dive_volume, deco_volume in tank_volumes]
+            remaining_gas = [start_gas - gas for start_gas, gas
+                             in zip(self.start_gas, used_gas)]
+            for fraction, min_gas in reserves:
+                results.append(GasSweepResult(
+                    dive_rate, float(deco_rate), fraction, used_gas,
+                    remaining_gas,
+                    [gas >= tank_min_gas for gas, tank_min_gas
+                     in zip(remaining_gas, min_gas)]))
+        return results
@@ -0,0 +1,274 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Search the gradient factors of a dive meeting the limits of a plan.
+
+The most conservative gradient factors (GF_LOW, GF_HIGH) for which the
+dive respects the limits (see :class:`dipplanner.plan_limits.PlanLimits`)
+are searched in a grid of candidates:
+
+    .. code-block:: python
+
+        result = optimize_gradient_factors(
+            segments, tanks, PlanLimits(max_run_time=60 * 60))
+        print(result.gf_low, result.gf_high, result.dive.run_time)
+
+The descent and bottom segments of the dive do not depend on the
+gradient factors: they are calculated once, and each candidate only
+calculates the final ascent, with its own gradient, from a copy of this
+state (like the cells of :func:`dipplanner.dive_table.dive_table`).
+When the input segments contain an ascent (multilevel dives), the whole
+dive is calculated for each candidate.
+
+Higher gradient factors give shorter decompressions, which use less gas
+and less oxygen: the limits are assumed to be met more easily with
+higher gradient factors. For each GF_LOW, the lowest GF_HIGH meeting the
+limits is found by a binary search, and this GF_HIGH is the upper bound
+of the search for the next (higher) GF_LOW.
+
+Contains:
+GfOptimizationResult -- namedtuple
+optimize_gradient_factors -- function
+"""
+import copy
+import pickle
+import logging
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# local imports
+from dipplanner import settings
+from dipplanner.dipp_exception import DipplannerException
+from dipplanner.dive import Dive
+from dipplanner.model.buhlmann.gradient import Gradient
+from dipplanner.plan_limits import plan_within_limits
+from dipplanner.plan_settings import current_settings
+
+LOGGER = logging.getLogger("dipplanner.gf_optimizer")
+
+#: default GF_LOW candidates
+GF_LOWS = tuple(low / 100 for low in range(10, 95, 5))
+#: default GF_HIGH candidates
+GF_HIGHS = tuple(high / 100 for high in range(50, 100, 5))
+
+#: result of the search:
+#: gf_low, gf_high: most conservative gradient factors meeting the limits
+#: (None if no candidate meets them)
+#: dive: calculated dive with these gradient factors (or None)
+#: frontier: lowest GF_HIGH meeting the limits for each GF_LOW (None if
+#: none), ordered by GF_LOW
+#: evaluated: number of calculated candidates
+GfOptimizationResult = namedtuple('GfOptimizationResult',
+                                  ('gf_low', 'gf_high', 'dive', 'frontier',
+                                   'evaluated'))
+
+
+def _start_dive(segments, tanks, previous_profile, surface_interval,
+                plan_settings):
+    """Calculate the part of a dive which does not depend on the GF.
+
+    :returns: pickled dive, to be copied for each candidate
+    :rtype: bytes
+
+    :raises DipplannerException: if the dive can not be started
+    """
+    (segments, tanks) = copy.deepcopy((segments, tanks))
+    if previous_profile is not None:
+        # only the model of the previous dive is used (and changed)
+        previous_profile = copy.copy(previous_profile)
+        previous_profile.model = copy.deepcopy(previous_profile.model)
+    dive = Dive(segments, tanks, previous_profile, plan_settings)
+    if dive.dive_exceptions:
+        raise dive.dive_exceptions[0]
+    if surface_interval:
+        dive.do_surface_interval(surface_interval)
+    start = pickle.dumps(dive, pickle.HIGHEST_PROTOCOL)
+    dive.do_dive_segments()
+    if any(segment.type in ('ascent', 'deco')
+           for segment in dive.output_segments):
+        # the gradient factors are already used: nothing can be shared
+        LOGGER.debug("ascent in the input segments: full dive for each "
+                     "candidate")
+        return start
+    return pickle.dumps(dive, pickle.HIGHEST_PROTOCOL)
+
+
+def _candidate(start, gf_low, gf_high, limits):
+    """Calculate the dive of one candidate.
+
+    :param bytes start: pickled dive (see :func:`_start_dive`)
+    :param float gf_low: low gradient factor
+    :param float gf_high: high gradient factor
+    :param limits: limits of the plan
+    :type limits: :class:`dipplanner.plan_limits.PlanLimits`
+
+    :returns: (True if the limits are met, calculated dive)
+    :rtype: tuple
+    """
+    dive = pickle.loads(start)
+    dive.plan_settings = dive.plan_settings._replace(GF_LOW=gf_low,
+                                                     GF_HIGH=gf_high)
+    # the model of a repetitive dive keeps the settings of the first dive
+    model_settings = dive.model.plan_settings or current_settings()
+    dive.model.plan_settings = model_settings._replace(GF_LOW=gf_low,
+                                                       GF_HIGH=gf_high)
+    dive.model.gradient = Gradient(gf_low, gf_high)
+    try:
+        violation = plan_within_limits(dive, limits)
+    except DipplannerException as exc:
+        LOGGER.debug("GF %s/%s: %s", gf_low, gf_high, exc)
+        return False, dive
+    LOGGER.debug("GF %s/%s: %s", gf_low, gf_high, violation or "ok")
+    return violation is None, dive
+
+
+def _search_gf_high(start, gf_low, gf_highs, upper, limits):
+    """Search the lowest GF_HIGH meeting the limits, for one GF_LOW.
+
+    :param bytes start: pickled dive (see :func:`_start_dive`)
+    :param float gf_low: low gradient factor
+    :param list gf_highs: sorted GF_HIGH candidates
+    :param int upper: index in gf_highs of a GF_HIGH known to meet the
+                      limits, or len(gf_highs)
+    :param limits: limits of the plan
+    :type limits: :class:`dipplanner.plan_limits.PlanLimits`
+
+    :returns: (index of the lowest GF_HIGH meeting the limits, or
+              len(gf_highs), number of calculated candidates)
+    :rtype: tuple
+    """
+    low = 0
+    while low < len(gf_highs) and gf_highs[low] < gf_low:
+        low += 1
+    evaluated = 0
+    high = max(low, upper)
+    while low < high:
+        middle = (low + high) // 2
+        evaluated += 1
+        if _candidate(start, gf_low, gf_highs[middle], limits)[0]:
+            high = middle
+        else:
+            low = middle + 1
+    return low, evaluated
+
+
+def _search_with_settings(arguments):
+    """Search the lowest GF_HIGH of one GF_LOW in a worker process.
+
+    The worker first applies the global settings of the calling process.
+
+    :param tuple arguments: (global settings, arguments of
+                            :func:`_search_gf_high`)
+
+    :returns: see :func:`_search_gf_high`
+    :rtype: tuple
+    """
+    global_settings, search_arguments = arguments
+    for name, value in global_settings._asdict().items():
+        setattr(settings, name, value)
+    return _search_gf_high(*search_arguments)
+
+
+def optimize_gradient_factors(segments, tanks, limits, gf_lows=GF_LOWS,
+                              gf_highs=GF_HIGHS, previous_profile=None,
+                              surface_interval=0, plan_settings=None,
+                              jobs=1):
+    """Search the most conservative gradient factors meeting the limits.
+
+    The most conservative candidate is the one with the lowest GF_HIGH
+    and then the lowest GF_LOW. Only candidates with GF_LOW <= GF_HIGH
+    are used.
+    The given segments, tanks and previous dive are not modified.
+
+    :param segments: input segments of the dive
+    :type segments: list of :class:`dipplanner.segment.Segment`
+    :param tanks: tanks of the dive
+    :type tanks: list of :class:`dipplanner.tank.Tank`
+    :param limits: limits of the plan
+    :type limits: :class:`dipplanner.plan_limits.PlanLimits`
+    :param gf_lows: GF_LOW candidates
+    :type gf_lows: list of float
+    :param gf_highs: GF_HIGH candidates
+    :type gf_highs: list of float
+    :param previous_profile: previous dive, for repetitive dives
+    :type previous_profile: :class:`dipplanner.dive.Dive`
+    :param int surface_interval: surface interval after the previous dive,
+                                 in seconds
+    :param plan_settings: settings of the plan, apart from the gradient
+                          factors (default: the settings of the previous
+                          dive, or the global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+    :param int jobs: number of processes. If 1, the candidates are
+                     calculated in this process, if None, uses the number
+                     of cpus. With several processes, each GF_LOW is
+                     searched on its own, without the bound of the previous
+                     GF_LOW.
+
+    :returns: result of the search
+    :rtype: :class:`GfOptimizationResult`
+
+    :raises DipplannerException: if the dive can not be started
+    """
+    if plan_settings is None and previous_profile is not None:
+        plan_settings = previous_profile.plan_settings
+    if plan_settings is None:
+        plan_settings = current_settings()
+    gf_lows = sorted(gf_lows)
+    gf_highs = sorted(gf_highs)
+    start = _start_dive(segments, tanks, previous_profile, surface_interval,
+                        plan_settings)
+
+    found = []
+    evaluated = 0
+    if jobs == 1 or len(gf_lows) <= 1:
+        upper = len(gf_highs)
+        for gf_low in gf_lows:
+            index, count = _search_gf_high(start, gf_low, gf_highs, upper,
+                                           limits)
+            found.append(index)
+            evaluated += count
+            if index < len(gf_highs):
+                upper = index
+    else:
+        global_settings = current_settings()
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for index, count in executor.map(
+                    _search_with_settings,
+                    [(global_settings,
+                      (start, gf_low, gf_highs, len(gf_highs), limits))
+                     for gf_low in gf_lows]):
+                found.append(index)
+                evaluated += count
+
+    frontier = OrderedDict()
+    best = None
+    for gf_low, index in zip(gf_lows, found):
+        if index == len(gf_highs):
+            frontier[gf_low] = None
+            continue
+        frontier[gf_low] = gf_highs[index]
+        if best is None or gf_highs[index] < best[1]:
+            best = (gf_low, gf_highs[index])
+    if best is None:
+        LOGGER.info("no gradient factors meet the limits")
+        return GfOptimizationResult(None, None, None, frontier, evaluated)
+    # the dive of the best candidate is calculated again: the searches
+    # only keep the gradient factors
+    dive = _candidate(start, best[0], best[1], limits)[1]
+    return GfOptimizationResult(best[0], best[1], dive, frontier,
+                                evaluated + 1)
@@ -27,13 +27,14 @@ also initiate log files
 import sys
 import logging
 
-# dependencies imports
-from jinja2 import Environment, PackageLoader
-
 # local imports
 from dipplanner.parse_cli_args import DipplannerCliArguments
 from dipplanner import settings
-from dipplanner.dive import Dive
+from dipplanner.batch import plan_chain, plan_chains
+from dipplanner.dive_table import dive_table
+from dipplanner.plan_cache import PlanCache
+from dipplanner.serialize import WRITERS
+from dipplanner.templating import render
 
 LOGGER = logging.getLogger("dipplanner")
 
@@ -104,37 +105,51 @@ def main(cli_arguments=None):
     dipplanner_arguments = DipplannerCliArguments(cli_arguments)
     dives = dipplanner_arguments.dives
 
-    profiles = []
-    current_dive = None
-    previous_dive = None
-    for dive in dives:
-        if previous_dive is None:
-            current_dive = Dive(
-                dives[dive]['segments'].values(),
-                dives[dive]['tanks'].values())
-        else:
-            current_dive = Dive(
-                dives[dive]['segments'].values(),
-                dives[dive]['tanks'].values(),
-                previous_dive
-            )
-        if dives[dive]['surface_interval']:
-            current_dive.do_surface_interval(dives[dive]['surface_interval'])
-
-        current_dive.do_dive_without_exceptions()
-        profiles.append(current_dive)
-        previous_dive = current_dive
-        # now, dive exceptins do not stop the program anymore, but can be
-        # displayed in the output template instead. The used MUST take care of
-        # the result.
+    if dipplanner_arguments.table:
+        # deco table, using the tanks and the first segment of the last dive
+        (depths, times) = dipplanner_arguments.table
+        last_dive = list(dives.values())[-1]
+        first_segment = list(last_dive['segments'].values())[0]
+        profiles = list(dive_table(depths, times,
+                                   last_dive['tanks'].values(),
+                                   first_segment.tank,
+                                   first_segment.setpoint).values())
+    elif dipplanner_arguments.args.batch:
+        # independent dives, planned in parallel
+        profiles = [dive for chain in plan_chains(
+            [[dive] for dive in dives.values()],
+            dipplanner_arguments.args.jobs) for dive in chain]
+    else:
+        # repetitive dives
+        cache = None
+        if dipplanner_arguments.args.cache:
+            # cached dives are planned on copies of their tanks: the tanks
+            # must not carry the gas used in the previous dives
+            if settings.AUTOMATIC_TANK_REFILL:
+                cache = PlanCache(path=dipplanner_arguments.args.cache)
+            else:
+                LOGGER.warning("plan cache not used without automatic tank "
+                               "refill")
+        profiles = plan_chain(dives.values(), cache=cache)
+        if cache is not None:
+            cache.save()
+            LOGGER.info("plan cache: %s dives read, %s dives calculated",
+                        cache.hits, cache.misses)
+    # now, dive exceptins do not stop the program anymore, but can be
+    # displayed in the output template instead. The used MUST take care of
+    # the result.
 
     # now calculate no flight time based on the last dive
     ######current_dive.no_flight_time_wo_exception()
 
     # now Prepare the output
-    env = Environment(loader=PackageLoader('dipplanner', 'templates'))
-    tpl = env.get_template(settings.TEMPLATE)
-    # pylint: disable=no-member
-    text = tpl.render(settings=settings, dives=profiles)
-    # pylint: enable=no-member
-    print(text)
+    output_format = dipplanner_arguments.args.format
+    if output_format == "text":
+        print(render(settings.TEMPLATE, settings, profiles))
+    else:
+        writer, binary = WRITERS[output_format]
+        if binary:
+            writer(profiles, sys.stdout.buffer)
+        else:
+            writer(profiles, sys.stdout)
+        sys.stdout.flush()
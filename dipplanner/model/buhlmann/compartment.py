@@ -20,13 +20,41 @@
 import math
 import logging
 
-from dipplanner import settings
+from dipplanner.plan_settings import PlanSettingsMixin
 from dipplanner.model.buhlmann.model_exceptions import ModelStateException
+from dipplanner.model.buhlmann.tissue_state import TissueState
 
+LOGGER = logging.getLogger("dipplanner.model.buhlmann.compartment")
 
-class Compartment():
+
+def _state_property(name, doc):
+    """Build a property reading and writing one value of the tissue state.
+
+    :param str name: name of the list attribute in the tissue state
+    :param str doc: docstring of the property
+
+    :returns: property of the compartment
+    :rtype: property
+    """
+    def getter(self):
+        return getattr(self.tissue_state, name)[self.index]
+
+    def setter(self, value):
+        getattr(self.tissue_state, name)[self.index] = value
+
+    return property(getter, setter, doc=doc)
+
+
+class Compartment(PlanSettingsMixin):
     """Buhlmann compartment class.
 
+    A compartment is a view onto one element of a
+    :class:`dipplanner.model.buhlmann.tissue_state.TissueState`: the values
+    are stored in the (array backed) tissue state of the model, and the
+    compartment reads and writes them at its own index.
+
+    A compartment created alone owns a tissue state of one element.
+
     *Attributes:*
         * h_he: helium halftime
         * h_n2: nitrogen halftime
@@ -38,11 +66,31 @@ class Compartment():
         * k_n2: nitrogen : k coefficient (calculated)
         * pp_he: partial pressure of helium
         * pp_n2: partial pressure of nitrogen
+        * tissue_state: tissue state holding the values
+        * index: index of this compartment in the tissue state
     """
 
+    __slots__ = ('plan_settings', 'tissue_state', 'index',
+                 'const_exp_const_depth_he', 'const_exp_const_depth_n2',
+                 'old_k_he', 'old_seg_time')
+
+    h_he = _state_property('h_he', "helium halftime")
+    h_n2 = _state_property('h_n2', "nitrogen halftime")
+    k_he = _state_property('k_he', "helium : k coefficient")
+    k_n2 = _state_property('k_n2', "nitrogen : k coefficient")
+    a_he = _state_property('a_he', "helium : a coefficient")
+    b_he = _state_property('b_he', "helium : b coefficient")
+    a_n2 = _state_property('a_n2', "nitrogen : a coefficient")
+    b_n2 = _state_property('b_n2', "nitrogen : b coefficient")
+    pp_he = _state_property('pp_he', "partial pressure of helium")
+    pp_n2 = _state_property('pp_n2', "partial pressure of nitrogen")
+    a_he_n2 = _state_property('a_he_n2', "a coefficient for He + N2")
+    b_he_n2 = _state_property('b_he_n2', "b coefficient for He + N2")
+
     def __init__(self, h_he=None, h_n2=None,
                  a_he=None, b_he=None,
-                 a_n2=None, b_n2=None):
+                 a_n2=None, b_n2=None,
+                 tissue_state=None, index=0, plan_settings=None):
         """Init of Compartment.
 
         can be called without params, in this case, does not initiate anything
@@ -55,26 +103,22 @@ class Compartment():
         :param float b_he: helium: b coefficient
         :param float a_n2: nitrogen: a coefficient
         :param float b_n2: nitrogen: b coefficient
+        :param tissue_state: [OPTIONAL] tissue state holding the values of
+                             the compartment. If not given, the compartment
+                             creates its own one element tissue state.
+        :type tissue_state: :class:`TissueState`
+        :param int index: index of the compartment in the tissue state
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
         """
-        # initiate class logger
-        self.logger = logging.getLogger(
-            "dipplanner.model.buhlmann.compartment.Compartment")
-        # self.logger.debug("creating an instance of Compartment")
-
-        self.h_he = 0.0
-        self.h_n2 = 0.0
-        self.k_he = 0.0
-        self.k_n2 = 0.0
-        self.a_he = 0.0
-        self.b_he = 0.0
-        self.a_n2 = 0.0
-        self.b_n2 = 0.0
-
-        self.pp_he = 0.0
-        self.pp_n2 = 0.0
-
-        self.a_he_n2 = 0.0
-        self.b_he_n2 = 0.0
+        self.plan_settings = plan_settings
+        # LOGGER.debug("creating an instance of Compartment")
+
+        if tissue_state is None:
+            tissue_state = TissueState(1)
+            index = 0
+        self.tissue_state = tissue_state
+        self.index = index
 
         self.const_exp_const_depth_he = None
         self.const_exp_const_depth_n2 = None
@@ -93,6 +137,9 @@ class Compartment():
 
         Used for "cloning" the object into another new object.
 
+        .. note:: the copy is a standalone compartment: it owns its own
+                  one element tissue state.
+
         :param memo: not used here
 
         :returns: Compartment object copy of itself
@@ -100,15 +147,10 @@ class Compartment():
         """
         newobj = Compartment(self.h_he, self.h_n2,
                              self.a_he, self.b_he,
-                             self.a_n2, self.b_n2)
-        newobj.h_he = self.h_he
-        newobj.h_n2 = self.h_n2
+                             self.a_n2, self.b_n2,
+                             plan_settings=self.plan_settings)
         newobj.k_he = self.k_he
         newobj.k_n2 = self.k_n2
-        newobj.a_he = self.a_he
-        newobj.b_he = self.b_he
-        newobj.a_n2 = self.a_n2
-        newobj.b_n2 = self.b_n2
         newobj.pp_he = self.pp_he
         newobj.pp_n2 = self.pp_n2
         newobj.a_he_n2 = self.a_he_n2
@@ -128,8 +170,8 @@ class Compartment():
         return "He:%s N2:%s mv_at:%s MV:%s" % (
             self.pp_he,
             self.pp_n2,
-            self.get_m_value_at(settings.AMBIANT_PRESSURE_SURFACE),
-            self.get_mv(settings.AMBIANT_PRESSURE_SURFACE))
+            self.get_m_value_at(self.settings.AMBIANT_PRESSURE_SURFACE),
+            self.get_mv(self.settings.AMBIANT_PRESSURE_SURFACE))
 
     def __str__(self):
         """Return a human readable name of the compartement.
@@ -151,14 +193,8 @@ class Compartment():
         :param float a_n2: Nitrogen : a coefficient
         :param float b_n2: Nitrogen : b coefficient
         """
-        self.h_he = h_he
-        self.h_n2 = h_n2
-        self.k_he = math.log(2) / (float(h_he))  # * 60)
-        self.k_n2 = math.log(2) / (float(h_n2))  # * 60)
-        self.a_he = float(a_he)
-        self.b_he = float(b_he)
-        self.a_n2 = float(a_n2)
-        self.b_n2 = float(b_n2)
+        self.tissue_state.set_time_constants(self.index, h_he, h_n2,
+                                             a_he, b_he, a_n2, b_n2)
 
     def set_pp(self, pp_he, pp_n2):
         """Set partial pressures of He and N2.
@@ -170,17 +206,7 @@ class Compartment():
         #   raise ModelStateException("Error in argument:
         #  negative pp is not allowed")
         # else:
-        self.pp_he = pp_he
-        self.pp_n2 = pp_n2
-
-        # calculate_p_a_b_inert
-        # Calculate a_he_n2 and b_he_n2
-        # based on current pp_he and pp_n2 of this compartment
-        #  calculate adjusted a, b coefficients based on those of He and N2
-        self.a_he_n2 = (((self.a_he * pp_he) + (self.a_n2 * pp_n2)) /
-                        (pp_he + pp_n2))
-        self.b_he_n2 = (((self.b_he * pp_he) + (self.b_n2 * pp_n2)) /
-                        (pp_he + pp_n2))
+        self.tissue_state.set_pp(self.index, pp_he, pp_n2)
 
     def const_depth(self, pp_he_inspired, pp_n2_inspired, seg_time):
         """Constant depth calculations.
@@ -253,8 +279,6 @@ class Compartment():
                          (pp_n2_inspired - self.pp_n2 -
                           (rate_n2 / self.k_n2)) *
                          math.exp(-self.k_n2 * seg_time))
-            if self.h_n2 == 4:
-                print(self.h_n2, ": result:", new_pp_n2, "# Pi:", pp_n2_inspired, "# rate n2:", rate_n2, "# seg_time:", seg_time, "# k_n2:", self.k_n2)
             self.set_pp(new_pp_he, new_pp_n2)
 
     def get_m_value_at(self, pressure):
@@ -303,6 +327,6 @@ class Compartment():
         :returns: M-value
         :rtype: float
         """
-        # self.logger.debug("comp m-value for %s : %s" % (p_amb, mv))
+        # LOGGER.debug("comp m-value for %s : %s" % (p_amb, mv))
         return (self.pp_he + self.pp_n2) / (float(p_amb) /
                                             self.b_he_n2 + self.a_he_n2)
@@ -74,6 +74,23 @@ class Gradient():
         newobj.gf_set = self.gf_set
         return newobj
 
+    def snapshot(self):
+        """Return the state of the gradient.
+
+        :returns: (gf_low, gf_high, gf_slope, gf, gf_set)
+        :rtype: tuple
+        """
+        return (self.gf_low, self.gf_high, self.gf_slope, self.gf,
+                self.gf_set)
+
+    def restore(self, values):
+        """Restore the state saved by :meth:`snapshot`.
+
+        :param tuple values: snapshot of the gradient
+        """
+        (self.gf_low, self.gf_high, self.gf_slope, self.gf,
+         self.gf_set) = values
+
     def get_gradient_factor(self):
         """Return current GF with bounds checking.
 
@@ -19,25 +19,121 @@
 """Buhlmann model module.
 
 Contains:
+coefficients -- function
+coefficients_digest -- function
 Model -- class
 """
 import logging
 import copy
+import hashlib
 
-from dipplanner import settings
+from dipplanner.plan_settings import PlanSettingsMixin
 from dipplanner.model.buhlmann.compartment import Compartment
+from dipplanner.model.buhlmann.tissue_state import TissueState
 from dipplanner.model.buhlmann.gradient import Gradient
 from dipplanner.model.buhlmann.oxygen_toxicity import OxTox
 from dipplanner.model.buhlmann.model_exceptions import ModelValidationException
 from dipplanner import tools
 
 
-class Model():
+#: Buhlmann coefficients of the first compartment, for the two sets of
+#: values: 1a (4 mins for 1st comp) and 1b (5 mins)
+#: (h_he, h_n2, a_he, b_he, a_n2, b_n2)
+FIRST_COMPARTMENT_COEFFICIENTS = {
+    '1a': (001.51, 004.0, 1.7424, 0.4245, 1.2599, 0.5050),
+    '1b': (001.88, 005.0, 1.6189, 0.4770, 1.1696, 0.5578), }
+
+#: Buhlmann coefficients of the compartments 2 to 16, for each deco model
+#: (h_he, h_n2, a_he, b_he, a_n2, b_n2)
+#: note: comparing with buhlmann original (1990) ZH-L16 a coeficient,
+#: there is here a x10 factor for a coeficient
+COEFFICIENTS = {
+    'ZHL16c': (
+        (003.02, 008.0, 1.3830, 0.5747, 1.0000, 0.6514),
+        (004.72, 012.5, 1.1919, 0.6527, 0.8618, 0.7222),
+        (006.99, 018.5, 1.0458, 0.7223, 0.7562, 0.7825),
+        (010.21, 027.0, 0.9220, 0.7582, 0.6200, 0.8126),
+        (014.48, 038.3, 0.8205, 0.7957, 0.5043, 0.8434),
+        (020.53, 054.3, 0.7305, 0.8279, 0.4410, 0.8693),
+        (029.11, 077.0, 0.6502, 0.8553, 0.4000, 0.8910),
+        (041.20, 109.0, 0.5950, 0.8757, 0.3750, 0.9092),
+        (055.19, 146.0, 0.5545, 0.8903, 0.3500, 0.9222),
+        (070.69, 187.0, 0.5333, 0.8997, 0.3295, 0.9319),
+        (090.34, 239.0, 0.5189, 0.9073, 0.3065, 0.9403),
+        (115.29, 305.0, 0.5181, 0.9122, 0.2835, 0.9477),
+        (147.42, 390.0, 0.5176, 0.9171, 0.2610, 0.9544),
+        (188.24, 498.0, 0.5172, 0.9217, 0.2480, 0.9602),
+        (240.03, 635.0, 0.5119, 0.9267, 0.2327, 0.9653)),
+    'ZHL16b': (
+        (003.02, 008.0, 1.3830, 0.5747, 1.0000, 0.6514),
+        (004.72, 012.5, 1.1919, 0.6527, 0.8618, 0.7222),
+        (006.99, 018.5, 1.0458, 0.7223, 0.7562, 0.7825),
+        (010.21, 027.0, 0.9220, 0.7582, 0.6667, 0.8126),
+        (014.48, 038.3, 0.8205, 0.7957, 0.5600, 0.8434),
+        (020.53, 054.3, 0.7305, 0.8279, 0.4947, 0.8693),
+        (029.11, 077.0, 0.6502, 0.8553, 0.4500, 0.8910),
+        (041.20, 109.0, 0.5950, 0.8757, 0.4187, 0.9092),
+        (055.19, 146.0, 0.5545, 0.8903, 0.3798, 0.9222),
+        (070.69, 187.0, 0.5333, 0.8997, 0.3497, 0.9319),
+        (090.34, 239.0, 0.5189, 0.9073, 0.3223, 0.9403),
+        (115.29, 305.0, 0.5181, 0.9122, 0.2850, 0.9477),
+        (147.42, 390.0, 0.5176, 0.9171, 0.2737, 0.9544),
+        (188.24, 498.0, 0.5172, 0.9217, 0.2523, 0.9602),
+        (240.03, 635.0, 0.5119, 0.9267, 0.2327, 0.9653)),
+    'ZHL16a': (
+        (003.02, 008.0, 1.3830, 0.5747, 1.0000, 0.6514),
+        (004.72, 012.5, 1.1919, 0.6527, 0.8618, 0.7222),
+        (006.99, 018.5, 1.0458, 0.7223, 0.7562, 0.7825),
+        (010.21, 027.0, 0.9220, 0.7582, 0.6667, 0.8126),
+        (014.48, 038.3, 0.8205, 0.7957, 0.5933, 0.8434),
+        (020.53, 054.3, 0.7305, 0.8279, 0.5282, 0.8693),
+        (029.11, 077.0, 0.6502, 0.8553, 0.4710, 0.8910),
+        (041.20, 109.0, 0.5950, 0.8757, 0.4187, 0.9092),
+        (055.19, 146.0, 0.5545, 0.8903, 0.3798, 0.9222),
+        (070.69, 187.0, 0.5333, 0.8997, 0.3497, 0.9319),
+        (090.34, 239.0, 0.5189, 0.9073, 0.3223, 0.9403),
+        (115.29, 305.0, 0.5181, 0.9122, 0.2971, 0.9477),
+        (147.42, 390.0, 0.5176, 0.9171, 0.2737, 0.9544),
+        (188.24, 498.0, 0.5172, 0.9217, 0.2523, 0.9602),
+        (240.03, 635.0, 0.5119, 0.9267, 0.2327, 0.9653)), }
+
+
+def coefficients():
+    """Return the Buhlmann coefficients of all the models.
+
+    Results calculated when the returned value was different were
+    calculated with other coefficients.
+
+    :returns: first compartment coefficients and coefficients of each deco
+              model, sorted by name
+    :rtype: tuple
+    """
+    return (tuple(sorted(FIRST_COMPARTMENT_COEFFICIENTS.items())),
+            tuple(sorted(COEFFICIENTS.items())))
+
+
+def coefficients_digest():
+    """Return a digest of the Buhlmann coefficients of all the models.
+
+    Same as :func:`coefficients`, in a compact form for the files.
+
+    :returns: sha1 digest (20 bytes)
+    :rtype: bytes
+    """
+    return hashlib.sha1(repr(coefficients()).encode('ascii')).digest()
+
+
+class Model(PlanSettingsMixin):
     """Represent a Buhlmann model.
 
     Composed of a tissue array of Compartment[]
     Has an OxTox and Gradient object
 
+    The tissue loadings and coefficients of all the compartments are held in
+    one TissueState (flat lists): the Compartment objects are views onto it
+    and the model updates (constant depth, ascent/descent) and reductions
+    (ceiling, M-Value, controlling compartment) are done on the whole lists.
+
     Can throw a ModelStateException propagated from a Compartment if pressures
     or time is out of bounds.
 
@@ -51,62 +147,113 @@ class Model():
 
     Attributes:
         * tissues (list)-- a list of Compartments
+        * tissue_state (TissueState) -- values of all the compartments
         * gradient (Gradient) -- gradient factor object
         * ox_tox (OxTox) -- OxTox object
         * metadata (str) -- Stores infos about where the model was created
         * units (str) -- only 'metric' allowed
         * COMPS (int) -- static info : number of compartments
+        * plan_settings (PlanSettings) -- settings of the plan, or None to
+          use the global settings
+        * trace (callable) -- called after each update of the model, or
+          None (default) to disable the trace
+          (see :mod:`dipplanner.model.buhlmann.trace`)
     """
 
     COMPS = 16
 
-    def __init__(self):
-        """Init of Model class."""
+    def __init__(self, plan_settings=None):
+        """Init of Model class.
+
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+        """
+        self.plan_settings = plan_settings
         # initiate class logger
         self.logger = logging.getLogger(
             "dipplanner.model.buhlmann.model.Model")
         self.logger.debug("creating an instance of Model")
 
         self.units = 'metric'
+        self.tissue_state = TissueState(self.COMPS)
         self.tissues = []
         self.ox_tox = OxTox()
         self.gradient = None
         self.init_gradient()
 
         # store water wapour pp
-        self.pp_h2o = tools.calculate_pp_h2o_surf(settings.SURFACE_TEMP)
+        self.pp_h2o = tools.calculate_pp_h2o_surf(self.settings.SURFACE_TEMP)
 
-        for _ in range(self.COMPS):
-            self.tissues.append(Compartment())
+        for index in range(self.COMPS):
+            self.tissues.append(Compartment(tissue_state=self.tissue_state,
+                                            index=index,
+                                            plan_settings=plan_settings))
 
         self.set_time_constants()
 
-        for comp in self.tissues:
-            comp.set_pp(pp_he=0.0,
-                        pp_n2=settings.DEFAULT_AIR_F_INNERT_GAS *
-                        (settings.AMBIANT_PRESSURE_SURFACE - self.pp_h2o))
+        pp_n2 = (self.settings.DEFAULT_AIR_F_INNERT_GAS *
+                 (self.settings.AMBIANT_PRESSURE_SURFACE - self.pp_h2o))
+        self.tissue_state.set_all_pp([0.0] * self.COMPS,
+                                     [pp_n2] * self.COMPS)
 
         self.metadata = "(none)"
+        self.trace = None
 
     def __deepcopy__(self, memo):
         """Deepcopy method will be called by copy.deepcopy.
 
         Used for "cloning" the object into another new object.
+        The copy does not go through __init__: the time constants are
+        copied, not recalculated.
+        The trace is not copied: the copy is not traced.
 
         :param memo: not used here
 
         :returns: Compartment object copy of itself
         :rtype: :class:`Model`
         """
-        newobj = Model()
+        newobj = Model.__new__(Model)
+        newobj.plan_settings = self.plan_settings
+        newobj.logger = self.logger
         newobj.units = self.units
+        newobj.pp_h2o = self.pp_h2o
         newobj.ox_tox = copy.deepcopy(self.ox_tox)
         newobj.gradient = copy.deepcopy(self.gradient)
         newobj.metadata = self.metadata
-        for i in range(0, len(self.tissues)):
-            newobj.tissues[i] = copy.deepcopy(self.tissues[i])
+        newobj.trace = None
+        newobj.tissue_state = copy.deepcopy(self.tissue_state)
+        newobj.tissues = [Compartment(tissue_state=newobj.tissue_state,
+                                      index=index,
+                                      plan_settings=self.plan_settings)
+                          for index in range(self.COMPS)]
         return newobj
 
+    def snapshot(self):
+        """Return the state of the model.
+
+        The snapshot is a flat tuple, and can be given back to
+        :meth:`restore` (on this model or on a copy of it) to go back to
+        this state. This is much cheaper than a copy of the model.
+        The metadata of the model are not part of the snapshot.
+
+        :returns: flat tuple: loadings of the compartments (see
+                  :meth:`TissueState.snapshot`), then the gradient and the
+                  oxygen toxicity states
+        :rtype: tuple
+        """
+        return (self.tissue_state.snapshot() + self.gradient.snapshot() +
+                self.ox_tox.snapshot())
+
+    def restore(self, snapshot):
+        """Restore a state saved by :meth:`snapshot`.
+
+        :param tuple snapshot: snapshot of the model
+        """
+        end = 2 * self.COMPS
+        self.tissue_state.restore(snapshot[:end])
+        self.gradient.restore(snapshot[end:end + 5])
+        self.ox_tox.restore(snapshot[end + 5:])
+
     def __repr__(self):
         """Return a string representing the model.
 
@@ -122,11 +269,11 @@ class Model():
                                  self.tissues[comp_number].pp_n2,
                                  self.gradient.gf,
                                  self.tissues[comp_number].get_m_value_at(
-                                     settings.AMBIANT_PRESSURE_SURFACE),
+                                     self.settings.AMBIANT_PRESSURE_SURFACE),
                                  (self.tissues[comp_number].get_max_amb(
                                      self.gradient.gf)) * 1,
                                  self.tissues[comp_number].get_mv(
-                                     settings.AMBIANT_PRESSURE_SURFACE)))
+                                     self.settings.AMBIANT_PRESSURE_SURFACE)))
         # model_string += "Ceiling: %s\n" % self.ceiling()
         # model_string += "Max surface M-Value: %s\n" % self.m_value(0.0)
         # model_string += "OTUs accumulated: %s" % self.ox_tox.otu
@@ -145,7 +292,7 @@ class Model():
 
         uses the default settings parameters for gf_low and high
         """
-        self.gradient = Gradient(settings.GF_LOW, settings.GF_HIGH)
+        self.gradient = Gradient(self.settings.GF_LOW, self.settings.GF_HIGH)
 
     def set_time_constants(self, deco_model=None):
         """Initialize time constants in buhlmann tissue list.
@@ -154,125 +301,17 @@ class Model():
 
         :param str deco_model: "ZHL16b" or "ZHL16c"
         """
-        # note: comparing with buhlmann original (1990) ZH-L16 a coeficient,
-        # there is here a x10 factor for a coeficient
-        # h_he, h_n2, a_he, b_he, a_n2, b_n2
         if deco_model is None:
-            deco_model = settings.DECO_MODEL
-        if deco_model == "ZHL16c":
-            self.logger.info("model used: Buhlmann ZHL16c")
-            if settings.BUHLMANN_VALUES == '1a':
-                self.tissues[0].set_compartment_time_constants(
-                    001.51, 004.0, 1.7424, 0.4245, 1.2599, 0.5050)
-            elif settings.BUHLMANN_VALUES == '1b':
-                self.tissues[0].set_compartment_time_constants(
-                    001.88, 005.0, 1.6189, 0.4770, 1.1696, 0.5578)
-            self.tissues[1].set_compartment_time_constants(
-                003.02, 008.0, 1.3830, 0.5747, 1.0000, 0.6514)
-            self.tissues[2].set_compartment_time_constants(
-                004.72, 012.5, 1.1919, 0.6527, 0.8618, 0.7222)
-            self.tissues[3].set_compartment_time_constants(
-                006.99, 018.5, 1.0458, 0.7223, 0.7562, 0.7825)
-            self.tissues[4].set_compartment_time_constants(
-                010.21, 027.0, 0.9220, 0.7582, 0.6200, 0.8126)
-            self.tissues[5].set_compartment_time_constants(
-                014.48, 038.3, 0.8205, 0.7957, 0.5043, 0.8434)
-            self.tissues[6].set_compartment_time_constants(
-                020.53, 054.3, 0.7305, 0.8279, 0.4410, 0.8693)
-            self.tissues[7].set_compartment_time_constants(
-                029.11, 077.0, 0.6502, 0.8553, 0.4000, 0.8910)
-            self.tissues[8].set_compartment_time_constants(
-                041.20, 109.0, 0.5950, 0.8757, 0.3750, 0.9092)
-            self.tissues[9].set_compartment_time_constants(
-                055.19, 146.0, 0.5545, 0.8903, 0.3500, 0.9222)
-            self.tissues[10].set_compartment_time_constants(
-                070.69, 187.0, 0.5333, 0.8997, 0.3295, 0.9319)
-            self.tissues[11].set_compartment_time_constants(
-                090.34, 239.0, 0.5189, 0.9073, 0.3065, 0.9403)
-            self.tissues[12].set_compartment_time_constants(
-                115.29, 305.0, 0.5181, 0.9122, 0.2835, 0.9477)
-            self.tissues[13].set_compartment_time_constants(
-                147.42, 390.0, 0.5176, 0.9171, 0.2610, 0.9544)
-            self.tissues[14].set_compartment_time_constants(
-                188.24, 498.0, 0.5172, 0.9217, 0.2480, 0.9602)
-            self.tissues[15].set_compartment_time_constants(
-                240.03, 635.0, 0.5119, 0.9267, 0.2327, 0.9653)
-        elif deco_model == "ZHL16b":
-            self.logger.info("model used: Buhlmann ZHL16b")
-            if settings.BUHLMANN_VALUES == '1a':
-                self.tissues[0].set_compartment_time_constants(
-                    001.51, 004.0, 1.7424, 0.4245, 1.2599, 0.5050)
-            elif settings.BUHLMANN_VALUES == '1b':
-                self.tissues[0].set_compartment_time_constants(
-                    001.88, 005.0, 1.6189, 0.4770, 1.1696, 0.5578)
-            self.tissues[1].set_compartment_time_constants(
-                003.02, 008.0, 1.3830, 0.5747, 1.0000, 0.6514)
-            self.tissues[2].set_compartment_time_constants(
-                004.72, 012.5, 1.1919, 0.6527, 0.8618, 0.7222)
-            self.tissues[3].set_compartment_time_constants(
-                006.99, 018.5, 1.0458, 0.7223, 0.7562, 0.7825)
-            self.tissues[4].set_compartment_time_constants(
-                010.21, 027.0, 0.9220, 0.7582, 0.6667, 0.8126)
-            self.tissues[5].set_compartment_time_constants(
-                014.48, 038.3, 0.8205, 0.7957, 0.5600, 0.8434)
-            self.tissues[6].set_compartment_time_constants(
-                020.53, 054.3, 0.7305, 0.8279, 0.4947, 0.8693)
-            self.tissues[7].set_compartment_time_constants(
-                029.11, 077.0, 0.6502, 0.8553, 0.4500, 0.8910)
-            self.tissues[8].set_compartment_time_constants(
-                041.20, 109.0, 0.5950, 0.8757, 0.4187, 0.9092)
-            self.tissues[9].set_compartment_time_constants(
-                055.19, 146.0, 0.5545, 0.8903, 0.3798, 0.9222)
-            self.tissues[10].set_compartment_time_constants(
-                070.69, 187.0, 0.5333, 0.8997, 0.3497, 0.9319)
-            self.tissues[11].set_compartment_time_constants(
-                090.34, 239.0, 0.5189, 0.9073, 0.3223, 0.9403)
-            self.tissues[12].set_compartment_time_constants(
-                115.29, 305.0, 0.5181, 0.9122, 0.2850, 0.9477)
-            self.tissues[13].set_compartment_time_constants(
-                147.42, 390.0, 0.5176, 0.9171, 0.2737, 0.9544)
-            self.tissues[14].set_compartment_time_constants(
-                188.24, 498.0, 0.5172, 0.9217, 0.2523, 0.9602)
-            self.tissues[15].set_compartment_time_constants(
-                240.03, 635.0, 0.5119, 0.9267, 0.2327, 0.9653)
-        elif deco_model == "ZHL16a":
-            self.logger.info("model used: Buhlmann ZHL16a")
-            if settings.BUHLMANN_VALUES == '1a':
-                self.tissues[0].set_compartment_time_constants(
-                    001.51, 004.0, 1.7424, 0.4245, 1.2599, 0.5050)
-            elif settings.BUHLMANN_VALUES == '1b':
-                self.tissues[0].set_compartment_time_constants(
-                    001.88, 005.0, 1.6189, 0.4770, 1.1696, 0.5578)
-            self.tissues[1].set_compartment_time_constants(
-                003.02, 008.0, 1.3830, 0.5747, 1.0000, 0.6514)
-            self.tissues[2].set_compartment_time_constants(
-                004.72, 012.5, 1.1919, 0.6527, 0.8618, 0.7222)
-            self.tissues[3].set_compartment_time_constants(
-                006.99, 018.5, 1.0458, 0.7223, 0.7562, 0.7825)
-            self.tissues[4].set_compartment_time_constants(
-                010.21, 027.0, 0.9220, 0.7582, 0.6667, 0.8126)
-            self.tissues[5].set_compartment_time_constants(
-                014.48, 038.3, 0.8205, 0.7957, 0.5933, 0.8434)
-            self.tissues[6].set_compartment_time_constants(
-                020.53, 054.3, 0.7305, 0.8279, 0.5282, 0.8693)
-            self.tissues[7].set_compartment_time_constants(
-                029.11, 077.0, 0.6502, 0.8553, 0.4710, 0.8910)
-            self.tissues[8].set_compartment_time_constants(
-                041.20, 109.0, 0.5950, 0.8757, 0.4187, 0.9092)
-            self.tissues[9].set_compartment_time_constants(
-                055.19, 146.0, 0.5545, 0.8903, 0.3798, 0.9222)
-            self.tissues[10].set_compartment_time_constants(
-                070.69, 187.0, 0.5333, 0.8997, 0.3497, 0.9319)
-            self.tissues[11].set_compartment_time_constants(
-                090.34, 239.0, 0.5189, 0.9073, 0.3223, 0.9403)
-            self.tissues[12].set_compartment_time_constants(
-                115.29, 305.0, 0.5181, 0.9122, 0.2971, 0.9477)
-            self.tissues[13].set_compartment_time_constants(
-                147.42, 390.0, 0.5176, 0.9171, 0.2737, 0.9544)
-            self.tissues[14].set_compartment_time_constants(
-                188.24, 498.0, 0.5172, 0.9217, 0.2523, 0.9602)
-            self.tissues[15].set_compartment_time_constants(
-                240.03, 635.0, 0.5119, 0.9267, 0.2327, 0.9653)
+            deco_model = self.settings.DECO_MODEL
+        if deco_model not in COEFFICIENTS:
+            return
+        self.logger.info("model used: Buhlmann %s", deco_model)
+        if self.settings.BUHLMANN_VALUES in FIRST_COMPARTMENT_COEFFICIENTS:
+            self.tissues[0].set_compartment_time_constants(
+                *FIRST_COMPARTMENT_COEFFICIENTS[self.settings.BUHLMANN_VALUES])
+        for comp, coefficients in zip(self.tissues[1:],
+                                      COEFFICIENTS[deco_model]):
+            comp.set_compartment_time_constants(*coefficients)
 
     def validate_model(self):
         """Validate model - checks over the model and looks for corruption.
@@ -309,9 +348,9 @@ class Model():
         control_compartment_number = 0
         max_pressure = 0.0
 
-        for comp_number in range(0, self.COMPS):
-            pressure = self.tissues[comp_number].get_max_amb(
-                self.gradient.gf) - settings.AMBIANT_PRESSURE_SURFACE
+        for comp_number, max_amb in enumerate(
+                self.tissue_state.max_amb(self.gradient.gf)):
+            pressure = max_amb - self.settings.AMBIANT_PRESSURE_SURFACE
             # self.logger.debug("pressure:%s" % pressure)
             if pressure > max_pressure:
                 control_compartment_number = comp_number
@@ -324,15 +363,12 @@ class Model():
         :returns: ceiling depth in meter
         :rtype: float
         """
-        pressure = 0.0
-        for comp in self.tissues:
-            # Get compartment tolerated ambient pressure and convert from
-            # absolute pressure to depth
-            comp_pressure = comp.get_max_amb(
-                self.gradient.gf) - settings.AMBIANT_PRESSURE_SURFACE
-            if comp_pressure > pressure:
-                pressure = comp_pressure
-        return tools.pressure_to_depth(pressure)
+        # Get compartments tolerated ambient pressure and convert from
+        # absolute pressure to depth
+        pressure = max(0.0, max(self.tissue_state.max_amb(self.gradient.gf)) -
+                       self.settings.AMBIANT_PRESSURE_SURFACE)
+        return tools.pressure_to_depth(pressure,
+                                       plan_settings=self.plan_settings)
 
     def ceiling_in_pabs(self):
         """Determine the current ceiling.
@@ -340,14 +376,8 @@ class Model():
         :returns: ceiling in bar (absolute pressure)
         :rtype: float
         """
-        pressure = 0.0
-        for comp in self.tissues:
-            # Get compartment tolerated ambient pressure and convert from
-            # absolute pressure to depth
-            comp_pressure = comp.get_max_amb(self.gradient.gf)
-            if comp_pressure > pressure:
-                pressure = comp_pressure
-        return pressure
+        # Get compartments tolerated ambient pressure
+        return max(0.0, max(self.tissue_state.max_amb(self.gradient.gf)))
 
     def m_value(self, pressure):
         """Determine the maximum M-Value for a given depth (pressure).
@@ -357,32 +387,22 @@ class Model():
         :returns: max M-Value
         :rtype: float
         """
-        p_absolute = pressure + settings.AMBIANT_PRESSURE_SURFACE
-        compartment_mv = 0.0
-        max_mv = 0.0
-
-        for comp in self.tissues:
-            compartment_mv = comp.get_mv(p_absolute)
-            if compartment_mv > max_mv:
-                max_mv = compartment_mv
-        # self.logger.debug("max mv : %s" % max_mv)
-        return max_mv
-
-    def const_depth(self, pressure, seg_time, f_he, f_n2, pp_o2):
-        """Constant depth profile.
+        p_absolute = pressure + self.settings.AMBIANT_PRESSURE_SURFACE
+        return max(0.0, max(self.tissue_state.m_values(p_absolute)))
 
-        Calls Compartment.constDepth for each compartment to update the model.
+    def inspired_pressures(self, pressure, f_he, f_n2, pp_o2):
+        """Partial pressures of inspired inert gases at a given depth.
 
         :param float pressure: pressure of this depth of segment in bar
-        :param float seg_time: time of segment in seconds
         :param float f_he: fraction of inert gas Helium in inspired gas mix
         :param float f_n2: fraction of inert gas Nitrogen in inspired gas mix
         :param float pp_o2: for CCR mode, partial pressure of oxygen in bar.
                             if == 0.0, then: open circuit
 
-        :raises ModelStateException:
+        :returns: (pp_he_inspired, pp_n2_inspired) in bar
+        :rtype: tuple
         """
-        ambiant_pressure = pressure + settings.AMBIANT_PRESSURE_SURFACE
+        ambiant_pressure = pressure + self.settings.AMBIANT_PRESSURE_SURFACE
         if pp_o2 > 0.0:
             # CCR mode
             # Determine pInert by subtracting absolute oxygen pressure and pH2O
@@ -395,17 +415,40 @@ class Model():
             # Verify that pInert is positive. If the setpoint is close to or
             # less than the depth then there is no inert gas.
             if p_inert > 0.0:
-                pp_he_inspired = (p_inert * f_he) / (f_he + f_n2)
-                pp_n2_inspired = (p_inert * f_n2) / (f_he + f_n2)
-            else:
-                pp_he_inspired = 0.0
-                pp_n2_inspired = 0.0
+                return ((p_inert * f_he) / (f_he + f_n2),
+                        (p_inert * f_n2) / (f_he + f_n2))
+            return (0.0, 0.0)
+        # OC mode
+        return ((ambiant_pressure - self.pp_h2o) * f_he,
+                (ambiant_pressure - self.pp_h2o) * f_n2)
 
+    def const_depth(self, pressure, seg_time, f_he, f_n2, pp_o2):
+        """Constant depth profile.
+
+        Updates all the compartments of the model at once
+        (see :meth:`TissueState.const_depth`).
+
+        :param float pressure: pressure of this depth of segment in bar
+        :param float seg_time: time of segment in seconds
+        :param float f_he: fraction of inert gas Helium in inspired gas mix
+        :param float f_n2: fraction of inert gas Nitrogen in inspired gas mix
+        :param float pp_o2: for CCR mode, partial pressure of oxygen in bar.
+                            if == 0.0, then: open circuit
+
+        :raises ModelStateException:
+        """
+        ambiant_pressure = pressure + self.settings.AMBIANT_PRESSURE_SURFACE
+        pp_he_inspired, pp_n2_inspired = self.inspired_pressures(
+            pressure, f_he, f_n2, pp_o2)
+        if pp_o2 > 0.0:
+            # CCR mode
             # update OxTox object
             pp_o2_inspired = pp_o2
             # Check that ppO2Inspired is not greater than the depth.
             # This occurs in shallow deco when the setpoint specified is >depth
-            if pp_o2_inspired <= ambiant_pressure and p_inert > 0.0:
+            # (no inspired inert gas means pInert was not positive)
+            if (pp_o2_inspired <= ambiant_pressure and
+                    pp_he_inspired + pp_n2_inspired > 0.0):
                 # pp_o2 is the setpoint
                 self.ox_tox.add_o2(seg_time, pp_o2)
             else:
@@ -414,8 +457,6 @@ class Model():
                 self.ox_tox.add_o2(seg_time, ambiant_pressure - self.pp_h2o)
         else:
             # OC mode
-            pp_he_inspired = (ambiant_pressure - self.pp_h2o) * f_he
-            pp_n2_inspired = (ambiant_pressure - self.pp_h2o) * f_n2
             # update ox_tox
             if pressure == 0.0:  # surface
                 self.ox_tox.remove_o2(seg_time)
@@ -424,14 +465,131 @@ class Model():
                     seg_time,
                     (ambiant_pressure - self.pp_h2o) * (1.0 - f_he - f_n2))
         if seg_time > 0:
-            print(seg_time)
-            for comp in self.tissues:
-                comp.const_depth(pp_he_inspired, pp_n2_inspired, seg_time)
+            self.tissue_state.const_depth(pp_he_inspired, pp_n2_inspired,
+                                          seg_time)
+        if self.trace is not None:
+            self.trace(self, 'const', pressure, pressure, seg_time,
+                       f_he, f_n2, pp_o2)
+
+    def stop_time(self, pressure, f_he, f_n2, pp_o2, next_stop_depth,
+                  time_increment, max_time):
+        """Length of a deco stop at constant depth.
+
+        Searchs the smallest multiple of time_increment (at least one
+        increment) after which the ceiling is at or above next_stop_depth.
+        The stop time is bracketed by doubling, then bisected: the model
+        is only evaluated a logarithmic number of times and is not
+        modified. This assumes that once the ceiling clears
+        next_stop_depth it stays cleared for a longer stop, i.e. the
+        ceiling does not rise again during the stop. Under this condition
+        the result is the same as looping on :meth:`const_depth` with
+        time_increment and checking :meth:`ceiling` after each step;
+        otherwise it may be a later time at which the ceiling clears.
+
+        :param float pressure: pressure of the stop in bar
+        :param float f_he: fraction of inert gas Helium in inspired gas mix
+        :param float f_n2: fraction of inert gas Nitrogen in inspired gas mix
+        :param float pp_o2: for CCR mode, partial pressure of oxygen in bar.
+                            if == 0.0, then: open circuit
+        :param float next_stop_depth: depth of the next stop in meter
+        :param float time_increment: granularity of the stop time in seconds
+        :param float max_time: maximum allowed stop time in seconds
+
+        :returns: stop time in seconds, or None if the ceiling does not clear
+                  the next stop depth within max_time
+        :rtype: float
+        """
+        pp_he_inspired, pp_n2_inspired = self.inspired_pressures(
+            pressure, f_he, f_n2, pp_o2)
+        gf = self.gradient.gf
+
+        def cleared(nb_increments):
+            """Tell if the ceiling clears after nb_increments."""
+            pp_he, pp_n2 = self.tissue_state.const_depth_loadings(
+                pp_he_inspired, pp_n2_inspired,
+                nb_increments * time_increment)
+            ceiling = tools.pressure_to_depth(
+                max(0.0,
+                    max(self.tissue_state.tolerated_pressures(pp_he, pp_n2,
+                                                              gf)) -
+                    self.settings.AMBIANT_PRESSURE_SURFACE),
+                plan_settings=self.plan_settings)
+            return next_stop_depth >= ceiling
+
+        max_increments = int(max_time // time_increment)
+        if max_increments < 1 or not cleared(1):
+            # bracket the stop time: low never clears, high always clears
+            low = 1
+            high = 2
+            while high < max_increments and not cleared(high):
+                low = high
+                high *= 2
+            if high >= max_increments:
+                high = max_increments
+                if high <= low or not cleared(high):
+                    return None
+            while high - low > 1:
+                middle = (low + high) // 2
+                if cleared(middle):
+                    high = middle
+                else:
+                    low = middle
+            return high * time_increment
+        return time_increment
+
+    def time_to_ceiling(self, ceiling_pabs, f_he, f_n2, max_time):
+        """Surface time until the ceiling is at or below a given pressure.
+
+        Each compartment is solved separately
+        (see :meth:`TissueState.tolerance_times`) and the model needs the
+        longest time. The model is not modified.
+
+        :param float ceiling_pabs: ceiling to reach in bar (absolute pressure)
+        :param float f_he: fraction of inert gas Helium in inspired gas mix
+        :param float f_n2: fraction of inert gas Nitrogen in inspired gas mix
+        :param float max_time: maximum searched time in seconds
+
+        :returns: time in seconds or None if the ceiling is not reached
+                  within max_time
+        :rtype: float
+        """
+        pp_he_inspired, pp_n2_inspired = self.inspired_pressures(
+            0.0, f_he, f_n2, 0.0)
+        times = self.tissue_state.tolerance_times(
+            pp_he_inspired, pp_n2_inspired, self.gradient.gf, ceiling_pabs,
+            max_time)
+        if None in times:
+            return None
+        return max(times)
+
+    def time_to_desaturation(self, max_pp_he, max_pp_n2, f_he, f_n2):
+        """Surface time until all the compartments are desaturated.
+
+        see :meth:`TissueState.desaturation_times`.
+        The model is not modified.
+
+        :param float max_pp_he: max partial pressure of helium
+        :param float max_pp_n2: max partial pressure of nitrogen
+        :param float f_he: fraction of inert gas Helium in inspired gas mix
+        :param float f_n2: fraction of inert gas Nitrogen in inspired gas mix
+
+        :returns: time in seconds or None if the compartments never
+                  desaturate
+        :rtype: float
+        """
+        pp_he_inspired, pp_n2_inspired = self.inspired_pressures(
+            0.0, f_he, f_n2, 0.0)
+        times = self.tissue_state.desaturation_times(
+            pp_he_inspired, pp_n2_inspired, max_pp_he, max_pp_n2)
+        if None in times:
+            return None
+        return max(times)
 
     def asc_desc(self, start, finish, rate, f_he, f_n2, pp_o2):
         """Ascend/Descend profile.
 
-        Calls Compartment.asc_desc to update compartments
+        Updates all the compartments of the model at once
+        (see :meth:`TissueState.asc_desc`).
 
         :param float start: start pressure of this segment in bar
                             (WARNING: not meter ! it's a pressure)
@@ -446,11 +604,13 @@ class Model():
         :raises ModelStateException:
         """
         # rem: here we do not bother of PP_H2O like in constant_depth : WHY ?
-        start_ambiant_pressure = start + settings.AMBIANT_PRESSURE_SURFACE
-        finish_ambiant_pressure = finish + settings.AMBIANT_PRESSURE_SURFACE
+        start_ambiant_pressure = start + self.settings.AMBIANT_PRESSURE_SURFACE
+        finish_ambiant_pressure = (finish +
+                                   self.settings.AMBIANT_PRESSURE_SURFACE)
         # here we have seg_time in min and rate in m/min
         # rate should be in bar/min (or bar/s), not m/min nor m/sec
-        rate = tools.depth_to_pressure(rate)
+        rate = tools.depth_to_pressure(rate,
+                                       plan_settings=self.plan_settings)
         seg_time = abs((finish - start) / rate)
         if pp_o2 > 0.0:
             # CCR mode
@@ -493,6 +653,8 @@ class Model():
                 finish_ambiant_pressure - self.pp_h2o) * (1.0 - f_he - f_n2)
             self.ox_tox.add_o2(seg_time, pp_o2_inspired_avg)
 
-        for comp in self.tissues:
-            comp.asc_desc(pp_he_inspired, pp_n2_inspired,
-                          rate_he, rate_n2, seg_time)
+        self.tissue_state.asc_desc(pp_he_inspired, pp_n2_inspired,
+                                   rate_he, rate_n2, seg_time)
+        if self.trace is not None:
+            self.trace(self, 'asc_desc', start, finish, seg_time,
+                       f_he, f_n2, pp_o2)
@@ -60,6 +60,21 @@ class OxTox():
         newobj.max_ox = self.max_ox
         return newobj
 
+    def snapshot(self):
+        """Return the state of the oxygen toxicity.
+
+        :returns: (cns, otu, max_ox)
+        :rtype: tuple
+        """
+        return (self.cns, self.otu, self.max_ox)
+
+    def restore(self, values):
+        """Restore the state saved by :meth:`snapshot`.
+
+        :param tuple values: snapshot of the oxygen toxicity
+        """
+        (self.cns, self.otu, self.max_ox) = values
+
     def add_o2(self, time, pp_o2):
         """Add oxygen load into model.
 
@@ -0,0 +1,563 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Array backed tissue state of a Buhlmann model.
+
+Contains:
+ExpTable -- class
+TissueState -- class
+"""
+import math
+
+from dipplanner.model.buhlmann.model_exceptions import ModelStateException
+
+
+def time_to_pressure(pp_start, pp_inspired, k_coef, pp_target):
+    """Time for a tissue to reach a target pressure at constant depth.
+
+    Inverse of the instananeous equation: P = Po + (Pi - Po)(1-e^-kt)
+
+    :param float pp_start: initial partial pressure of the inert gas
+    :param float pp_inspired: partial pressure of inspired inert gas
+    :param float k_coef: k coefficient of the inert gas (per minute)
+    :param float pp_target: partial pressure to reach (or go below)
+
+    :returns: time in seconds, 0.0 if already below the target, or None if
+              the target is never reached
+    :rtype: float
+    """
+    if pp_start <= pp_target:
+        return 0.0
+    if pp_target <= pp_inspired:
+        return None
+    return 60 * math.log((pp_start - pp_inspired) /
+                         (pp_target - pp_inspired)) / k_coef
+
+
+class ExpTable():
+    """Table of the e^-kt factors of a set of k coefficients.
+
+    The factors are calculated once for each duration, and the tables are
+    shared by all the tissue states (all the models, all the plans) using
+    the same k coefficients: use :meth:`get` to obtain a table.
+
+    *Attributes:*
+        * k_coefs (tuple) -- k coefficients (per minute)
+        * factors (dict) -- duration (in minutes) -> tuple of e^-kt
+    """
+
+    #: shared tables: k coefficients -> ExpTable
+    _tables = {}
+    #: maximum number of durations in a table (the table is emptied
+    #: when full)
+    MAX_SIZE = 4096
+
+    def __init__(self, k_coefs):
+        """Init of ExpTable.
+
+        :param tuple k_coefs: k coefficients (per minute)
+        """
+        self.k_coefs = k_coefs
+        self.factors = {}
+
+    @classmethod
+    def get(cls, k_coefs):
+        """Return the shared table of the given k coefficients.
+
+        :param list k_coefs: k coefficients (per minute)
+
+        :returns: the table
+        :rtype: :class:`ExpTable`
+        """
+        k_coefs = tuple(k_coefs)
+        table = cls._tables.get(k_coefs)
+        if table is None:
+            table = cls._tables.setdefault(k_coefs, ExpTable(k_coefs))
+        return table
+
+    def exp(self, seg_time):
+        """Return the e^-kt factors for a duration.
+
+        :param float seg_time: duration in minutes
+
+        :returns: e^-kt for each k coefficient
+        :rtype: tuple
+        """
+        try:
+            return self.factors[seg_time]
+        except KeyError:
+            if len(self.factors) >= self.MAX_SIZE:
+                self.factors.clear()
+            factors = tuple(math.exp(-k * seg_time) for k in self.k_coefs)
+            self.factors[seg_time] = factors
+            return factors
+
+
+class TissueState():
+    """Hold the state of all the compartments of a model in flat lists.
+
+    Each list has one element per compartment. The whole-model operations
+    (Haldane and Schreiner equations, ceiling and M-Value reductions) are
+    done on the complete lists at once instead of calling one method per
+    :class:`dipplanner.model.buhlmann.compartment.Compartment`.
+
+    *Attributes:*
+        * size (int) -- number of compartments
+        * h_he, h_n2 (list) -- helium and nitrogen halftimes
+        * k_he, k_n2 (list) -- helium and nitrogen k coefficients
+        * a_he, b_he, a_n2, b_n2 (list) -- a and b coefficients
+        * pp_he, pp_n2 (list) -- partial pressures of helium and nitrogen
+        * a_he_n2, b_he_n2 (list) -- a and b coefficients adjusted for the
+          current He/N2 loadings. They are only needed by the ceiling and
+          M-Value calculations: a change of the loadings just marks them
+          as outdated, and they are calculated again when read.
+    """
+
+    def __init__(self, size):
+        """Init of TissueState.
+
+        :param int size: number of compartments
+        """
+        self.size = size
+        self.h_he = [0.0] * size
+        self.h_n2 = [0.0] * size
+        self.k_he = [0.0] * size
+        self.k_n2 = [0.0] * size
+        self.a_he = [0.0] * size
+        self.b_he = [0.0] * size
+        self.a_n2 = [0.0] * size
+        self.b_n2 = [0.0] * size
+
+        self.pp_he = [0.0] * size
+        self.pp_n2 = [0.0] * size
+
+        self._a_he_n2 = [0.0] * size
+        self._b_he_n2 = [0.0] * size
+        # True when the loadings changed since the last calculation of
+        # _a_he_n2 and _b_he_n2 (see _update_coefficients)
+        self._coefs_dirty = False
+
+        # shared tables of the e^-kt factors (see _exp_tables)
+        self._exp_he = None
+        self._exp_n2 = None
+
+    def __deepcopy__(self, memo):
+        """Deepcopy method will be called by copy.deepcopy.
+
+        Used for "cloning" the object into another new object.
+
+        :param memo: not used here
+
+        :returns: TissueState object copy of itself
+        :rtype: :class:`TissueState`
+        """
+        newobj = TissueState(self.size)
+        for name in ('h_he', 'h_n2', 'k_he', 'k_n2', 'a_he', 'b_he',
+                     'a_n2', 'b_n2', 'pp_he', 'pp_n2',
+                     '_a_he_n2', '_b_he_n2'):
+            setattr(newobj, name, list(getattr(self, name)))
+        newobj._coefs_dirty = self._coefs_dirty
+        newobj._exp_he = self._exp_he
+        newobj._exp_n2 = self._exp_n2
+        return newobj
+
+    def __getstate__(self):
+        """Return the state to be pickled, without the shared tables.
+
+        :returns: state of the object
+        :rtype: dict
+        """
+        state = self.__dict__.copy()
+        state['_exp_he'] = None
+        state['_exp_n2'] = None
+        return state
+
+    def _exp_tables(self):
+        """Return the tables of the e^-kt factors of the compartments.
+
+        :returns: (helium table, nitrogen table)
+        :rtype: tuple of :class:`ExpTable`
+        """
+        if self._exp_he is None:
+            self._exp_he = ExpTable.get(self.k_he)
+            self._exp_n2 = ExpTable.get(self.k_n2)
+        return self._exp_he, self._exp_n2
+
+    def _update_coefficients(self):
+        """Calculate the adjusted a and b coefficients if outdated."""
+        if not self._coefs_dirty:
+            return
+        pp_he = self.pp_he
+        pp_n2 = self.pp_n2
+        self._a_he_n2 = [((a_he * he) + (a_n2 * n2)) / (he + n2)
+                         for a_he, a_n2, he, n2 in zip(self.a_he, self.a_n2,
+                                                       pp_he, pp_n2)]
+        self._b_he_n2 = [((b_he * he) + (b_n2 * n2)) / (he + n2)
+                         for b_he, b_n2, he, n2 in zip(self.b_he, self.b_n2,
+                                                       pp_he, pp_n2)]
+        self._coefs_dirty = False
+
+    @property
+    def a_he_n2(self):
+        """a coefficients adjusted for the current He/N2 loadings.
+
+        :returns: a coefficients of all the compartments
+        :rtype: list
+        """
+        self._update_coefficients()
+        return self._a_he_n2
+
+    @a_he_n2.setter
+    def a_he_n2(self, values):
+        """Set the adjusted a coefficients.
+
+        :param list values: a coefficients of all the compartments
+        """
+        self._update_coefficients()
+        self._a_he_n2 = values
+
+    @property
+    def b_he_n2(self):
+        """b coefficients adjusted for the current He/N2 loadings.
+
+        :returns: b coefficients of all the compartments
+        :rtype: list
+        """
+        self._update_coefficients()
+        return self._b_he_n2
+
+    @b_he_n2.setter
+    def b_he_n2(self, values):
+        """Set the adjusted b coefficients.
+
+        :param list values: b coefficients of all the compartments
+        """
+        self._update_coefficients()
+        self._b_he_n2 = values
+
+    def snapshot(self):
+        """Return the loadings of all the compartments.
+
+        The adjusted a and b coefficients are not part of the snapshot:
+        they only depend on the loadings.
+
+        :returns: flat tuple: pp_he and pp_n2 values of all the
+                  compartments (2 * size values)
+        :rtype: tuple
+        """
+        return (*self.pp_he, *self.pp_n2)
+
+    def restore(self, values):
+        """Restore the loadings saved by :meth:`snapshot`.
+
+        :param tuple values: snapshot of the loadings
+        """
+        size = self.size
+        self.pp_he[:] = values[0:size]
+        self.pp_n2[:] = values[size:2 * size]
+        self._coefs_dirty = True
+
+    def set_time_constants(self, index, h_he, h_n2, a_he, b_he, a_n2, b_n2):
+        """Set the time constants of one compartment.
+
+        :param int index: index of the compartment
+        :param float h_he: Helium Halftime
+        :param float h_n2: Nitrogen Halftime
+        :param float a_he: Helium : a coefficient
+        :param float b_he: Helium : b coefficient
+        :param float a_n2: Nitrogen : a coefficient
+        :param float b_n2: Nitrogen : b coefficient
+        """
+        self.h_he[index] = h_he
+        self.h_n2[index] = h_n2
+        self.k_he[index] = math.log(2) / (float(h_he))
+        self.k_n2[index] = math.log(2) / (float(h_n2))
+        self.a_he[index] = float(a_he)
+        self.b_he[index] = float(b_he)
+        self.a_n2[index] = float(a_n2)
+        self.b_n2[index] = float(b_n2)
+        # k changed: the tables of the exponential factors change
+        self._exp_he = None
+        self._exp_n2 = None
+
+    def set_pp(self, index, pp_he, pp_n2):
+        """Set partial pressures of He and N2 of one compartment.
+
+        the adjusted a and b coefficients are calculated again when needed
+
+        :param int index: index of the compartment
+        :param float pp_he: partial pressure of Helium
+        :param float pp_n2: partial pressure of Nitrogen
+        """
+        self.pp_he[index] = pp_he
+        self.pp_n2[index] = pp_n2
+        self._coefs_dirty = True
+
+    def set_all_pp(self, pp_he, pp_n2):
+        """Set the new partial pressures of all the compartments.
+
+        the adjusted a and b coefficients are calculated again when needed
+
+        :param list pp_he: partial pressures of Helium
+        :param list pp_n2: partial pressures of Nitrogen
+        """
+        self.pp_he = pp_he
+        self.pp_n2 = pp_n2
+        self._coefs_dirty = True
+
+    def const_depth_loadings(self, pp_he_inspired, pp_n2_inspired, seg_time):
+        """Return the loadings after a constant depth, without changing them.
+
+        Uses instananeous equation: P = Po + (Pi - Po)(1-e^-kt)
+
+        :param float pp_he_inspired: partial pressure of inspired helium
+        :param float pp_n2_inspired: partial pressure of inspired nitrogen
+        :param float seg_time: segment time in seconds
+
+        :returns: (pp_he, pp_n2): lists of partial pressures of Helium and
+                  Nitrogen after seg_time
+        :rtype: tuple
+        """
+        seg_time = seg_time / 60
+        exp_he, exp_n2 = self._exp_tables()
+        return ([pp + ((pp_he_inspired - pp) * (1 - factor))
+                 for pp, factor in zip(self.pp_he, exp_he.exp(seg_time))],
+                [pp + ((pp_n2_inspired - pp) * (1 - factor))
+                 for pp, factor in zip(self.pp_n2, exp_n2.exp(seg_time))])
+
+    def tolerated_pressures(self, pp_he, pp_n2, gf):
+        """Get Tolerated Absolute Pressures for given loadings.
+
+        Same as :meth:`max_amb` but for loadings which are not (yet) the
+        ones of this tissue state.
+
+        :param list pp_he: partial pressures of Helium
+        :param list pp_n2: partial pressures of Nitrogen
+        :param float gf: gradient factor : 0.1 to 1.0, typical 0.2 - 0.95
+
+        :returns: maximum tolerated pressures (absolute) in bar
+        :rtype: list
+        """
+        return [((he + n2) -
+                 (((a_he * he) + (a_n2 * n2)) / (he + n2)) * gf) /
+                (gf / (((b_he * he) + (b_n2 * n2)) / (he + n2)) - gf + 1.0)
+                for he, n2, a_he, b_he, a_n2, b_n2 in zip(
+                    pp_he, pp_n2, self.a_he, self.b_he, self.a_n2, self.b_n2)]
+
+    def desaturation_times(self, pp_he_inspired, pp_n2_inspired,
+                           max_pp_he, max_pp_n2):
+        """Constant depth times for each compartment to desaturate.
+
+        A compartment is considered desaturated when its partial pressures
+        are at or below max_pp_he and max_pp_n2.
+
+        :param float pp_he_inspired: partial pressure of inspired helium
+        :param float pp_n2_inspired: partial pressure of inspired nitrogen
+        :param float max_pp_he: max partial pressure of helium
+        :param float max_pp_n2: max partial pressure of nitrogen
+
+        :returns: times in seconds (None for a compartment which never
+                  desaturates)
+        :rtype: list
+        """
+        result = []
+        for he, n2, k_he, k_n2 in zip(self.pp_he, self.pp_n2,
+                                      self.k_he, self.k_n2):
+            time_he = time_to_pressure(he, pp_he_inspired, k_he, max_pp_he)
+            time_n2 = time_to_pressure(n2, pp_n2_inspired, k_n2, max_pp_n2)
+            if time_he is None or time_n2 is None:
+                result.append(None)
+            else:
+                result.append(max(time_he, time_n2))
+        return result
+
+    def tolerance_times(self, pp_he_inspired, pp_n2_inspired, gf,
+                        max_amb_pressure, max_time):
+        """Constant depth times for each compartment to tolerate a pressure.
+
+        Time after which the tolerated absolute pressure of the compartment
+        (see :meth:`max_amb`) is at or below max_amb_pressure.
+        Nitrogen only compartments breathing a helium free gas are solved in
+        closed form, others are bracketed then bisected.
+
+        :param float pp_he_inspired: partial pressure of inspired helium
+        :param float pp_n2_inspired: partial pressure of inspired nitrogen
+        :param float gf: gradient factor : 0.1 to 1.0, typical 0.2 - 0.95
+        :param float max_amb_pressure: absolute pressure to tolerate in bar
+        :param float max_time: max searched time in seconds
+
+        :returns: times in seconds (None for a compartment which does not
+                  tolerate max_amb_pressure within max_time)
+        :rtype: list
+        """
+        result = []
+        for index in range(self.size):
+            a_n2 = self.a_n2[index]
+            b_n2 = self.b_n2[index]
+            if self.pp_he[index] == 0.0 and pp_he_inspired == 0.0:
+                # invert max_amb with a_he_n2 = a_n2 and b_he_n2 = b_n2
+                pp_n2_max = (max_amb_pressure * (gf / b_n2 - gf + 1.0) +
+                             a_n2 * gf)
+                time = time_to_pressure(self.pp_n2[index], pp_n2_inspired,
+                                        self.k_n2[index], pp_n2_max)
+                if time is not None and time > max_time:
+                    time = None
+                result.append(time)
+            else:
+                result.append(self._tolerance_time_search(
+                    index, pp_he_inspired, pp_n2_inspired, gf,
+                    max_amb_pressure, max_time))
+        return result
+
+    def _tolerance_time_search(self, index, pp_he_inspired, pp_n2_inspired,
+                               gf, max_amb_pressure, max_time):
+        """Search the tolerance time of one compartment.
+
+        see :meth:`tolerance_times`
+
+        :returns: time in seconds or None
+        :rtype: float
+        """
+        k_he = self.k_he[index]
+        k_n2 = self.k_n2[index]
+        pp_he = self.pp_he[index]
+        pp_n2 = self.pp_n2[index]
+
+        def tolerated(time):
+            """Tell if the compartment tolerates the pressure after time."""
+            he = pp_he + (pp_he_inspired - pp_he) * (
+                1 - math.exp(-k_he * time / 60))
+            n2 = pp_n2 + (pp_n2_inspired - pp_n2) * (
+                1 - math.exp(-k_n2 * time / 60))
+            return (self.tolerated_pressure(index, he, n2, gf) <=
+                    max_amb_pressure)
+
+        if tolerated(0.0):
+            return 0.0
+        low = 0.0
+        high = 1.0
+        while not tolerated(high):
+            if high >= max_time:
+                return None
+            low = high
+            high = min(high * 2, max_time)
+        while high - low > 0.01:
+            middle = (low + high) / 2
+            if tolerated(middle):
+                high = middle
+            else:
+                low = middle
+        return high
+
+    def tolerated_pressure(self, index, pp_he, pp_n2, gf):
+        """Get Tolerated Absolute Pressure of one compartment.
+
+        :param int index: index of the compartment
+        :param float pp_he: partial pressure of Helium
+        :param float pp_n2: partial pressure of Nitrogen
+        :param float gf: gradient factor : 0.1 to 1.0, typical 0.2 - 0.95
+
+        :returns: maximum tolerated pressure (absolute) in bar
+        :rtype: float
+        """
+        a_he_n2 = (((self.a_he[index] * pp_he) +
+                    (self.a_n2[index] * pp_n2)) / (pp_he + pp_n2))
+        b_he_n2 = (((self.b_he[index] * pp_he) +
+                    (self.b_n2[index] * pp_n2)) / (pp_he + pp_n2))
+        return ((pp_he + pp_n2) - a_he_n2 * gf) / (gf / b_he_n2 - gf + 1.0)
+
+    def const_depth(self, pp_he_inspired, pp_n2_inspired, seg_time):
+        """Constant depth calculations for all the compartments.
+
+        Uses instananeous equation: P = Po + (Pi - Po)(1-e^-kt)
+
+        :param float pp_he_inspired: partial pressure of inspired helium
+        :param float pp_n2_inspired: partial pressure of inspired nitrogen
+        :param float seg_time: segment time in seconds
+
+        :raises ModelStateException: if pp or time < 0
+        """
+        if pp_he_inspired < 0 or pp_n2_inspired < 0 or seg_time < 0:
+            raise ModelStateException(
+                "Error in argument: negative value is not allowed")
+
+        self.set_all_pp(*self.const_depth_loadings(
+            pp_he_inspired, pp_n2_inspired, seg_time))
+
+    def asc_desc(self, pp_he_inspired, pp_n2_inspired,
+                 rate_he, rate_n2, seg_time):
+        """Ascend or descent calculations for all the compartments.
+
+        Uses Schreiner equation : P=Pio+R(t -1/k)-[Pio-Po-(R/k)]e^-kt
+
+        :param float pp_he_inspired: partial pressure of inspired helium
+        :param float pp_n2_inspired: partial pressure of inspired nitrogen
+        :param float rate_he: rate of change of pp_he
+        :param float rate_n2: rate of change of pp_n2
+        :param float seg_time: segment time in seconds
+
+        :raises ModelStateException: if pp or time < 0
+        """
+        # transform rate and time from second to minute
+        rate_he = rate_he * 60
+        rate_n2 = rate_n2 * 60
+        seg_time = seg_time / 60
+
+        if pp_he_inspired < 0 or pp_n2_inspired < 0 or seg_time < 0:
+            raise ModelStateException(
+                "Error in argument: negative value is not allowed")
+
+        exp_he, exp_n2 = self._exp_tables()
+        self.set_all_pp(
+            [(pp_he_inspired + rate_he * (seg_time - (1.0 / k)) -
+              (pp_he_inspired - pp - (rate_he / k)) * factor)
+             for pp, k, factor in zip(self.pp_he, self.k_he,
+                                      exp_he.exp(seg_time))],
+            [(pp_n2_inspired + rate_n2 * (seg_time - (1.0 / k)) -
+              (pp_n2_inspired - pp - (rate_n2 / k)) * factor)
+             for pp, k, factor in zip(self.pp_n2, self.k_n2,
+                                      exp_n2.exp(seg_time))])
+
+    def max_amb(self, gf):
+        """Get Tolerated Absolute Pressure of all the compartments.
+
+        :param float gf: gradient factor : 0.1 to 1.0, typical 0.2 - 0.95
+
+        :returns: maximum tolerated pressures (absolute) in bar
+        :rtype: list
+        """
+        self._update_coefficients()
+        return [((he + n2) - a_he_n2 * gf) / (gf / b_he_n2 - gf + 1.0)
+                for he, n2, a_he_n2, b_he_n2 in zip(self.pp_he, self.pp_n2,
+                                                    self._a_he_n2,
+                                                    self._b_he_n2)]
+
+    def m_values(self, p_amb):
+        """Get the M-Values of all the compartments at an ambient pressure.
+
+        :param float p_amb: ambiant pressure
+
+        :returns: M-values
+        :rtype: list
+        """
+        p_amb = float(p_amb)
+        self._update_coefficients()
+        return [(he + n2) / (p_amb / b_he_n2 + a_he_n2)
+                for he, n2, a_he_n2, b_he_n2 in zip(self.pp_he, self.pp_n2,
+                                                    self._a_he_n2,
+                                                    self._b_he_n2)]
@@ -0,0 +1,100 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Trace of the updates of a model.
+
+A trace is a callable, set as the trace attribute of a
+:class:`dipplanner.model.buhlmann.model.Model`. It is called after each
+update of the model (constant depth or ascent/descent) with:
+
+    .. code-block:: python
+
+        trace(model, event, start, finish, seg_time, f_he, f_n2, pp_o2)
+
+where event is 'const' or 'asc_desc', and start and finish are the
+pressures (in bar) at the beginning and at the end of the update.
+
+The trace is disabled (and costs nothing) when the trace attribute is None.
+
+    .. code-block:: python
+
+        buffer = TraceBuffer()
+        dive.model.trace = buffer
+        dive.do_dive()
+        for record in buffer:
+            print(record.event, record.seg_time, record.snapshot)
+"""
+from collections import deque, namedtuple
+
+#: one update of the model, with the snapshot of the model after the update
+#: (see :meth:`dipplanner.model.buhlmann.model.Model.snapshot`)
+TraceRecord = namedtuple('TraceRecord', ('event', 'start', 'finish',
+                                         'seg_time', 'f_he', 'f_n2',
+                                         'pp_o2', 'snapshot'))
+
+
+class TraceBuffer():
+    """Trace recording the tissue state after each update of a model.
+
+    *Attributes:*
+        * records (deque) -- the :data:`TraceRecord` records
+    """
+
+    def __init__(self, maxlen=None):
+        """Init of TraceBuffer.
+
+        :param int maxlen: [OPTIONAL] maximum number of records: the oldest
+                           records are dropped. (default: no limit)
+        """
+        self.records = deque(maxlen=maxlen)
+
+    def __call__(self, model, event, start, finish, seg_time,
+                 f_he, f_n2, pp_o2):
+        """Record an update of the model.
+
+        :param model: updated model
+        :type model: :class:`dipplanner.model.buhlmann.model.Model`
+        :param str event: 'const' or 'asc_desc'
+        :param float start: start pressure of the update in bar
+        :param float finish: finish pressure of the update in bar
+        :param float seg_time: time of the update in seconds
+        :param float f_he: fraction of inert gas Helium in inspired gas mix
+        :param float f_n2: fraction of inert gas Nitrogen in inspired gas mix
+        :param float pp_o2: for CCR mode, partial pressure of oxygen in bar
+        """
+        self.records.append(TraceRecord(event, start, finish, seg_time,
+                                        f_he, f_n2, pp_o2, model.snapshot()))
+
+    def __len__(self):
+        """Return the number of records.
+
+        :returns: number of records
+        :rtype: int
+        """
+        return len(self.records)
+
+    def __iter__(self):
+        """Iterate over the records, oldest first.
+
+        :returns: iterator of :data:`TraceRecord`
+        """
+        return iter(self.records)
+
+    def clear(self):
+        """Remove all the records."""
+        self.records.clear()
@@ -46,6 +46,8 @@ class DipplannerCliArguments():
                       'dive2': { 'tanks': {},
                                  'segments': {},
                                  'surface_interval':60 }}
+
+    * table: None, or (depths, times) of the deco table mode
     """
 
     def __init__(self, cli_arguments):
@@ -77,6 +79,7 @@ class DipplannerCliArguments():
 
         self.args = None
         self.dives = None
+        self.table = None
 
         # parse the options
         args = self.parser.parse_args(cli_arguments[1:])
@@ -224,6 +227,35 @@ class DipplannerCliArguments():
             type=float,
             help="""Change ambiant pressure at sea level (in bar)""")
 
+        group3.add_argument(
+            "--batch", action="store_true",
+            help="""batch mode: each dive is planned independently
+      (not as a repetitive dive of the previous one) and the dives are
+      planned in parallel (see --jobs)""")
+        group3.add_argument(
+            "--jobs", metavar="VAL", type=int,
+            help="""number of processes used in batch mode.
+      Default: number of cpus""")
+        group3.add_argument(
+            "--table", metavar="DEPTHS;TIMES", type=str,
+            help="""deco table mode: plan a square dive for each depth and
+      each bottom time, using the tanks, the tank and the setpoint of the
+      first segment of the last dive
+      Format:  "depth,depth,...;time,time,..."
+      Example: "20,30,40;10*60,20*60,30*60"
+      * depths: in meter
+      * times : in seconds (operations are allowed like: '30*60')""")
+        group3.add_argument(
+            "--cache", metavar="FILE", type=str,
+            help="""plan cache file: the repetitive dives already planned
+      with the same inputs after the same previous dives are read from
+      this file instead of being calculated again (only the dives from
+      the first changed one are calculated), and the new dives are added
+      to it. Each dive then keeps the CNS and OTU of its own end.
+      Only used with automatic tank refill. The file is a python pickle:
+      only use a trusted file, written by dipplanner itself, as loading a
+      crafted file can run arbitrary code.""")
+
     def output_params_arguments(self):
         """Output parameters."""
         group4 = self.parser.add_argument_group("Output Parameters")
@@ -232,6 +264,14 @@ class DipplannerCliArguments():
             type=str,
             help="""Name of the template to be used
       The template file should be present in ./templates""")
+        group4.add_argument(
+            "--format", metavar="FORMAT", type=str, default="text",
+            choices=("text", "jsonl", "csv", "binary"),
+            help="""Output format:
+      * text  : the template (default)
+      * jsonl : one JSON object per dive and per line
+      * csv   : one row per output segment
+      * binary: compact binary records""")
 
     def check_arguments(self, args):
         """Parse all command lines options.
@@ -406,6 +446,20 @@ class DipplannerCliArguments():
                                     'segments': segments,
                                     'surface_interval': 0}
 
+        if args.table:
+            try:
+                (depths, times) = args.table.split(";")
+                self.table = (
+                    [float(safe_eval_calculator(depth))
+                     for depth in depths.split(",")],
+                    [float(safe_eval_calculator(time))
+                     for time in times.split(",")])
+            except (ValueError, SyntaxError):
+                self.parser.error(
+                    "Error : wrong table format (%s) !" % args.table)
+            if not dives or not list(dives.values())[-1]['segments']:
+                self.parser.error("Error : no dive provided for the table !")
+
         if args.template:
             settings.TEMPLATE = args.template
             # returns
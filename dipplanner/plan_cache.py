@@ -0,0 +1,301 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Cache of calculated dives, for identical plan requests.
+
+A plan is identified by a hashable key built from its inputs: segments,
+tanks, settings and, for repetitive dives, the state of the model of the
+previous dive.
+An identical plan returns a copy of the stored dive (output segments, gas
+consumption, CNS and OTU) instead of being calculated again.
+
+    .. code-block:: python
+
+        cache = PlanCache(maxsize=256, path="plans.cache")
+        dive = cache.plan(segments, tanks)
+        cache.save()
+
+The cache is emptied when the Buhlmann coefficients of the model change.
+A saved file is ignored when it was written with other coefficients, by
+another version of dipplanner or with another file format.
+
+.. note::
+
+    The file is a pickle: loading a crafted file can run arbitrary code.
+    Only load cache files written by yourself, from a trusted location.
+
+Contains:
+plan_key -- function
+PlanCache -- class
+"""
+import os
+import copy
+import pickle
+import logging
+from collections import OrderedDict
+
+# local imports
+from dipplanner import settings
+from dipplanner.dive import Dive
+from dipplanner.plan_settings import current_settings
+from dipplanner.model.buhlmann.model import coefficients
+
+LOGGER = logging.getLogger("dipplanner.plan_cache")
+
+#: version of the file format
+VERSION = 2
+
+
+def _tank_key(tank):
+    """Return the key of a tank.
+
+    :param tank: tank
+    :type tank: :class:`dipplanner.tank.Tank`
+
+    :returns: gas, volumes and state of the tank
+    :rtype: tuple
+    """
+    return (tank.f_o2, tank.f_he, tank.max_ppo2, tank.mod, tank.tank_vol,
+            tank.tank_pressure, tank.in_use, tank.total_gas, tank.used_gas,
+            tank.remaining_gas, tank.min_gas)
+
+
+def plan_key(segments, tanks, previous_profile=None, surface_interval=0,
+             plan_settings=None):
+    """Return the key of a plan.
+
+    Two plans with the same key give the same dive.
+    The tank of each segment is identified by its index in tanks (by
+    identity, not by value): two identical tanks are not mixed up.
+
+    :param segments: input segments of the dive
+    :type segments: list of :class:`dipplanner.segment.Segment`
+    :param tanks: tanks of the dive
+    :type tanks: list of :class:`dipplanner.tank.Tank`
+    :param previous_profile: previous dive, for repetitive dives
+    :type previous_profile: :class:`dipplanner.dive.Dive`
+    :param int surface_interval: surface interval after the previous dive,
+                                 in seconds
+    :param plan_settings: settings of the plan (default: the settings of
+                          the previous dive, or the global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+
+    :returns: hashable key
+    :rtype: tuple
+    """
+    if plan_settings is None and previous_profile is not None:
+        plan_settings = previous_profile.plan_settings
+    if plan_settings is None:
+        plan_settings = current_settings()
+    # the template only changes the output, not the dive
+    plan_settings = plan_settings._replace(TEMPLATE=None)
+    if previous_profile is None:
+        previous = None
+    else:
+        previous = previous_profile.model.snapshot()
+    tank_indexes = {id(tank): index for index, tank in enumerate(tanks)}
+    return (plan_settings,
+            tuple((segment.type, segment.in_use, segment.depth, segment.time,
+                   segment.setpoint,
+                   tank_indexes.get(id(segment.tank),
+                                    _tank_key(segment.tank)))
+                  for segment in segments),
+            tuple(_tank_key(tank) for tank in tanks),
+            previous,
+            surface_interval)
+
+
+class PlanCache():
+    """Bounded LRU cache of calculated dives.
+
+    *Attributes:*
+        * maxsize (int) -- max number of stored dives
+        * path (str) -- file used to save the cache, or None
+        * hits (int) -- number of plans found in the cache
+        * misses (int) -- number of calculated plans
+    """
+
+    def __init__(self, maxsize=256, path=None):
+        """Init of PlanCache.
+
+        If the file exists, the cache is loaded from it.
+
+        :param int maxsize: max number of stored dives
+        :param str path: [OPTIONAL] file used to save the cache
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._dives = OrderedDict()
+        self._coefficients = coefficients()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        """Return the number of stored dives.
+
+        :returns: number of stored dives
+        :rtype: int
+        """
+        self._check_coefficients()
+        return len(self._dives)
+
+    def _check_coefficients(self):
+        """Empty the cache if the coefficients of the model changed."""
+        current = coefficients()
+        if current != self._coefficients:
+            LOGGER.info("model coefficients changed: plan cache emptied")
+            self._dives.clear()
+            self._coefficients = current
+
+    def clear(self):
+        """Empty the cache."""
+        self._dives.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return a copy of the dive stored for a plan.
+
+        :param tuple key: key of the plan (see :func:`plan_key`)
+
+        :returns: copy of the calculated dive, or None if not stored
+        :rtype: :class:`dipplanner.dive.Dive`
+        """
+        self._check_coefficients()
+        pickled_dive = self._dives.get(key)
+        if pickled_dive is None:
+            return None
+        self._dives.move_to_end(key)
+        return pickle.loads(pickled_dive)
+
+    def put(self, key, dive):
+        """Store a copy of a calculated dive.
+
+        The dive is stored pickled: loading it is faster than a deepcopy.
+        Dives with errors are not stored.
+
+        :param tuple key: key of the plan (see :func:`plan_key`)
+        :param dive: calculated dive
+        :type dive: :class:`dipplanner.dive.Dive`
+        """
+        if dive.dive_exceptions:
+            return
+        self._check_coefficients()
+        self._dives[key] = pickle.dumps(dive, pickle.HIGHEST_PROTOCOL)
+        self._dives.move_to_end(key)
+        while len(self._dives) > self.maxsize:
+            self._dives.popitem(last=False)
+
+    def plan(self, segments, tanks, previous_profile=None,
+             surface_interval=0, plan_settings=None):
+        """Return the calculated dive of a plan.
+
+        The dive is calculated like in
+        :func:`dipplanner.batch.plan_chain`, unless the same plan is
+        already in the cache.
+        The given segments, tanks and previous dive are not modified: the
+        dive uses copies of them.
+
+        :param segments: input segments of the dive
+        :type segments: list of :class:`dipplanner.segment.Segment`
+        :param tanks: tanks of the dive
+        :type tanks: list of :class:`dipplanner.tank.Tank`
+        :param previous_profile: previous dive, for repetitive dives
+        :type previous_profile: :class:`dipplanner.dive.Dive`
+        :param int surface_interval: surface interval after the previous
+                                     dive, in seconds
+        :param plan_settings: settings of the plan (default: the settings
+                              of the previous dive, or the global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+
+        :returns: calculated dive
+        :rtype: :class:`dipplanner.dive.Dive`
+        """
+        segments = list(segments)
+        tanks = list(tanks)
+        key = plan_key(segments, tanks, previous_profile, surface_interval,
+                       plan_settings)
+        dive = self.get(key)
+        if dive is not None:
+            self.hits += 1
+            return dive
+
+        self.misses += 1
+        (segments, tanks) = copy.deepcopy((segments, tanks))
+        if previous_profile is not None:
+            # only the model of the previous dive is used (and changed)
+            previous_profile = copy.copy(previous_profile)
+            previous_profile.model = copy.deepcopy(previous_profile.model)
+        dive = Dive(segments, tanks, previous_profile, plan_settings)
+        if surface_interval:
+            dive.do_surface_interval(surface_interval)
+        dive.do_dive_without_exceptions()
+        self.put(key, dive)
+        return dive
+
+    def save(self, path=None):
+        """Save the cache in a file.
+
+        :param str path: file (default: the path of the cache)
+        """
+        if path is None:
+            path = self.path
+        self._check_coefficients()
+        with open(path, "wb") as cache_file:
+            pickle.dump({'format': VERSION,
+                         'version': settings.__VERSION__,
+                         'coefficients': self._coefficients,
+                         'dives': list(self._dives.items())},
+                        cache_file, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path=None):
+        """Load the dives saved in a file.
+
+        The dives of the file replace the dives of the cache. A file which
+        can not be read, or saved with another file format, another
+        version of dipplanner or other model coefficients is ignored: its
+        dives may be different from the dives calculated by this version.
+        The file is unpickled: it must be trusted (see the module
+        documentation).
+
+        :param str path: file (default: the path of the cache)
+        """
+        if path is None:
+            path = self.path
+        try:
+            with open(path, "rb") as cache_file:
+                content = pickle.load(cache_file)
+            file_format = content['format']
+            version = content['version']
+        except (pickle.PickleError, AttributeError, EOFError, ImportError,
+                IndexError, KeyError, TypeError, ValueError) as exc:
+            LOGGER.info("plan cache %s ignored: unable to read it (%s)",
+                        path, exc)
+            return
+        if file_format != VERSION or version != settings.__VERSION__:
+            LOGGER.info("plan cache %s ignored: saved by another version",
+                        path)
+            return
+        if content['coefficients'] != coefficients():
+            LOGGER.info("plan cache %s ignored: other model coefficients",
+                        path)
+            return
+        self._dives = OrderedDict(content['dives'][-self.maxsize:])
+        self._coefficients = content['coefficients']
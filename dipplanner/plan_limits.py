@@ -0,0 +1,201 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Hard limits of a dive plan, checked while the dive is calculated.
+
+The dive is calculated segment by segment (see
+:meth:`dipplanner.dive.Dive.iter_dive`), and stops as soon as a limit
+is provably violated: the rest of the ascent is not calculated.
+
+    .. code-block:: python
+
+        limits = PlanLimits(max_run_time=60 * 60, min_reserve=500)
+        violation = plan_within_limits(dive, limits)
+        if violation is not None:
+            print(violation.limit, violation.value)
+
+A limit is provably violated when:
+
+* max_run_time: the run time of the current segment, plus the time to
+  ascend from its depth to the surface without any stop, exceeds it
+* max_deco_time: the sum of the deco stops done exceeds it
+* min_reserve, tank_rules: the remaining gas of a tank is below the
+  reserve, or below the rule of the tank (gas is only consumed)
+* max_cns, max_otu: the oxygen toxicity exceeds it (it only increases
+  during the dive)
+
+Contains:
+LimitViolation -- class
+PlanLimits -- class
+plan_within_limits -- function
+"""
+import logging
+from collections import namedtuple
+
+# local imports
+from dipplanner.dipp_exception import DipplannerException
+
+LOGGER = logging.getLogger("dipplanner.plan_limits")
+
+
+class LimitViolation(DipplannerException):
+    """A limit of the plan is violated.
+
+    *Attributes:*
+        * limit (str) -- name of the violated limit (see
+          :class:`PlanLimits`)
+        * threshold -- value of the limit
+        * value -- value which violates the limit
+        * run_time (float) -- run time of the segment where the limit is
+          violated, in seconds
+        * depth (float) -- depth of this segment, in meter
+    """
+
+    def __init__(self, limit, threshold, value, segment):
+        """Init of the Exception.
+
+        :param str limit: name of the violated limit
+        :param threshold: value of the limit
+        :param value: value which violates the limit
+        :param segment: segment where the limit is violated
+        :type segment: :class:`dipplanner.segment.Segment`
+        """
+        super().__init__("%s violated: %s (limit: %s) at %sm, run time %ss" %
+                         (limit, value, threshold, segment.depth,
+                          segment.run_time))
+        self.limit = limit
+        self.threshold = threshold
+        self.value = value
+        self.run_time = segment.run_time
+        self.depth = segment.depth
+        # violations are expected results of a plan, not errors
+        self.logger.debug(
+            "Raising an exception: LimitViolation ! (%s)", self.description)
+
+
+class PlanLimits(namedtuple('PlanLimits', ('max_run_time', 'max_deco_time',
+                                           'min_reserve', 'tank_rules',
+                                           'max_cns', 'max_otu'))):
+    """Hard limits of a dive plan.
+
+    All the limits are optional: None (or False for tank_rules) means no
+    limit.
+
+    *Attributes:*
+        * max_run_time (float) -- max run time of the dive, in seconds
+        * max_deco_time (float) -- max total time of the deco stops, in
+          seconds
+        * min_reserve (float) -- min remaining gas in each tank, in liter
+        * tank_rules (bool) -- the remaining gas of each tank must respect
+          the rule of the tank (see :meth:`dipplanner.tank.Tank.check_rule`)
+        * max_cns (float) -- max CNS (1.0 is 100%)
+        * max_otu (float) -- max OTU
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, max_run_time=None, max_deco_time=None, min_reserve=None,
+                tank_rules=False, max_cns=None, max_otu=None):
+        """Create the limits.
+
+        :returns: limits
+        :rtype: :class:`PlanLimits`
+        """
+        return super().__new__(cls, max_run_time, max_deco_time, min_reserve,
+                               tank_rules, max_cns, max_otu)
+
+    def check(self, dive, segment, deco_time):
+        """Check the limits after a segment of a dive.
+
+        :param dive: dive being calculated
+        :type dive: :class:`dipplanner.dive.Dive`
+        :param segment: last calculated segment of the dive, with its run
+                        time set and its gas consumed
+        :type segment: :class:`dipplanner.segment.Segment`
+        :param float deco_time: total time of the deco stops done, in
+                                seconds
+
+        :returns: the first violated limit, or None
+        :rtype: :class:`LimitViolation`
+        """
+        if self.max_run_time is not None:
+            plan_settings = dive.settings
+            # fastest possible ascent to the surface
+            run_time = segment.run_time + segment.depth / max(
+                plan_settings.ASCENT_RATE, plan_settings.DECO_ASCENT_RATE)
+            if run_time > self.max_run_time:
+                return LimitViolation('max_run_time', self.max_run_time,
+                                      run_time, segment)
+        if self.max_deco_time is not None and deco_time > self.max_deco_time:
+            return LimitViolation('max_deco_time', self.max_deco_time,
+                                  deco_time, segment)
+        tank = segment.tank
+        if (self.min_reserve is not None and
+                tank.remaining_gas < self.min_reserve):
+            return LimitViolation('min_reserve', self.min_reserve,
+                                  tank.remaining_gas, segment)
+        if self.tank_rules and not tank.check_rule():
+            return LimitViolation('tank_rules', tank.min_gas,
+                                  tank.remaining_gas, segment)
+        ox_tox = dive.model.ox_tox
+        if self.max_cns is not None and ox_tox.cns > self.max_cns:
+            return LimitViolation('max_cns', self.max_cns, ox_tox.cns,
+                                  segment)
+        if self.max_otu is not None and ox_tox.otu > self.max_otu:
+            return LimitViolation('max_otu', self.max_otu, ox_tox.otu,
+                                  segment)
+        return None
+
+
+def plan_within_limits(dive, limits):
+    """Calculate a dive, stopping at the first violated limit.
+
+    Without violation, the dive is the same as after
+    :meth:`dipplanner.dive.Dive.do_dive`.
+    With a violation, the dive stays unfinished (at the depth of the
+    segment where the limit is violated, its tanks partially consumed)
+    and the violation is added to its dive_exceptions.
+    If the input segments of the dive are already calculated (see
+    :meth:`dipplanner.dive.Dive.do_dive_segments`), only its final ascent
+    is calculated.
+
+    :param dive: dive to calculate
+    :type dive: :class:`dipplanner.dive.Dive`
+    :param limits: limits of the plan
+    :type limits: :class:`PlanLimits`
+
+    :returns: the violated limit, or None
+    :rtype: :class:`LimitViolation`
+
+    :raises NothingToProcess: if there is no input segment to process
+    :raises ModelException: <Exceptions from model>
+    """
+    deco_time = 0
+    if dive.output_segments:
+        segments = dive.iter_final_ascent()
+    else:
+        segments = dive.iter_dive()
+    for segment in segments:
+        if segment.type == 'deco':
+            deco_time += segment.time
+        violation = limits.check(dive, segment, deco_time)
+        if violation is not None:
+            segments.close()
+            dive.dive_exceptions.append(violation)
+            return violation
+    return None
@@ -0,0 +1,109 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Immutable settings of one dive plan.
+
+The global settings (:mod:`dipplanner.settings`) are shared by all the
+dives calculated in the same process. A :class:`PlanSettings` object
+holds the same values, but for only one plan: it can be given
+(as plan_settings argument) to :class:`dipplanner.dive.Dive`,
+:class:`dipplanner.model.buhlmann.model.Model`,
+:class:`dipplanner.tank.Tank`, the segments and the
+:mod:`dipplanner.tools` functions.
+When no plan settings are given, the global settings are used.
+
+    .. code-block:: python
+
+        plan_settings = current_settings(GF_LOW=0.2, GF_HIGH=0.85)
+        dive = Dive(segments, tanks, plan_settings=plan_settings)
+
+Contains:
+PlanSettings -- class
+current_settings -- function
+get_settings -- function
+PlanSettingsMixin -- class
+"""
+from collections import namedtuple
+
+# local imports
+from dipplanner import settings
+
+#: names of all the settings
+SETTINGS_NAMES = tuple(name for name in dir(settings)
+                       if name.isupper() and not name.startswith('_'))
+
+
+class PlanSettings(namedtuple('PlanSettings', SETTINGS_NAMES)):
+    """Settings of one dive plan.
+
+    Has one (read only) attribute per global setting.
+    """
+
+    __slots__ = ()
+
+    @property
+    def __VERSION__(self):
+        """Software version (not a plan setting)."""
+        return settings.__VERSION__
+
+
+def current_settings(**changes):
+    """Return the plan settings built from the current global settings.
+
+    :param changes: settings to change, like: GF_LOW=0.2
+
+    :returns: plan settings
+    :rtype: :class:`PlanSettings`
+
+    :raises ValueError: if a change is not a setting name
+    """
+    return PlanSettings(**dict(
+        (name, getattr(settings, name)) for name in SETTINGS_NAMES)
+    )._replace(**changes)
+
+
+def get_settings(plan_settings=None):
+    """Return the settings to be used.
+
+    :param plan_settings: plan settings, or None for the global settings
+    :type plan_settings: :class:`PlanSettings`
+
+    :returns: plan_settings, or the global settings module
+    """
+    if plan_settings is None:
+        return settings
+    return plan_settings
+
+
+class PlanSettingsMixin():
+    """Give a settings attribute to objects having a plan_settings.
+
+    settings is the :class:`PlanSettings` given to the object, or the
+    global settings module if none was given.
+    """
+
+    __slots__ = ()
+
+    plan_settings = None
+
+    @property
+    def settings(self):
+        """Settings used by this object."""
+        if self.plan_settings is None:
+            return settings
+        return self.plan_settings
@@ -22,11 +22,13 @@ A segment is a portion of a dive in the same depth (depth + duration)
 """
 import logging
 
-from dipplanner import settings
+from dipplanner.plan_settings import PlanSettingsMixin
 from dipplanner.dipp_exception import DipplannerException
 from dipplanner.tools import seconds_to_mmss
 from dipplanner.tools import depth_to_pressure
 
+LOGGER = logging.getLogger("dipplanner.segment")
+
 
 class UnauthorizedMod(DipplannerException):
     """Raised when the MOD is not possible.
@@ -44,7 +46,7 @@ class UnauthorizedMod(DipplannerException):
             "Raising an exception: UnauthorizedMod ! (%s)", description)
 
 
-class Segment():
+class Segment(PlanSettingsMixin):
     """Base class for all types of segments.
 
     *Attributes:*
@@ -65,19 +67,24 @@ class Segment():
         * run_time (float) -- runtime (displayed in profile informations)
         * setpoint (float) -- setpoint for CCR
         * tank (Tank) -- refer to tank object used in this segment
+        * plan_settings (PlanSettings) -- settings of the plan, or None to
+          use the global settings
     """
 
+    __slots__ = ('type', 'in_use', 'depth', 'time', 'run_time', 'setpoint',
+                 'tank', 'plan_settings')
+
     types = ['const', 'ascent', 'descent', 'deco', 'waypoint', 'surf']
 
-    def __init__(self):
+    def __init__(self, plan_settings=None):
         """Initialisation of the Segment base class.
 
         just defines all the parameters
-        """
-        # initiate class logger
-        self.logger = logging.getLogger(self.__class__.__name__)
-        # self.logger.debug("creating an instance of Segment")
 
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+        """
+        # LOGGER.debug("creating an instance of Segment")
         self.type = None  # type of segment : base class has no type
         self.in_use = True  # is this segment in use : default: yes
         self.depth = 0.0  # depth of this segment, in meter
@@ -85,6 +92,7 @@ class Segment():
         self.run_time = 0.0  # runtime in profile
         self.setpoint = 0.0  # for CCR
         self.tank = None  # tank used for this segment
+        self.plan_settings = plan_settings
 
     def __repr__(self):
         """Return a string representing the actual segment.
@@ -175,7 +183,7 @@ class Segment():
         """
         return seconds_to_mmss(self.run_time)
 
-    def get_p_absolute(self, method=settings.METHOD_FOR_DEPTH_CALCULATION):
+    def get_p_absolute(self, method=None):
         """Return the absolute pression in bar.
 
         (1atm = 1ATA = 1.01325 bar = 14.70psi)
@@ -191,11 +199,15 @@ class Segment():
 
         :raises ValueError: when providing a bad method
         """
+        if method is None:
+            method = self.settings.METHOD_FOR_DEPTH_CALCULATION
         if method == 'simple':
-            return float(self.depth) / 10 + settings.AMBIANT_PRESSURE_SURFACE
+            return (float(self.depth) / 10 +
+                    self.settings.AMBIANT_PRESSURE_SURFACE)
         elif method == 'complex':
-            return (depth_to_pressure(self.depth) +
-                    settings.AMBIANT_PRESSURE_SURFACE)
+            return (depth_to_pressure(self.depth,
+                                      plan_settings=self.plan_settings) +
+                    self.settings.AMBIANT_PRESSURE_SURFACE)
         else:
             raise ValueError("invalid method of calculation")
 
@@ -220,7 +232,9 @@ class Segment():
 class SegmentDive(Segment):
     """Specialisation of segment class for dive segments."""
 
-    def __init__(self, depth, time, tank, setpoint=0):
+    __slots__ = ()
+
+    def __init__(self, depth, time, tank, setpoint=0, plan_settings=None):
         """Init of SegmentDive class.
 
         Look at base class for more explanations
@@ -232,14 +246,16 @@ class SegmentDive(Segment):
         :type tank: :class:`dipplanner.tank.Tank`
         :param float setpoint: for CCR, setpoint used for this segment
                                for OC : setpoint should be zero
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
         :raises UnauthorizedMod: if depth is incompatible
                                  with either min or max mod
         """
-        super().__init__()
-        self.logger.debug("creating an instance of SegmentDive: "
-                          "depth:%s, time:%ss, tank:%s, sp:%f",
-                          depth, time, tank, setpoint)
+        super().__init__(plan_settings)
+        LOGGER.debug("creating an instance of SegmentDive: "
+                     "depth:%s, time:%ss, tank:%s, sp:%f",
+                     depth, time, tank, setpoint)
 
         self.type = 'const'  # type of segment
         self.in_use = True  # is this segment in use : default: yes
@@ -262,16 +278,19 @@ class SegmentDive(Segment):
             # CCR mode: we do not calculate gas_used
             return 0
         else:
-            pressure = (depth_to_pressure(self.depth) +
-                        settings.AMBIANT_PRESSURE_SURFACE)
+            pressure = (depth_to_pressure(self.depth,
+                                          plan_settings=self.plan_settings) +
+                        self.settings.AMBIANT_PRESSURE_SURFACE)
             return (pressure * self.time *
-                    float(settings.DIVE_CONSUMPTION_RATE))
+                    float(self.settings.DIVE_CONSUMPTION_RATE))
 
 
 class SegmentDeco(Segment):
     """Specialisation of segment class for deco segments."""
 
-    def __init__(self, depth, time, tank, setpoint=0):
+    __slots__ = ('gf_used', 'control_compartment', 'mv_max')
+
+    def __init__(self, depth, time, tank, setpoint=0, plan_settings=None):
         """Init of  SegmentDeco class.
 
         Look at base class for more explanations
@@ -289,14 +308,16 @@ class SegmentDeco(Segment):
         :type tank: :class:`dipplanner.tank.Tank`
         :param float setpoint: for CCR, setpoint used for this segment
                                for OC : setpoint should be zero
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
         :raises UnauthorizedMod: if depth is incompatible
                                  with either min or max mod
         """
-        super().__init__()
-        self.logger.debug("creating an instance of SegmentDeco: "
-                          "depth:%s, time:%ss, tank:%s, sp:%f",
-                          depth, time, tank, setpoint)
+        super().__init__(plan_settings)
+        LOGGER.debug("creating an instance of SegmentDeco: "
+                     "depth:%s, time:%ss, tank:%s, sp:%f",
+                     depth, time, tank, setpoint)
 
         self.type = 'deco'  # type of segment
         self.in_use = True  # is this segment in use : default: yes
@@ -323,16 +344,20 @@ class SegmentDeco(Segment):
         if self.setpoint > 0:
             return 0
         else:
-            pressure = (depth_to_pressure(self.depth) +
-                        settings.AMBIANT_PRESSURE_SURFACE)
+            pressure = (depth_to_pressure(self.depth,
+                                          plan_settings=self.plan_settings) +
+                        self.settings.AMBIANT_PRESSURE_SURFACE)
             return (pressure * self.time *
-                    float(settings.DECO_CONSUMPTION_RATE))
+                    float(self.settings.DECO_CONSUMPTION_RATE))
 
 
 class SegmentAscDesc(Segment):
     """Specialisation of segment class for Ascent or Descent segments."""
 
-    def __init__(self, start_depth, end_depth, rate, tank, setpoint=0):
+    __slots__ = ('start_depth', 'end_depth', 'rate')
+
+    def __init__(self, start_depth, end_depth, rate, tank, setpoint=0,
+                 plan_settings=None):
         """Init of SegmentAscDesc class.
 
         Look at base class for more explanations
@@ -351,19 +376,21 @@ class SegmentAscDesc(Segment):
         :type tank: :class:`dipplanner.tank.Tank`
         :param float setpoint: for CCR, setpoint used for this segment
                                for OC : setpoint should be zero
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
         :raises UnauthorizedMod: if depth is incompatible
                                  with either min or max mod
         """
-        super().__init__()
-        self.logger.debug("creating an instance of SegmentAscDesc:"
-                          "startdepth:%s, enddepth:%s, "
-                          "rate:%ss, tank:%s, sp:%f",
-                          start_depth,
-                          end_depth,
-                          rate,
-                          tank,
-                          setpoint)
+        super().__init__(plan_settings)
+        LOGGER.debug("creating an instance of SegmentAscDesc:"
+                     "startdepth:%s, enddepth:%s, "
+                     "rate:%ss, tank:%s, sp:%f",
+                     start_depth,
+                     end_depth,
+                     rate,
+                     tank,
+                     setpoint)
 
         self.in_use = True  # is this segment in use : default: yes
         self.depth = float(end_depth)  # depth of this segment, in meter
@@ -439,7 +466,8 @@ class SegmentAscDesc(Segment):
         else:
             average_depth = (float(self.start_depth) +
                              float(self.end_depth)) / 2.0
-            pressure = (depth_to_pressure(average_depth) +
-                        settings.AMBIANT_PRESSURE_SURFACE)
+            pressure = (depth_to_pressure(average_depth,
+                                          plan_settings=self.plan_settings) +
+                        self.settings.AMBIANT_PRESSURE_SURFACE)
             return (pressure * self.time *
-                    float(settings.DIVE_CONSUMPTION_RATE))
+                    float(self.settings.DIVE_CONSUMPTION_RATE))
@@ -0,0 +1,360 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Machine readable output of calculated dives, without templates.
+
+The results of the dives (output segments, tank usage, CNS and OTU, no
+flight and full desat times and errors) are written directly, in one of
+these formats:
+
+* JSON lines: one JSON object (see :func:`dive_record`) per dive
+* CSV: one table (segments, tanks or dives), one row per segment, tank
+  or dive
+* binary: compact records packed with :mod:`struct`, read back by
+  :func:`read_binary`
+
+All the writers take an iterable of dives and write each dive as soon as
+it is given: the results of a batch run can be streamed.
+
+    .. code-block:: python
+
+        with open("dives.jsonl", "w") as stream:
+            write_jsonl(plan_chain(chain), stream)
+
+Binary format (little endian):
+
+* header: magic (4s), version (H)
+* per dive: run time, cns, otu, no flight time, full desat time (5d,
+  NaN if not calculated), number of segments, tanks and errors (3H), then
+  per segment: type (B, index in :attr:`dipplanner.segment.Segment.types`),
+  tank (h, index of the tank of the segment, -1 if none), depth, time,
+  run time, setpoint (4d), then per tank: f_o2, f_he, used gas,
+  remaining gas (4d), rule ok (?), then per error: length (H) and utf-8
+  text
+
+Contains:
+dive_record -- function
+write_jsonl -- function
+write_csv -- function
+write_binary -- function
+read_binary -- function
+WRITERS -- dict
+"""
+import csv
+import json
+import math
+import struct
+import logging
+
+# local imports
+from dipplanner.dipp_exception import DipplannerException
+from dipplanner.segment import Segment
+from dipplanner.tank import gas_name
+
+LOGGER = logging.getLogger("dipplanner.serialize")
+
+#: magic string of the binary streams
+MAGIC = b'DIPR'
+#: version of the binary format
+VERSION = 1
+
+_HEADER = struct.Struct('<4sH')
+_RECORD = struct.Struct('<5d3H')
+_SEGMENT = struct.Struct('<Bh4d')
+_TANK = struct.Struct('<4d?')
+_ERROR = struct.Struct('<H')
+
+#: columns of the CSV tables
+CSV_FIELDS = {
+    'segments': ('dive', 'type', 'depth', 'time', 'run_time', 'setpoint',
+                 'gas'),
+    'tanks': ('dive', 'gas', 'f_o2', 'f_he', 'used_gas', 'remaining_gas',
+              'rule_ok'),
+    'dives': ('dive', 'run_time', 'cns', 'otu', 'no_flight_time',
+              'full_desat_time', 'errors')}
+
+
+def dive_record(dive):
+    """Return the results of a calculated dive.
+
+    :param dive: calculated dive
+    :type dive: :class:`dipplanner.dive.Dive`
+
+    :returns: JSON compatible results
+    :rtype: dict
+    """
+    return {
+        'run_time': dive.run_time,
+        'cns': dive.model.ox_tox.cns,
+        'otu': dive.model.ox_tox.otu,
+        'no_flight_time': dive.no_flight_time_value,
+        'full_desat_time': dive.full_desat_time_value,
+        'segments': [{'type': segment.type,
+                      'depth': segment.depth,
+                      'time': segment.time,
+                      'run_time': segment.run_time,
+                      'setpoint': segment.setpoint,
+                      'gas': segment.tank.name}
+                     for segment in dive.output_segments],
+        'tanks': [{'gas': tank.name,
+                   'f_o2': tank.f_o2,
+                   'f_he': tank.f_he,
+                   'used_gas': tank.used_gas,
+                   'remaining_gas': tank.remaining_gas,
+                   'rule_ok': tank.check_rule()}
+                  for tank in dive.tanks],
+        'errors': [str(exc) for exc in dive.dive_exceptions]}
+
+
+def write_jsonl(dives, stream):
+    """Write one JSON object per dive and per line.
+
+    :param dives: calculated dives
+    :type dives: iterable of :class:`dipplanner.dive.Dive`
+    :param stream: text file object
+
+    :returns: number of written dives
+    :rtype: int
+    """
+    encoder = json.JSONEncoder(separators=(',', ':'))
+    number = 0
+    for dive in dives:
+        stream.write(encoder.encode(dive_record(dive)))
+        stream.write('\n')
+        number += 1
+    return number
+
+
+def _csv_rows(number, dive, table):
+    """Return the rows of a dive in a CSV table.
+
+    :param int number: number of the dive (first dive is 1)
+    :param dive: calculated dive
+    :type dive: :class:`dipplanner.dive.Dive`
+    :param str table: 'segments', 'tanks' or 'dives'
+
+    :returns: rows, in the order of :data:`CSV_FIELDS`
+    :rtype: list of tuple
+    """
+    if table == 'segments':
+        return [(number, segment.type, segment.depth, segment.time,
+                 segment.run_time, segment.setpoint, segment.tank.name)
+                for segment in dive.output_segments]
+    if table == 'tanks':
+        return [(number, tank.name, tank.f_o2, tank.f_he, tank.used_gas,
+                 tank.remaining_gas, tank.check_rule())
+                for tank in dive.tanks]
+    return [(number, dive.run_time, dive.model.ox_tox.cns,
+             dive.model.ox_tox.otu, dive.no_flight_time_value,
+             dive.full_desat_time_value,
+             '; '.join(str(exc) for exc in dive.dive_exceptions))]
+
+
+def write_csv(dives, stream, table='segments'):
+    """Write one CSV table for the dives, with a header line.
+
+    The first column is the number of the dive (first dive is 1).
+
+    :param dives: calculated dives
+    :type dives: iterable of :class:`dipplanner.dive.Dive`
+    :param stream: text file object, opened with newline=''
+    :param str table: 'segments' (one row per output segment), 'tanks'
+                      (one row per tank) or 'dives' (one row per dive:
+                      run time, OxTox, no flight and full desat times,
+                      errors)
+
+    :returns: number of written dives
+    :rtype: int
+
+    :raises DipplannerException: if the table is unknown
+    """
+    if table not in CSV_FIELDS:
+        raise DipplannerException("unknown csv table: %s" % table)
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS[table])
+    number = 0
+    for number, dive in enumerate(dives, 1):
+        writer.writerows(_csv_rows(number, dive, table))
+    return number
+
+
+def _optional(value):
+    """Return the value to pack for an optional float.
+
+    :param float value: value, or None
+
+    :returns: value, or NaN for None
+    :rtype: float
+    """
+    if value is None:
+        return math.nan
+    return value
+
+
+def _pack_dive(dive):
+    """Return the binary record of a calculated dive.
+
+    :param dive: calculated dive
+    :type dive: :class:`dipplanner.dive.Dive`
+
+    :returns: record
+    :rtype: bytes
+    """
+    tanks = list(dive.tanks)
+    errors = [str(exc).encode('utf-8') for exc in dive.dive_exceptions]
+    parts = [_RECORD.pack(dive.run_time, dive.model.ox_tox.cns,
+                          dive.model.ox_tox.otu,
+                          _optional(dive.no_flight_time_value),
+                          _optional(dive.full_desat_time_value),
+                          len(dive.output_segments), len(tanks),
+                          len(errors))]
+    for segment, tank_index in zip(dive.output_segments,
+                                   dive.segment_tank_indexes()):
+        parts.append(_SEGMENT.pack(Segment.types.index(segment.type),
+                                   tank_index, segment.depth, segment.time,
+                                   segment.run_time, segment.setpoint))
+    for tank in tanks:
+        parts.append(_TANK.pack(tank.f_o2, tank.f_he, tank.used_gas,
+                                tank.remaining_gas, tank.check_rule()))
+    for error in errors:
+        parts.append(_ERROR.pack(len(error)))
+        parts.append(error)
+    return b''.join(parts)
+
+
+def write_binary(dives, stream):
+    """Write the dives in the binary format.
+
+    :param dives: calculated dives
+    :type dives: iterable of :class:`dipplanner.dive.Dive`
+    :param stream: binary file object
+
+    :returns: number of written dives
+    :rtype: int
+    """
+    stream.write(_HEADER.pack(MAGIC, VERSION))
+    number = 0
+    for dive in dives:
+        stream.write(_pack_dive(dive))
+        number += 1
+    return number
+
+
+def _read(stream, size):
+    """Read exactly size bytes.
+
+    :param stream: binary file object
+    :param int size: number of bytes
+
+    :returns: read bytes
+    :rtype: bytes
+
+    :raises DipplannerException: if the stream ends before
+    """
+    data = stream.read(size)
+    if len(data) != size:
+        raise DipplannerException("truncated dipplanner binary stream")
+    return data
+
+
+def _unpack(stream, structure):
+    """Read and unpack one structure.
+
+    :param stream: binary file object
+    :param structure: structure to read
+    :type structure: :class:`struct.Struct`
+
+    :returns: unpacked values
+    :rtype: tuple
+    """
+    return structure.unpack(_read(stream, structure.size))
+
+
+def _unoptional(value):
+    """Return an optional float read in a record.
+
+    :param float value: read value
+
+    :returns: value, or None for NaN
+    :rtype: float
+    """
+    if math.isnan(value):
+        return None
+    return value
+
+
+def read_binary(stream):
+    """Read the dives written by :func:`write_binary`.
+
+    :param stream: binary file object
+
+    :returns: results of each dive, as returned by :func:`dive_record`
+    :rtype: generator of dict
+
+    :raises DipplannerException: if the stream is not a dipplanner binary
+                                 stream of this version
+    """
+    magic, version = _unpack(stream, _HEADER)
+    if magic != MAGIC:
+        raise DipplannerException("not a dipplanner binary stream")
+    if version != VERSION:
+        raise DipplannerException(
+            "dipplanner binary stream version %s not supported" % version)
+    while True:
+        data = stream.read(_RECORD.size)
+        if not data:
+            return
+        if len(data) != _RECORD.size:
+            raise DipplannerException("truncated dipplanner binary stream")
+        (run_time, cns, otu, no_flight_time, full_desat_time, nb_segments,
+         nb_tanks, nb_errors) = _RECORD.unpack(data)
+        segments = [_unpack(stream, _SEGMENT) for _ in range(nb_segments)]
+        tanks = [{'gas': gas_name(f_o2, f_he),
+                  'f_o2': f_o2,
+                  'f_he': f_he,
+                  'used_gas': used_gas,
+                  'remaining_gas': remaining_gas,
+                  'rule_ok': rule_ok}
+                 for (f_o2, f_he, used_gas, remaining_gas,
+                      rule_ok) in (_unpack(stream, _TANK)
+                                   for _ in range(nb_tanks))]
+        errors = [_read(stream, _unpack(stream, _ERROR)[0]).decode('utf-8')
+                  for _ in range(nb_errors)]
+        yield {
+            'run_time': run_time,
+            'cns': cns,
+            'otu': otu,
+            'no_flight_time': _unoptional(no_flight_time),
+            'full_desat_time': _unoptional(full_desat_time),
+            'segments': [{'type': Segment.types[type_code],
+                          'depth': depth,
+                          'time': time,
+                          'run_time': seg_run_time,
+                          'setpoint': setpoint,
+                          'gas': (tanks[tank]['gas'] if tank >= 0
+                                  else None)}
+                         for (type_code, tank, depth, time, seg_run_time,
+                              setpoint) in segments],
+            'tanks': tanks,
+            'errors': errors}
+
+
+#: writers of each output format: (writer, binary stream)
+WRITERS = {'jsonl': (write_jsonl, False),
+           'csv': (write_csv, False),
+           'binary': (write_binary, True)}
@@ -0,0 +1,494 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""HTTP/JSON planning service.
+
+A long running process, which plans dives without paying the start up of
+the command line for each dive:
+
+    .. code-block:: sh
+
+        python -m dipplanner.service --port 8080 --jobs 4
+
+Endpoints:
+
+* POST /plan: calculate a dive
+* POST /no_flight: calculate a dive, its no flight and full desat times
+* POST /table: calculate a deco table (see
+  :func:`dipplanner.dive_table.dive_table`)
+* GET /status: version and counters of the service
+
+The body of the POST requests is a JSON object:
+
+    .. code-block:: json
+
+        {"tanks": [{"name": "airtank", "tank_vol": 18.0,
+                    "tank_pressure": 200, "tank_rule": "10b"},
+                   {"name": "decoo2", "f_o2": 1.0, "tank_vol": 7.0,
+                    "tank_pressure": 200}],
+         "segments": [{"depth": 40, "time": 1500, "tank": "airtank"}],
+         "settings": {"GF_LOW": 0.3, "GF_HIGH": 0.8}}
+
+tanks take the arguments of :class:`dipplanner.tank.Tank`, segments
+the arguments of :class:`dipplanner.segment.SegmentDive` (with the name
+of their tank) and settings are the settings of the plan
+(see :class:`dipplanner.plan_settings.PlanSettings`).
+/no_flight also takes "exact" (times to the second) and /table takes
+"depths" and "times": the first segment gives the tank and setpoint of
+the table, which has at most :data:`MAX_TABLE_CELLS` cells.
+
+The dives are calculated on a pool of processes, and identical requests
+received while the same request is being calculated wait for its result
+instead of being calculated again.
+
+Contains:
+RequestError -- class
+plan -- function
+no_flight -- function
+table -- function
+PlanningService -- class
+main -- function
+"""
+import sys
+import json
+import logging
+import asyncio
+import argparse
+import functools
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# local imports
+from dipplanner import settings
+from dipplanner.dipp_exception import DipplannerException
+from dipplanner.dive_table import dive_table
+from dipplanner.plan_cache import PlanCache
+from dipplanner.plan_settings import current_settings
+from dipplanner.segment import SegmentDive
+from dipplanner.serialize import dive_record
+from dipplanner.tank import Tank
+
+LOGGER = logging.getLogger("dipplanner.service")
+
+#: max size of the body of a request, in bytes
+MAX_BODY_SIZE = 1024 * 1024
+#: max number of dives (depths x times) of a table request
+MAX_TABLE_CELLS = 1000
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error'}
+
+# cache of the dives calculated by this process
+_PLAN_CACHE = PlanCache()
+
+
+class RequestError(DipplannerException):
+    """Raised when a request is not valid."""
+
+    def __init__(self, description=""):
+        """Init of the Exception.
+
+        :param str description: text describing the error
+        """
+        super().__init__(description)
+        self.logger.info(
+            "Raising an exception: RequestError ! (%s)", description)
+
+
+def _parse_settings(changes):
+    """Build the settings of a plan from the settings of a request.
+
+    Each setting must have the type of its default value (any number for
+    the numeric settings).
+
+    :param dict changes: settings to change, by name
+
+    :returns: plan settings
+    :rtype: :class:`dipplanner.plan_settings.PlanSettings`
+
+    :raises RequestError: if a setting is unknown or has a wrong type
+    """
+    defaults = current_settings()
+    for name, value in dict(changes).items():
+        if name not in defaults._fields:
+            raise RequestError("unknown setting: %s" % name)
+        default = getattr(defaults, name)
+        if isinstance(default, bool):
+            valid = isinstance(value, bool)
+        elif isinstance(default, (int, float)):
+            valid = (isinstance(value, (int, float)) and
+                     not isinstance(value, bool))
+        else:
+            valid = isinstance(value, type(default))
+        if not valid:
+            raise RequestError("invalid setting: %s: %r" % (name, value))
+    return defaults._replace(**changes)
+
+
+def _parse_plan(request):
+    """Build the inputs of a dive from a request.
+
+    :param dict request: JSON request (see the module documentation)
+
+    :returns: (segments, tanks, plan settings)
+    :rtype: tuple
+
+    :raises RequestError: if the request is not valid
+    :raises DipplannerException: if a tank or segment is not valid
+    """
+    try:
+        plan_settings = _parse_settings(request.get('settings', {}))
+        tanks = OrderedDict()
+        for description in request['tanks']:
+            description = dict(description)
+            name = description.pop('name')
+            tanks[name] = Tank(plan_settings=plan_settings, **description)
+        segments = [SegmentDive(segment['depth'], segment['time'],
+                                tanks[segment['tank']],
+                                segment.get('setpoint', 0.0),
+                                plan_settings=plan_settings)
+                    for segment in request['segments']]
+    except KeyError as exc:
+        raise RequestError("missing or unknown: %s" % exc)
+    except (TypeError, ValueError, AttributeError) as exc:
+        raise RequestError("invalid request: %s" % exc)
+    if not segments:
+        raise RequestError("no segments")
+    return segments, list(tanks.values()), plan_settings
+
+
+def _handle(function):
+    """Turn the errors of a request handler into error responses.
+
+    The exceptions of dipplanner can not always be sent back from the
+    worker processes: they are turned into responses in the worker.
+
+    :param function: request handler, returning the results
+
+    :returns: request handler, returning (HTTP status, results)
+    """
+    # wraps: the handlers are pickled by name to the worker processes
+    @functools.wraps(function)
+    def handler(request):
+        """Call the request handler."""
+        try:
+            return 200, function(request)
+        except DipplannerException as exc:
+            return 400, {'error': str(exc)}
+        except Exception as exc:  # unknown generic exception
+            LOGGER.exception("error while handling %s", request)
+            return 500, {'error': "Unknown exception occured: %s" % exc}
+    return handler
+
+
+def _plan(request):
+    """Calculate the dive of a request.
+
+    :param dict request: JSON request (see the module documentation)
+
+    :returns: calculated dive
+    :rtype: :class:`dipplanner.dive.Dive`
+    """
+    segments, tanks, plan_settings = _parse_plan(request)
+    return _PLAN_CACHE.plan(segments, tanks, plan_settings=plan_settings)
+
+
+@_handle
+def plan(request):
+    """Calculate a dive.
+
+    :param dict request: JSON request (see the module documentation)
+
+    :returns: (HTTP status, results of the dive)
+    :rtype: tuple
+    """
+    return dive_record(_plan(request))
+
+
+@_handle
+def no_flight(request):
+    """Calculate a dive, its no flight and full desat times.
+
+    :param dict request: JSON request (see the module documentation)
+
+    :returns: (HTTP status, results of the dive)
+    :rtype: tuple
+    """
+    dive = _plan(request)
+    if not dive.dive_exceptions:
+        exact = bool(request.get('exact', False))
+        dive.no_flight_time_wo_exception(exact=exact)
+        try:
+            dive.full_desat_time(exact)
+        except DipplannerException as exc:
+            dive.dive_exceptions.append(exc)
+    return dive_record(dive)
+
+
+@_handle
+def table(request):
+    """Calculate a deco table.
+
+    :param dict request: JSON request (see the module documentation)
+
+    :returns: (HTTP status, list of the results of each dive, with its
+              depth and time)
+    :rtype: tuple
+    """
+    segments, tanks, plan_settings = _parse_plan(request)
+    try:
+        depths = [float(depth) for depth in request['depths']]
+        times = [float(time) for time in request['times']]
+    except KeyError as exc:
+        raise RequestError("missing: %s" % exc)
+    except (TypeError, ValueError) as exc:
+        raise RequestError("invalid request: %s" % exc)
+    if len(depths) * len(times) > MAX_TABLE_CELLS:
+        raise RequestError("table too large: more than %s dives" %
+                           MAX_TABLE_CELLS)
+    results = []
+    for (depth, time), dive in dive_table(
+            depths, times, tanks, segments[0].tank, segments[0].setpoint,
+            plan_settings=plan_settings).items():
+        result = dive_record(dive)
+        result['depth'] = depth
+        result['time'] = time
+        results.append(result)
+    return results
+
+
+#: request handlers, by path
+ENDPOINTS = {'/plan': plan, '/no_flight': no_flight, '/table': table}
+
+
+class PlanningService():
+    """Asyncio HTTP server calculating the dives on a pool of workers.
+
+    *Attributes:*
+        * executor -- pool of workers calculating the dives
+        * requests (int) -- number of calculated requests
+        * coalesced (int) -- number of requests which waited for an
+          identical request instead of being calculated
+        * server -- asyncio server, once started
+    """
+
+    def __init__(self, executor=None, jobs=None):
+        """Init of PlanningService.
+
+        :param executor: [OPTIONAL] pool of workers (default: a pool of
+                         jobs processes, using the default global
+                         settings)
+        :type executor: :class:`concurrent.futures.Executor`
+        :param int jobs: number of processes (default: number of cpus)
+        """
+        if executor is None:
+            # the workers are started from the threads of the event loop:
+            # forking them could copy locks held by the other threads
+            executor = ProcessPoolExecutor(
+                max_workers=jobs,
+                mp_context=multiprocessing.get_context('spawn'))
+        self.executor = executor
+        self.requests = 0
+        self.coalesced = 0
+        self.server = None
+        # futures of the requests being calculated, by request key
+        self._pending = {}
+
+    async def call(self, path, request):
+        """Calculate a request on the pool of workers.
+
+        An identical request being calculated is not calculated again:
+        its result is shared.
+
+        :param str path: path of the endpoint (key of :data:`ENDPOINTS`)
+        :param dict request: JSON request
+
+        :returns: (HTTP status, results)
+        :rtype: tuple
+        """
+        key = (path, json.dumps(request, sort_keys=True))
+        future = self._pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.requests += 1
+        future = asyncio.get_event_loop().run_in_executor(
+            self.executor, ENDPOINTS[path], request)
+        self._pending[key] = future
+        try:
+            # a disconnected client does not cancel the shared calculation
+            return await asyncio.shield(future)
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    async def respond(self, method, path, body):
+        """Return the response to an HTTP request.
+
+        :param str method: HTTP method
+        :param str path: path of the request
+        :param bytes body: body of the request
+
+        :returns: (HTTP status, JSON compatible response)
+        :rtype: tuple
+        """
+        if path == '/status':
+            return 200, {'version': settings.__VERSION__,
+                         'requests': self.requests,
+                         'coalesced': self.coalesced,
+                         'pending': len(self._pending)}
+        if path not in ENDPOINTS:
+            return 404, {'error': "unknown path: %s" % path}
+        if method != 'POST':
+            return 405, {'error': "%s needs POST" % path}
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except ValueError as exc:
+            return 400, {'error': "invalid JSON: %s" % exc}
+        if not isinstance(request, dict):
+            return 400, {'error': "the request must be a JSON object"}
+        return await self.call(path, request)
+
+    async def handle_connection(self, reader, writer):
+        """Serve the HTTP requests of a connection.
+
+        HTTP/1.1 connections are kept alive until the client closes them.
+
+        :param reader: stream of the connection
+        :type reader: :class:`asyncio.StreamReader`
+        :param writer: stream of the connection
+        :type writer: :class:`asyncio.StreamWriter`
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, path, version = (
+                        request_line.decode('latin-1').split())
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError("negative content length")
+                except ValueError:
+                    self._write(writer, 400, {'error': "invalid request"},
+                                False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    self._write(writer, 413, {'error': "request too large"},
+                                False)
+                    break
+                body = await reader.readexactly(length)
+                status, response = await self.respond(method, path, body)
+                keep_alive = (version == 'HTTP/1.1' and
+                              headers.get('connection', '').lower() !=
+                              'close')
+                self._write(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write(writer, status, response, keep_alive):
+        """Write an HTTP response.
+
+        :param writer: stream of the connection
+        :type writer: :class:`asyncio.StreamWriter`
+        :param int status: HTTP status
+        :param response: JSON compatible response
+        :param bool keep_alive: keep the connection open
+        """
+        body = json.dumps(response).encode('utf-8')
+        writer.write(("HTTP/1.1 %s %s\r\n"
+                      "Content-Type: application/json\r\n"
+                      "Content-Length: %s\r\n"
+                      "Connection: %s\r\n\r\n" % (
+                          status, _REASONS[status], len(body),
+                          "keep-alive" if keep_alive else "close")
+                      ).encode('latin-1') + body)
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start to serve.
+
+        :param str host: address to listen on
+        :param int port: port to listen on (0: any free port)
+
+        :returns: the asyncio server
+        """
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 host, port)
+        LOGGER.info("planning service listening on %s",
+                    [sock.getsockname() for sock in self.server.sockets])
+        return self.server
+
+    async def stop(self):
+        """Stop to serve and shut the pool of workers down."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown()
+
+
+def main(cli_arguments=None):
+    """Run the planning service from the command line.
+
+    :param list cli_arguments: list of arguments, like sys.argv
+    """
+    if cli_arguments is None:
+        cli_arguments = sys.argv
+    parser = argparse.ArgumentParser(
+        prog="python -m dipplanner.service",
+        description="HTTP/JSON dive planning service")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on, default: 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="port to listen on, default: 8080")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of worker processes, "
+                             "default: number of cpus")
+    args = parser.parse_args(cli_arguments[1:])
+
+    logging.basicConfig(level=logging.INFO)
+    service = PlanningService(jobs=args.jobs)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(service.start(args.host, args.port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(service.stop())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Store the results of calculated dives in a compact binary file.
+
+The results (output segments, gas used in each tank, CNS and OTU) of
+dives, for example the cells of a deco table
+(see :func:`dipplanner.dive_table.dive_table`), are written once:
+
+    .. code-block:: python
+
+        write_table_store("table.dipt", dive_table(depths, times, tanks))
+
+then read by any process without calculating or deserializing them:
+the file is memory-mapped and only the looked up results are read.
+
+    .. code-block:: python
+
+        with TableStore("table.dipt") as store:
+            result = store.lookup(0.21, 0.0, 40, 20 * 60, 0.3, 0.8)
+
+Each result is identified by the gas, the depth, the time and the
+setpoint of its bottom segment and by its gradient factors: only dives
+with a single bottom segment (square dives, like the cells of a deco
+table) can be stored.
+The file carries a format version, and digests of the Buhlmann
+coefficients and of the other settings used to calculate the dives: a
+file calculated with other coefficients or settings can not be opened.
+
+File format (little endian):
+
+* header: magic (4s), version (H), number of results (I), digest of the
+  coefficients (20s), digest of the settings (20s)
+* index, sorted by key: f_o2, f_he, depth, time, setpoint, gf_low,
+  gf_high (7d), offset of the record (Q)
+* records: run time, cns, otu (3d), number of segments (H), number of
+  tanks (H), then per segment: type (B, index in
+  :attr:`dipplanner.segment.Segment.types`), tank (h, index of the tank
+  of the segment, -1 if none), depth, time, run time (3d), then per
+  tank: f_o2, f_he, used gas (3d)
+
+Contains:
+TableStoreException -- class
+TableResult -- namedtuple
+write_table_store -- function
+TableStore -- class
+"""
+import hashlib
+import logging
+import mmap
+import struct
+from collections import namedtuple
+
+# local imports
+from dipplanner.dipp_exception import DipplannerException
+from dipplanner.model.buhlmann.model import coefficients_digest
+from dipplanner.plan_settings import current_settings
+from dipplanner.segment import Segment
+
+LOGGER = logging.getLogger("dipplanner.table_store")
+
+#: magic string of the table store files
+MAGIC = b'DIPT'
+#: version of the file format
+VERSION = 2
+
+_HEADER = struct.Struct('<4sHI20s20s')
+_INDEX = struct.Struct('<7dQ')
+_RECORD = struct.Struct('<3dHH')
+_SEGMENT = struct.Struct('<Bh3d')
+_TANK = struct.Struct('<3d')
+
+
+class TableStoreException(DipplannerException):
+    """Raised when a table store file can not be used."""
+
+    def __init__(self, description=""):
+        """Init of the Exception.
+
+        :param str description: text describing the error
+        """
+        super().__init__(description)
+        self.logger.error(
+            "Raising an exception: TableStoreException ! (%s)", description)
+
+
+#: result of a stored dive
+#: segments: list of (type, tank index, depth, time, run_time)
+#: tanks: list of (f_o2, f_he, used_gas)
+TableResult = namedtuple('TableResult', ('run_time', 'cns', 'otu',
+                                         'segments', 'tanks'))
+
+
+def _settings_digest(plan_settings):
+    """Return a digest of the settings changing the results of the dives.
+
+    The gradient factors are part of the key of each result and the
+    template only changes the output: they are not part of the digest.
+
+    :param plan_settings: settings (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+
+    :returns: sha1 digest (20 bytes)
+    :rtype: bytes
+    """
+    if plan_settings is None:
+        plan_settings = current_settings()
+    plan_settings = plan_settings._replace(GF_LOW=None, GF_HIGH=None,
+                                           TEMPLATE=None)
+    return hashlib.sha1(repr(tuple(plan_settings)).encode('utf-8')).digest()
+
+
+def _key(f_o2, f_he, depth, time, setpoint, gf_low, gf_high):
+    """Return the key of a result.
+
+    :returns: key, as stored in the index
+    :rtype: tuple of float
+    """
+    return (float(f_o2), float(f_he), float(depth), float(time),
+            float(setpoint), float(gf_low), float(gf_high))
+
+
+def _dive_key(dive):
+    """Return the key of a calculated dive.
+
+    :param dive: calculated dive
+    :type dive: :class:`dipplanner.dive.Dive`
+
+    The key is taken from the bottom segment of the dive: the only input
+    segment with a time (the travel waypoints inserted before a hypoxic
+    bottom gas, see :meth:`dipplanner.dive.Dive.do_dive`, have no time).
+
+    :returns: key, as stored in the index
+    :rtype: tuple of float
+
+    :raises TableStoreException: if the dive has several bottom segments
+    """
+    segments = [segment for segment in dive.input_segments
+                if segment.time > 0]
+    if len(segments) > 1:
+        raise TableStoreException(
+            "only dives with one bottom segment can be stored: %s "
+            "segments" % len(segments))
+    segment = (segments or dive.input_segments)[0]
+    return _key(segment.tank.f_o2, segment.tank.f_he, segment.depth,
+                segment.time, segment.setpoint, dive.settings.GF_LOW,
+                dive.settings.GF_HIGH)
+
+
+def _pack_dive(dive):
+    """Return the record of a calculated dive.
+
+    :param dive: calculated dive
+    :type dive: :class:`dipplanner.dive.Dive`
+
+    :returns: record
+    :rtype: bytes
+    """
+    tanks = list(dive.tanks)
+    parts = [_RECORD.pack(dive.run_time, dive.model.ox_tox.cns,
+                          dive.model.ox_tox.otu, len(dive.output_segments),
+                          len(tanks))]
+    for segment, tank_index in zip(dive.output_segments,
+                                   dive.segment_tank_indexes()):
+        parts.append(_SEGMENT.pack(Segment.types.index(segment.type),
+                                   tank_index, segment.depth, segment.time,
+                                   segment.run_time))
+    for tank in tanks:
+        parts.append(_TANK.pack(tank.f_o2, tank.f_he, tank.used_gas))
+    return b''.join(parts)
+
+
+def write_table_store(path, dives):
+    """Write the results of calculated dives in a table store file.
+
+    Dives with errors are not written.
+    The digest of the settings is the one of the settings the dives were
+    calculated with (their plan_settings, or the global settings).
+
+    :param str path: file
+    :param dives: calculated dives, all with the same settings (apart
+                  from their gradient factors). A dict of dives (like the
+                  result of :func:`dipplanner.dive_table.dive_table`) can
+                  be given.
+    :type dives: list of :class:`dipplanner.dive.Dive`
+
+    :returns: number of written results
+    :rtype: int
+
+    :raises TableStoreException: if the dives were calculated with
+                                 different settings, if a dive has several
+                                 bottom segments or if two dives have the
+                                 same key
+    """
+    if hasattr(dives, 'values'):
+        dives = dives.values()
+    records = {}
+    settings_digest = None
+    for dive in dives:
+        if dive.dive_exceptions or not dive.input_segments:
+            continue
+        dive_digest = _settings_digest(dive.plan_settings)
+        if settings_digest is None:
+            settings_digest = dive_digest
+        elif dive_digest != settings_digest:
+            raise TableStoreException(
+                "dives calculated with different settings can not be "
+                "stored in the same table store: %s" % path)
+        key = _dive_key(dive)
+        if key in records:
+            raise TableStoreException(
+                "two dives with the same key can not be stored: %s" %
+                (key, ))
+        records[key] = _pack_dive(dive)
+    if settings_digest is None:
+        settings_digest = _settings_digest(None)
+
+    keys = sorted(records)
+    offset = _HEADER.size + _INDEX.size * len(keys)
+    index = []
+    for key in keys:
+        index.append(_INDEX.pack(*(key + (offset, ))))
+        offset += len(records[key])
+
+    with open(path, "wb") as store_file:
+        store_file.write(_HEADER.pack(MAGIC, VERSION, len(keys),
+                                      coefficients_digest(),
+                                      settings_digest))
+        store_file.write(b''.join(index))
+        for key in keys:
+            store_file.write(records[key])
+    LOGGER.info("%s results written in %s", len(keys), path)
+    return len(keys)
+
+
+class TableStore():
+    """Read only, memory-mapped table store file.
+
+    Lookups do a binary search in the index of the file: only the pages
+    of the index and of the looked up results are read.
+
+    *Attributes:*
+        * path (str) -- file of the store
+    """
+
+    def __init__(self, path, plan_settings=None):
+        """Init of TableStore: open and check the file.
+
+        :param str path: file written by :func:`write_table_store`
+        :param plan_settings: settings used for the lookups (default:
+                              global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
+
+        :raises TableStoreException: if the file is not a table store of
+                                     this version, or was calculated with
+                                     other coefficients or settings
+        """
+        self.path = path
+        with open(path, "rb") as store_file:
+            try:
+                self._map = mmap.mmap(store_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise TableStoreException("empty table store: %s" % path)
+        try:
+            self._check(plan_settings)
+        except TableStoreException:
+            self.close()
+            raise
+
+    def _check(self, plan_settings):
+        """Check the header of the file.
+
+        :raises TableStoreException: see :meth:`__init__`
+        """
+        if len(self._map) < _HEADER.size:
+            raise TableStoreException("not a table store: %s" % self.path)
+        (magic, version, self._size, coefficients,
+         settings_digest) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise TableStoreException("not a table store: %s" % self.path)
+        if version != VERSION:
+            raise TableStoreException(
+                "table store version %s not supported: %s" % (version,
+                                                              self.path))
+        if coefficients != coefficients_digest():
+            raise TableStoreException(
+                "table store calculated with other model coefficients: %s" %
+                self.path)
+        if settings_digest != _settings_digest(plan_settings):
+            raise TableStoreException(
+                "table store calculated with other settings: %s" %
+                self.path)
+
+    def __enter__(self):
+        """Enter the context: the store is already open.
+
+        :returns: the store
+        :rtype: :class:`TableStore`
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the store at the end of the context."""
+        self.close()
+
+    def __len__(self):
+        """Return the number of results in the store.
+
+        :returns: number of results
+        :rtype: int
+        """
+        return self._size
+
+    def close(self):
+        """Close the file."""
+        self._map.close()
+
+    def _index_entry(self, position):
+        """Return one entry of the index.
+
+        :param int position: position in the index
+
+        :returns: (key, offset of the record)
+        :rtype: tuple
+        """
+        entry = _INDEX.unpack_from(self._map,
+                                   _HEADER.size + position * _INDEX.size)
+        return entry[:7], entry[7]
+
+    def keys(self):
+        """Return the keys of all the results, sorted.
+
+        :returns: list of (f_o2, f_he, depth, time, setpoint, gf_low,
+                  gf_high)
+        :rtype: list of tuple
+        """
+        return [self._index_entry(position)[0]
+                for position in range(self._size)]
+
+    def lookup(self, f_o2, f_he, depth, time, gf_low, gf_high,
+               setpoint=0.0):
+        """Return the result of a dive.
+
+        :param float f_o2: fraction of O2 of the gas of the bottom segment
+        :param float f_he: fraction of He of the gas of the bottom segment
+        :param float depth: depth of the bottom segment, in meter
+        :param float time: time of the bottom segment, in seconds
+        :param float gf_low: low gradient factor
+        :param float gf_high: high gradient factor
+        :param float setpoint: setpoint of the bottom segment (0 if OC)
+
+        :returns: result, or None if the dive is not in the store
+        :rtype: :class:`TableResult`
+        """
+        key = _key(f_o2, f_he, depth, time, setpoint, gf_low, gf_high)
+        low = 0
+        high = self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._index_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._size:
+            return None
+        found_key, offset = self._index_entry(low)
+        if found_key != key:
+            return None
+        return self._read_record(offset)
+
+    def _read_record(self, offset):
+        """Read the result stored at offset.
+
+        :param int offset: offset of the record in the file
+
+        :returns: result
+        :rtype: :class:`TableResult`
+        """
+        (run_time, cns, otu, nb_segments,
+         nb_tanks) = _RECORD.unpack_from(self._map, offset)
+        offset += _RECORD.size
+        segments = []
+        for _ in range(nb_segments):
+            (type_code, tank, depth, time,
+             seg_run_time) = _SEGMENT.unpack_from(self._map, offset)
+            segments.append((Segment.types[type_code], tank, depth, time,
+                             seg_run_time))
+            offset += _SEGMENT.size
+        tanks = [_TANK.unpack_from(self._map, offset + i * _TANK.size)
+                 for i in range(nb_tanks)]
+        return TableResult(run_time, cns, otu, segments, tanks)
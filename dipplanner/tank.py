@@ -20,12 +20,13 @@
 
 .. note:: in MVPlan, this class was the 'Gas' class
 """
+import functools
 import logging
 import math
 import re
 
 # local imports
-from dipplanner import settings
+from dipplanner.plan_settings import PlanSettingsMixin
 from dipplanner.dipp_exception import DipplannerException
 from dipplanner.tools import pressure_to_depth, depth_to_pressure
 
@@ -82,7 +83,114 @@ class EmptyTank(DipplannerException):
             "Raising an exception: EmptyTank ! (%s)", description)
 
 
-class Tank():
+#: Van der Waals constants (a, b) of the gases: O2, He, N2
+VDW_CONSTANTS = ((1.382, 0.03186), (0.0346, 0.0238), (1.37, 0.0387))
+#: gas constant, in L.bar/(K.mol)
+GAS_CONSTANT = 0.0831451
+
+
+@functools.lru_cache(maxsize=None)
+def _mix_coefficients(f_o2, f_he):
+    """Return the Van der Waals constants of a gas mix.
+
+    :param float f_o2: fraction of O2 in the gas
+    :param float f_he: fraction of He in the gas
+
+    :returns: (a, b) constants of the mix
+    :rtype: tuple
+    """
+    fractions = (f_o2, f_he, 1.0 - (f_o2 + f_he))
+    a_gas = 0.0
+    b_gas = 0.0
+    for (a_1, b_1), f_1 in zip(VDW_CONSTANTS, fractions):
+        for (a_2, b_2), f_2 in zip(VDW_CONSTANTS, fractions):
+            a_gas += math.sqrt(a_1 * a_2) * f_1 * f_2
+            b_gas += math.sqrt(b_1 * b_2) * f_1 * f_2
+    return a_gas, b_gas
+
+
+@functools.lru_cache(maxsize=1024)
+def real_volume(tank_vol, tank_pressure, f_o2, f_he, temp,
+                surface_pressure):
+    """Calculate the real gas volume of a tank (in liter).
+
+    based on Van der waals equation:
+
+        (P+n2.a/V2).(V-n.b)=n.R.T
+
+    The quantity of gas in the tank (n) is found by Newton iterations,
+    starting from the perfect gas law, then expanded at surface pressure.
+
+    :param float tank_vol: Volume of the tank in liter
+    :param float tank_pressure: Pressure of the tank in bar
+    :param float f_o2: fraction of O2 in the gas
+    :param float f_he: fraction of He in the gas
+    :param float temp: temperature of the gas, in celsius
+    :param float surface_pressure: pressure of the expanded gas, in bar
+
+    :returns: total gas volume of the tank in liter
+    :rtype: float
+    """
+    a_gas, b_gas = _mix_coefficients(f_o2, f_he)
+    r_t = GAS_CONSTANT * (273.15 + temp)
+    a_v2 = a_gas / (tank_vol * tank_vol)
+    # perfect gas law : PV = nRT : n = PV/RT
+    quantity = tank_pressure * tank_vol / r_t
+    for _ in range(50):
+        # P = nRT/(V - nb) - n2a/V2, and its derivative in n
+        free_volume = tank_vol - quantity * b_gas
+        pressure = quantity * r_t / free_volume - quantity * quantity * a_v2
+        slope = (r_t * tank_vol / (free_volume * free_volume) -
+                 2 * quantity * a_v2)
+        step = (pressure - tank_pressure) / slope
+        quantity -= step
+        if abs(step) <= 1e-12 * quantity:
+            break
+
+    # recalculate volume using van der waals again
+    # V = nR3T3/(PR2T2+aP2) + nb
+    return (quantity * r_t ** 3 /
+            (surface_pressure * r_t ** 2 +
+             a_gas * surface_pressure * surface_pressure) +
+            quantity * b_gas)
+
+
+def gas_name(f_o2, f_he):
+    """Return a Human readable name for a gas.
+
+    Differnt possibilities:
+    Air, Nitrox, Oxygen, Trimix, Heliox
+
+    :param float f_o2: fraction of O2 in the gas
+    :param float f_he: fraction of He in the gas
+
+    :returns: name of the gas in the form:
+              "Air"
+              "Nitrox"
+              ...
+    :rtype: str
+    """
+    name = 'Air'
+    composition = ''
+    if f_he == 0:
+        composition = '%s' % int(f_o2 * 100)
+        if f_o2 == 0.21:
+            name = 'Air'
+        elif f_o2 == 1:
+            name = 'Oxygen'
+        else:
+            name = 'Nitrox ' + composition
+    else:
+        composition = '%s/%s' % (int(f_o2 * 100),
+                                 int(f_he * 100))
+        if f_he + f_o2 == 1:
+            name = 'Heliox ' + composition
+        else:
+            name = 'Trimix ' + composition
+    return name
+
+
+class Tank(PlanSettingsMixin):
     """Representation of dive tanks wich contains breathing Gas.
 
     We provide proportion of N2, O2, He, calculates MOD and volumes during the
@@ -125,9 +233,9 @@ class Tank():
     """
 
     def __init__(self, f_o2=0.21, f_he=0.0,
-                 max_ppo2=settings.DEFAULT_MAX_PPO2,
+                 max_ppo2=None,
                  mod=None, tank_vol=12.0, tank_pressure=200,
-                 tank_rule="30b"):
+                 tank_rule="30b", plan_settings=None):
         """Initialisation of the Tank class.
 
         If nothing is provided, create a default 'Air' with 12l/200b tank
@@ -140,7 +248,7 @@ class Tank():
         :param flaot f_he: Fraction of He in the gaz in %
                            value between 0.0 and 1.0
         :param float max_ppo2: sets the maximum ppo2 you want for this tank
-                               (default: settings.DEFAULT_MAX_PPO2)
+                               (default: self.settings.DEFAULT_MAX_PPO2)
         :param float mod: Specify the mod you want.
             * if not provided, calculates the mod based on max_ppo2
 
@@ -162,6 +270,8 @@ class Tank():
                        * 1/6 way IN,
                        * 1/6 wau OUT,
                         * 2/3 remains
+        :param plan_settings: settings of the plan (default: global settings)
+        :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
         :raises InvalidGas: see :method:`validate`
         :raises InvalidMod: if mod > max mod based on max_ppo2
@@ -171,6 +281,9 @@ class Tank():
         """
         # init class logger
         self.logger = logging.getLogger("dipplanner.tank.Tank")
+        self.plan_settings = plan_settings
+        if max_ppo2 is None:
+            max_ppo2 = self.settings.DEFAULT_MAX_PPO2
         self.logger.debug("creating an instance of Tank: O2:%f, He:%f, "
                           "max_ppo2:%f, mod:%s, tank_vol:%f, "
                           "tank_pressure:%d",
@@ -224,7 +337,7 @@ class Tank():
         :returns: Tank object copy of itself
         :rtype: :class:`Tank`
         """
-        newobj = Tank()
+        newobj = Tank(plan_settings=self.plan_settings)
         newobj.f_o2 = self.f_o2
         newobj.f_he = self.f_he
         newobj.f_n2 = self.f_n2
@@ -243,9 +356,7 @@ class Tank():
                               f_o2=None, f_he=None, temp=15):
         """Calculate the real gas volume of the tank (in liter).
 
-        based on Van der waals equation:
-
-            (P+n2.a/V2).(V-n.b)=n.R.T
+        based on Van der waals equation (see :func:`real_volume`)
 
         :param float tank_vol: Volume of the tank in liter
             optional : if not provided, use self.tank_vol
@@ -268,86 +379,9 @@ class Tank():
             f_o2 = self.f_o2
         if f_he is None:
             f_he = self.f_he
-        f_n2 = 1.0 - (f_o2 + f_he)
-
-        # Constants used in calculations
-        a_o2 = 1.382
-        b_o2 = 0.03186
-        a_n2 = 1.37
-        b_n2 = 0.0387
-        a_he = 0.0346
-        b_he = 0.0238
-        # vm_o2 = 31.9988  # not used
-        # vm_n2 = 28.01348  # not used
-        # vm_he = 4.0020602  # not used
-        R = 0.0831451
-        T = 273.15 + temp  # default temp at 15°C
-
-        # at first, calculate a and b values for this gas
-        a_gas = (math.sqrt(a_o2 * a_o2) * f_o2 * f_o2 +
-                 math.sqrt(a_o2 * a_he) * f_o2 * f_he +
-                 math.sqrt(a_o2 * a_n2) * f_o2 * f_n2 +
-                 math.sqrt(a_he * a_o2) * f_he * f_o2 +
-                 math.sqrt(a_he * a_he) * f_he * f_he +
-                 math.sqrt(a_he * a_n2) * f_he * f_n2 +
-                 math.sqrt(a_n2 * a_o2) * f_n2 * f_o2 +
-                 math.sqrt(a_n2 * a_he) * f_n2 * f_he +
-                 math.sqrt(a_n2 * a_n2) * f_n2 * f_n2)
-        # print "a: %s" % a_gas
-        b_gas = (math.sqrt(b_o2 * b_o2) * f_o2 * f_o2 +
-                 math.sqrt(b_o2 * b_he) * f_o2 * f_he +
-                 math.sqrt(b_o2 * b_n2) * f_o2 * f_n2 +
-                 math.sqrt(b_he * b_o2) * f_he * f_o2 +
-                 math.sqrt(b_he * b_he) * f_he * f_he +
-                 math.sqrt(b_he * b_n2) * f_he * f_n2 +
-                 math.sqrt(b_n2 * b_o2) * f_n2 * f_o2 +
-                 math.sqrt(b_n2 * b_he) * f_n2 * f_he +
-                 math.sqrt(b_n2 * b_n2) * f_n2 * f_n2)
-        # print "b: %s" % b_gas
-        # now approximate n (quantities of molecules of gas in the tank in mol)
-        # using perfect gas law : PV = nRT : n = PV/RT
-        approx_n = (float(tank_pressure) * float(tank_vol)) / (R * T)
-
-        # recalculate pressure on the tank whith approx_n
-        # P=n.R.T/(V-n.b)-n2.a/V2)
-        tank_pressure_mid = ((approx_n * R * T) /
-                             (tank_vol - approx_n * b_gas) -
-                             (approx_n * approx_n * a_gas) /
-                             (tank_vol * tank_vol))
-
-        # now try to approx tank_pressure with new_tank_pressure by
-        # variating approx_n
-        # start with *2 or /2 value (which is enormous !)
-        if tank_pressure_mid < tank_pressure:
-            n_left = approx_n
-            n_right = approx_n * 2
-        else:
-            n_left = approx_n / 2
-            n_right = approx_n
-
-        n_mid = (n_left + n_right) / 2
-        while round(tank_pressure_mid, 2) != round(tank_pressure, 2):
-            n_mid = (n_left + n_right) / 2
-            # new pressure calculated using:
-            # P = nRT/(V - nb) - n2a/V2
-            tank_pressure_mid = ((n_mid * R * T) /
-                                 (tank_vol - n_mid * b_gas) -
-                                 (n_mid * n_mid * a_gas) /
-                                 (tank_vol * tank_vol))
-            if tank_pressure_mid > tank_pressure:
-                # keep left
-                n_right = n_mid
-            else:
-                n_left = n_mid
-        # print("n_mid:%s" % n_mid)
-
-        # recalculate volume using van der waals again
-        # V = nR3T3/(PR2T2+aP2) + nb
-        total_gas_volume = (
-            n_mid * pow(R, 3) * pow(T, 3) /
-            (settings.AMBIANT_PRESSURE_SURFACE * pow(R, 2) * pow(T, 2) +
-             a_gas * pow(settings.AMBIANT_PRESSURE_SURFACE, 2)) +
-            n_mid * b_gas)
+        total_gas_volume = real_volume(
+            float(tank_vol), float(tank_pressure), f_o2, f_he, temp,
+            self.settings.AMBIANT_PRESSURE_SURFACE)
         self.logger.debug("real total gas volume : %02fl instead of %02fl",
                           total_gas_volume, tank_vol * tank_pressure)
         return total_gas_volume
@@ -430,15 +464,16 @@ class Tank():
         if self.mod <= 0:
             raise InvalidMod("MOD should be >= 0")
         if (self.mod > self._calculate_mod(self.max_ppo2) or
-                self.mod > self._calculate_mod(settings.ABSOLUTE_MAX_PPO2)):
+                self.mod > self._calculate_mod(
+                    self.settings.ABSOLUTE_MAX_PPO2)):
             raise InvalidMod("MOD exceed maximum tolerable MOD")
 
-        if self.tank_pressure > settings.ABSOLUTE_MAX_TANK_PRESSURE:
+        if self.tank_pressure > self.settings.ABSOLUTE_MAX_TANK_PRESSURE:
             raise InvalidTank(
                 "Tank pressure exceed maximum tolerable pressure")
         if self.tank_pressure <= 0:
             raise InvalidTank("Tank pressure should be greated than zero")
-        if self.tank_vol > settings.ABSOLUTE_MAX_TANK_SIZE:
+        if self.tank_vol > self.settings.ABSOLUTE_MAX_TANK_SIZE:
             raise InvalidTank("Tank size exceed maximum tolerable tank size")
         if self.tank_vol <= 0:
             raise InvalidTank("Tank size should be greater than zero")
@@ -447,33 +482,12 @@ class Tank():
     def name(self):
         """Return a Human readable name for the gaz and tanks.
 
-        Differnt possibilities:
-        Air, Nitrox, Oxygen, Trimix, Heliox
+        see :func:`gas_name`
 
-        :returns: name of the tank in the form:
-                  "Air"
-                  "Nitrox"
-                  ...
+        :returns: name of the gas of the tank
         :rtype: str
         """
-        name = 'Air'
-        composition = ''
-        if self.f_he == 0:
-            composition = '%s' % int(self.f_o2 * 100)
-            if self.f_o2 == 0.21:
-                name = 'Air'
-            elif self.f_o2 == 1:
-                name = 'Oxygen'
-            else:
-                name = 'Nitrox ' + composition
-        else:
-            composition = '%s/%s' % (int(self.f_o2 * 100),
-                                     int(self.f_he * 100))
-            if self.f_he + self.f_o2 == 1:
-                name = 'Heliox ' + composition
-            else:
-                name = 'Trimix ' + composition
-        return name
+        return gas_name(self.f_o2, self.f_he)
 
     @property
     def tank_info(self):
@@ -513,16 +527,19 @@ class Tank():
         else:
             return self._calculate_mod(max_ppo2)
 
-    def get_min_od(self, min_ppo2=settings.ABSOLUTE_MIN_PPO2):
+    def get_min_od(self, min_ppo2=None):
         """Return in meter the minimum operating depth for the gas in the tank.
 
         return 0 if diving from/to surface is ok with this gaz
 
         :param float min_ppo2: [OPTIONAL] minimum tolerated ppo2
+                               (default: self.settings.ABSOLUTE_MIN_PPO2)
 
         :returns: minimum operating depthin meter
         :rtype: float
         """
+        if min_ppo2 is None:
+            min_ppo2 = self.settings.ABSOLUTE_MIN_PPO2
         return self._calculate_mod(min_ppo2)
 
     def get_mod_for_given_end(self, end):
@@ -544,24 +561,27 @@ class Tank():
 
         .. todo:: get and return float instead of int ?
         """
+        conf = self.settings
         # calculate the reference narcotic effect of air
         # Air consists of: Nitrogen N2: 78.08%,
         #                  Oxygen O2: 20.95%,
         #                  Argon Ar: 0.934%
         # OC
-        reference_narcotic = settings.AMBIANT_PRESSURE_SURFACE * (
-            settings.N2_NARCOTIC_VALUE * settings.DEFAULT_AIR_FN2 +
-            settings.O2_NARCOTIC_VALUE * settings.DEFAULT_AIR_FO2 +
-            settings.AR_NARCOTIC_VALUE * settings.DEFAULT_AIR_FAR)
+        reference_narcotic = conf.AMBIANT_PRESSURE_SURFACE * (
+            conf.N2_NARCOTIC_VALUE * conf.DEFAULT_AIR_FN2 +
+            conf.O2_NARCOTIC_VALUE * conf.DEFAULT_AIR_FO2 +
+            conf.AR_NARCOTIC_VALUE * conf.DEFAULT_AIR_FAR)
         # OC mode
-        narcotic_tank = (self.f_n2 * settings.N2_NARCOTIC_VALUE +
-                         self.f_o2 * settings.O2_NARCOTIC_VALUE +
-                         self.f_he * settings.HE_NARCOTIC_VALUE)
+        narcotic_tank = (self.f_n2 * conf.N2_NARCOTIC_VALUE +
+                         self.f_o2 * conf.O2_NARCOTIC_VALUE +
+                         self.f_he * conf.HE_NARCOTIC_VALUE)
 
-        p_absolute = ((depth_to_pressure(end) +
-                       settings.AMBIANT_PRESSURE_SURFACE) *
+        p_absolute = ((depth_to_pressure(end,
+                                         plan_settings=self.plan_settings) +
+                       conf.AMBIANT_PRESSURE_SURFACE) *
                       reference_narcotic / narcotic_tank)
-        mod = pressure_to_depth(p_absolute - settings.AMBIANT_PRESSURE_SURFACE)
+        mod = pressure_to_depth(p_absolute - conf.AMBIANT_PRESSURE_SURFACE,
+                                plan_settings=self.plan_settings)
         return mod
 
     def get_end_for_given_depth(self, depth, setpoint=0.0):
@@ -590,16 +610,18 @@ class Tank():
         :returns: end -- equivalent narcotic depth in meter
         :rtype: float
         """
-        p_absolute = (depth_to_pressure(depth) +
-                      settings.AMBIANT_PRESSURE_SURFACE)
+        conf = self.settings
+        p_absolute = (depth_to_pressure(depth,
+                                        plan_settings=self.plan_settings) +
+                      conf.AMBIANT_PRESSURE_SURFACE)
         # calculate the reference narcotic effect of air
         # Air consists of: Nitrogen N2: 78.08%,
         #                  Oxygen O2: 20.95%,
         #                  Argon Ar: 0.934%
-        reference_narcotic = settings.AMBIANT_PRESSURE_SURFACE * (
-            settings.N2_NARCOTIC_VALUE * settings.DEFAULT_AIR_FN2 +
-            settings.O2_NARCOTIC_VALUE * settings.DEFAULT_AIR_FO2 +
-            settings.AR_NARCOTIC_VALUE * settings.DEFAULT_AIR_FAR)
+        reference_narcotic = conf.AMBIANT_PRESSURE_SURFACE * (
+            conf.N2_NARCOTIC_VALUE * conf.DEFAULT_AIR_FN2 +
+            conf.O2_NARCOTIC_VALUE * conf.DEFAULT_AIR_FO2 +
+            conf.AR_NARCOTIC_VALUE * conf.DEFAULT_AIR_FAR)
 
         if setpoint > 0:
             # CCR mode
@@ -616,9 +638,9 @@ class Tank():
                 # of innert gases inthe loop ?
                 ppn2_inspired = (pp_inert * self.f_n2) / f_inert
                 pphe_inspired = (pp_inert * self.f_he) / f_inert
-                narcotic_index = (ppn2_inspired * settings.N2_NARCOTIC_VALUE +
-                                  setpoint * settings.O2_NARCOTIC_VALUE +
-                                  pphe_inspired * settings.HE_NARCOTIC_VALUE)
+                narcotic_index = (ppn2_inspired * conf.N2_NARCOTIC_VALUE +
+                                  setpoint * conf.O2_NARCOTIC_VALUE +
+                                  pphe_inspired * conf.HE_NARCOTIC_VALUE)
 
                 self.logger.debug("pabs: %.3f, pp_inert: %.3f at %sm, "
                                   "ppn2i:%s, pphei:%s, narco idx:%s",
@@ -630,12 +652,13 @@ class Tank():
         else:
             # OC mode
             narcotic_index = p_absolute * (
-                self.f_n2 * settings.N2_NARCOTIC_VALUE +
-                self.f_o2 * settings.O2_NARCOTIC_VALUE +
-                self.f_he * settings.HE_NARCOTIC_VALUE)
+                self.f_n2 * conf.N2_NARCOTIC_VALUE +
+                self.f_o2 * conf.O2_NARCOTIC_VALUE +
+                self.f_he * conf.HE_NARCOTIC_VALUE)
 
         end = pressure_to_depth(narcotic_index / reference_narcotic -
-                                settings.AMBIANT_PRESSURE_SURFACE)
+                                conf.AMBIANT_PRESSURE_SURFACE,
+                                plan_settings=self.plan_settings)
         if end < 0:
             end = 0
         return end
@@ -0,0 +1,73 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+"""Render the calculated dives with the Jinja2 templates.
+
+Jinja2 is only imported when a first output is rendered: calculating
+dives does not need it.
+The templates are compiled once per process, then reused by all the
+renders.
+
+Contains:
+get_environment -- function
+get_template -- function
+render -- function
+"""
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment():
+    """Return the Jinja2 environment of the dipplanner templates.
+
+    The templates are installed with dipplanner and do not change: the
+    environment does not check if they need to be reloaded.
+
+    :returns: Jinja2 environment, shared by all the renders
+    :rtype: :class:`jinja2.Environment`
+    """
+    # pylint: disable=import-outside-toplevel
+    from jinja2 import Environment, PackageLoader
+    return Environment(loader=PackageLoader('dipplanner', 'templates'),
+                       auto_reload=False)
+
+
+def get_template(name):
+    """Return a compiled template.
+
+    :param str name: name of the template, like "default-color.tpl"
+
+    :returns: the template, compiled on the first call only
+    :rtype: :class:`jinja2.Template`
+    """
+    return get_environment().get_template(name)
+
+
+def render(name, plan_settings, dives):
+    """Render dives with a template.
+
+    :param str name: name of the template, like "default-color.tpl"
+    :param plan_settings: settings given to the template
+    :param dives: dives to render
+    :type dives: list of :class:`dipplanner.dive.Dive`
+
+    :returns: the rendered text
+    :rtype: str
+    """
+    # pylint: disable=no-member
+    return get_template(name).render(settings=plan_settings, dives=dives)
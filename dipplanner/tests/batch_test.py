@@ -0,0 +1,98 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for batch planning of dives."""
+from collections import OrderedDict
+
+from dipplanner import settings
+from dipplanner.batch import plan_chain, plan_chains
+from dipplanner.dive import Dive
+from dipplanner.segment import SegmentDive
+
+from dipplanner.tests.common import TestDive
+
+
+class TestBatch(TestDive):
+    """Test the batch planner."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.chains = [[self.make_dive(depth, 20 * 60)]
+                       for depth in (50, 20, 40, 30)]
+
+    def make_dive(self, depth, time, surface_interval=0):
+        """dive in the form used by the batch planner."""
+        return {'tanks': OrderedDict([('airtank', self.airtank),
+                                      ('decoo2', self.decoo2)]),
+                'segments': OrderedDict(
+                    [('segment1', SegmentDive(depth, time, self.airtank,
+                                              0))]),
+                'surface_interval': surface_interval}
+
+    def test_order(self):
+        """results are in the order of the chains."""
+        results = plan_chains(self.chains, jobs=2)
+        self.assertEqual([chain[0].output_segments[0].depth
+                          for chain in results], [50, 20, 40, 30])
+
+    def test_same_as_sequential(self):
+        """parallel results are the sequential ones."""
+        parallel = plan_chains(self.chains, jobs=2)
+        sequential = plan_chains(self.chains, jobs=1)
+        for par_chain, seq_chain in zip(parallel, sequential):
+            self.assertEqual(par_chain[0].run_time, seq_chain[0].run_time)
+            self.assertEqual(
+                [str(seg) for seg in par_chain[0].output_segments],
+                [str(seg) for seg in seq_chain[0].output_segments])
+
+    def test_input_not_modified(self):
+        """batch planning does not consume the given tanks."""
+        plan_chains(self.chains, jobs=1)
+        self.assertEqual(self.airtank.used_gas, 0)
+
+    def test_repetitive_chain(self):
+        """dives of a chain are repetitive dives."""
+        chain = [self.make_dive(30, 20 * 60),
+                 self.make_dive(30, 20 * 60, surface_interval=60 * 60)]
+        results = plan_chains([chain, [self.make_dive(30, 20 * 60)]],
+                              jobs=2)
+        first = Dive([SegmentDive(30, 20 * 60, self.airtank, 0)],
+                     [self.airtank, self.decoo2])
+        first.do_dive()
+        second = Dive([SegmentDive(30, 20 * 60, self.airtank, 0)],
+                      [self.airtank, self.decoo2], first)
+        second.do_surface_interval(60 * 60)
+        second.do_dive()
+        self.assertEqual(results[0][1].run_time, second.run_time)
+        self.assertGreater(results[0][1].run_time, results[1][0].run_time)
+
+    def test_settings_in_workers(self):
+        """workers use the settings of the calling process."""
+        gf_low = settings.GF_LOW
+        try:
+            settings.GF_LOW = 0.10
+            parallel = plan_chains(self.chains, jobs=2)
+            sequential = [plan_chain(chain) for chain in self.chains]
+        finally:
+            settings.GF_LOW = gf_low
+        self.assertEqual([chain[0].run_time for chain in parallel],
+                         [chain[0].run_time for chain in sequential])
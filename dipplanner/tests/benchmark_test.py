@@ -0,0 +1,90 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the benchmarks."""
+import unittest
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+# import here the module / classes to be tested
+from dipplanner.main import activate_debug_for_tests
+
+from dipplanner.benchmark import BENCHMARKS, run_benchmark, run_benchmarks
+from dipplanner.benchmark import compare, main
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test the benchmarks."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+
+    def test_all_benchmarks_run(self):
+        """all the benchmarks can run."""
+        for name, (setup, arguments) in BENCHMARKS.items():
+            function = setup(*arguments)
+            function()
+
+    def test_run_benchmark(self):
+        """times are given for one call."""
+        result = run_benchmark('model.snapshot', repeat=3, min_time=0.001)
+        self.assertGreater(result['number'], 1)
+        self.assertLessEqual(result['min'], result['median'])
+
+    def test_compare(self):
+        """slower benchmarks are regressions."""
+        baseline = {'benchmarks': {'a': {'min': 1.0}, 'b': {'min': 1.0},
+                                   'c': {'min': 1.0}}}
+        results = {'benchmarks': {'a': {'min': 1.1}, 'b': {'min': 1.5},
+                                  'd': {'min': 1.0}}}
+        self.assertEqual(compare(results, baseline, 0.2),
+                         [('a', 1.0, 1.1, 1.1, False),
+                          ('b', 1.0, 1.5, 1.5, True)])
+
+    def test_main_baseline(self):
+        """results saved as JSON can be used as a baseline."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "bench.json")
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(main(["benchmark", "--repeat", "1",
+                                       "--output", output,
+                                       "model.snapshot"]), 0)
+            with open(output) as output_file:
+                results = json.load(output_file)
+            self.assertEqual(list(results['benchmarks']), ['model.snapshot'])
+            # a much faster baseline gives a regression
+            results['benchmarks']['model.snapshot']['min'] /= 100
+            with open(output, "w") as output_file:
+                json.dump(results, output_file)
+            with redirect_stdout(io.StringIO()) as stdout:
+                self.assertEqual(main(["benchmark", "--repeat", "1",
+                                       "--baseline", output,
+                                       "model.snapshot"]), 1)
+            self.assertIn("REGRESSION", stdout.getvalue())
+
+    def test_run_benchmarks_names(self):
+        """only the given benchmarks are run."""
+        results = run_benchmarks(['model.restore'], repeat=1)
+        self.assertEqual(list(results['benchmarks']), ['model.restore'])
@@ -0,0 +1,89 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the deco table."""
+from dipplanner.dive import Dive
+from dipplanner.dive_table import dive_table
+from dipplanner.segment import SegmentDive, UnauthorizedMod
+
+from dipplanner.tests.common import TestDive
+
+
+class TestDiveTable(TestDive):
+    """Test the deco table."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.depths = [10, 20, 30, 40, 50]
+        self.times = [10 * 60, 20 * 60, 30 * 60, 40 * 60, 50 * 60]
+
+    @staticmethod
+    def dive_result(dive):
+        """result of a dive, to compare dives."""
+        return (dive.run_time,
+                [str(segment) for segment in dive.output_segments],
+                [round(tank.used_gas, 6) for tank in dive.tanks],
+                round(dive.model.ox_tox.otu, 6),
+                [str(exc) for exc in dive.dive_exceptions])
+
+    def test_air(self):
+        """air table cells are the independent dives."""
+        table = dive_table(self.depths, self.times, [self.airtank12])
+        for (depth, time), dive in table.items():
+            self.setUp()
+            expected = Dive([SegmentDive(depth, time, self.airtank12, 0)],
+                            [self.airtank12])
+            expected.do_dive_without_exceptions()
+            self.assertEqual(self.dive_result(dive),
+                             self.dive_result(expected))
+
+    def test_trimix(self):
+        """trimix table cells, with deco tanks, are the independent dives."""
+        tanks = [self.txtank1, self.deco1, self.deco2]
+        table = dive_table([40, 60], self.times, tanks)
+        for (depth, time), dive in table.items():
+            self.setUp()
+            tanks = [self.txtank1, self.deco1, self.deco2]
+            expected = Dive([SegmentDive(depth, time, tanks[0], 0)], tanks)
+            expected.do_dive_without_exceptions()
+            self.assertEqual(self.dive_result(dive),
+                             self.dive_result(expected))
+
+    def test_order(self):
+        """cells are ordered by depth then time."""
+        table = dive_table([30, 20], [20 * 60, 10 * 60], [self.airtank])
+        self.assertEqual(list(table.keys()),
+                         [(30, 600), (30, 1200), (20, 600), (20, 1200)])
+
+    def test_tanks_not_modified(self):
+        """the given tanks are not consumed."""
+        dive_table([30], [10 * 60], [self.airtank])
+        self.assertEqual(self.airtank.used_gas, 0)
+
+    def test_exceptions(self):
+        """dive errors are stored in the cells."""
+        table = dive_table([30, 80], [10 * 60, 20 * 60], [self.airtank])
+        self.assertEqual(table[(30, 600)].dive_exceptions, [])
+        for time in (600, 1200):
+            self.assertEqual(len(table[(80, time)].dive_exceptions), 1)
+            self.assertIsInstance(table[(80, time)].dive_exceptions[0],
+                                  UnauthorizedMod)
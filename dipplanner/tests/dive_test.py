@@ -23,8 +23,13 @@
 
 TODO: more test profiles
 """
+import copy
+
+from dipplanner import settings
 from dipplanner.dive import Dive
 from dipplanner.segment import SegmentDive
+from dipplanner.tools import altitude_or_depth_to_absolute_pressure
+from dipplanner.tools import calculate_pp_h2o_surf
 
 from dipplanner.tests.common import TestDive
 
@@ -313,3 +318,179 @@ class TestDiveCCRDiveOutput1(TestDive):
                 self.expected_result[idx],
                 'bad segment n°%s (%s)' % (
                     idx, self.profile1.output_segments[idx]))
+
+
+class TestDiveNoFlightDesat(TestDive):
+    """Test the no flight and full desat times of a trimix dive."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        diveseg1 = SegmentDive(60, 25 * 60, self.txtanknormodbl, 0)
+        self.profile1 = Dive([diveseg1], [self.txtanknormodbl,
+                                          self.deco1])
+        self.profile1.do_dive()
+
+    def stepping_time(self, f_n2, done):
+        """surface time found by looping on const_depth by minutes."""
+        model = copy.deepcopy(self.profile1.model)
+        seg_time = 0
+        while True:
+            model.const_depth(0.0, 60, 0.0, f_n2, 0.0)
+            seg_time += 60
+            if done(model):
+                return seg_time
+
+    def test_no_flight_same_as_stepping(self):
+        """no flight time gives the stepping result."""
+        pressure = altitude_or_depth_to_absolute_pressure(
+            settings.FLIGHT_ALTITUDE)
+        self.assertEqual(
+            self.profile1.no_flight_time(),
+            self.stepping_time(
+                self.airtank.f_n2,
+                lambda model: model.ceiling_in_pabs() <= pressure))
+
+    def test_full_desat_same_as_stepping(self):
+        """full desat time gives the stepping result."""
+        margin = 0.01 + calculate_pp_h2o_surf(settings.SURFACE_TEMP)
+        self.assertEqual(
+            self.profile1.full_desat_time(),
+            self.stepping_time(settings.DEFAULT_AIR_FN2, lambda model: all(
+                comp.pp_n2 <= settings.DEFAULT_AIR_FN2 + margin and
+                comp.pp_he <= margin for comp in model.tissues)))
+
+    def test_exact(self):
+        """exact mode is rounded to the second, within the minute."""
+        no_flight = self.profile1.no_flight_time(exact=True)
+        self.assertLessEqual(no_flight, self.profile1.no_flight_time())
+        self.assertGreater(no_flight, self.profile1.no_flight_time() - 60)
+        desat = self.profile1.full_desat_time(exact=True)
+        self.assertLessEqual(desat, self.profile1.full_desat_time())
+        self.assertGreater(desat, self.profile1.full_desat_time() - 60)
+
+
+class TestDiveIterDive(TestDive):
+    """Test the dive calculated segment by segment."""
+
+    def compare(self, segments, tanks):
+        """iter_dive gives the segments and results of do_dive."""
+        expected = Dive(*copy.deepcopy((segments, tanks)))
+        expected.do_dive()
+        dive = Dive(*copy.deepcopy((segments, tanks)))
+        streamed = []
+        for segment in dive.iter_dive():
+            streamed.append((str(segment), segment.tank.remaining_gas))
+        self.assertEqual([text for text, _ in streamed],
+                         [str(segment) for segment in
+                          expected.output_segments])
+        self.assertEqual(str(dive), str(expected))
+        self.assertEqual(dive.model.ox_tox.otu, expected.model.ox_tox.otu)
+        self.assertEqual([tank.remaining_gas for tank in dive.tanks],
+                         [tank.remaining_gas for tank in expected.tanks])
+        # the gas is consumed as the segments are returned
+        self.assertGreater(streamed[0][1], streamed[-1][1])
+
+    def test_air(self):
+        """air dive with deco gas."""
+        self.compare([SegmentDive(40, 25 * 60, self.airtank, 0)],
+                     [self.airtank, self.decoo2])
+
+    def test_trimix_travel(self):
+        """hypoxic trimix dive with travel and deco gases."""
+        self.compare([SegmentDive(90, 20 * 60, self.txhypo, 0)],
+                     [self.txtravel, self.txhypo, self.deco1, self.decoo2])
+
+    def test_ccr(self):
+        """closed circuit dive with bail out gas."""
+        self.compare([SegmentDive(55, 30 * 60, self.txtank1, 1.4)],
+                     [self.txtank1, self.decoo2])
+
+    def test_multilevel(self):
+        """multilevel dive, with an ascent between the input segments."""
+        self.compare([SegmentDive(40, 10 * 60, self.airtank, 0),
+                      SegmentDive(20, 20 * 60, self.airtank, 0)],
+                     [self.airtank, self.decoo2])
+
+    def test_stop_early(self):
+        """dive can be stopped before the end of the plan."""
+        dive = Dive([SegmentDive(40, 25 * 60, self.airtank, 0)],
+                    [self.airtank, self.decoo2])
+        for segment in dive.iter_dive():
+            if segment.type == 'deco':
+                break
+        self.assertEqual(dive.output_segments[-1].type, 'deco')
+        self.assertGreater(dive.current_depth, 0)
+
+
+class TestDiveReplan(TestDive):
+    """Test the dive replanned from its checkpoints."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.tanks = [self.txhypo, self.txtravel, self.deco1, self.decoo2]
+        self.segments = [SegmentDive(60, 10 * 60, self.txhypo, 0),
+                         SegmentDive(45, 10 * 60, self.txhypo, 0),
+                         SegmentDive(30, 10 * 60, self.txhypo, 0)]
+        self.dive = Dive(list(self.segments), self.tanks)
+        self.dive.do_dive()
+
+    def replan(self, segments, unchanged):
+        """replan gives the same dive as a new dive."""
+        self.assertEqual(self.dive.replan(segments), unchanged)
+        (segments, tanks) = copy.deepcopy((segments, self.tanks))
+        for tank in tanks:
+            tank.refill()
+        expected = Dive(segments, tanks)
+        expected.do_dive()
+        self.assertEqual(str(self.dive), str(expected))
+        self.assertEqual(self.dive.model.ox_tox.otu,
+                         expected.model.ox_tox.otu)
+        self.assertEqual([tank.remaining_gas for tank in self.dive.tanks],
+                         [tank.remaining_gas for tank in expected.tanks])
+
+    def test_checkpoints(self):
+        """one checkpoint per input segment (with the travel segments)."""
+        self.assertEqual(len(self.dive.checkpoints),
+                         len(self.dive.input_segments))
+        self.assertEqual(self.dive.checkpoints[-1].current_depth, 30)
+
+    def test_last_segment(self):
+        """only the last segment is changed."""
+        self.replan(self.segments[:2] +
+                    [SegmentDive(30, 15 * 60, self.txhypo, 0)], 2)
+
+    def test_middle_segment(self):
+        """a segment in the middle is changed."""
+        self.replan([self.segments[0],
+                     SegmentDive(40, 10 * 60, self.txhypo, 0),
+                     self.segments[2]], 1)
+
+    def test_first_segment(self):
+        """the first segment is changed: the whole dive is replanned."""
+        self.replan([SegmentDive(55, 10 * 60, self.txhypo, 0)] +
+                    self.segments[1:], 0)
+
+    def test_add_remove(self):
+        """segments are added, then removed."""
+        self.replan(self.segments +
+                    [SegmentDive(21, 5 * 60, self.txhypo, 0)], 3)
+        self.replan(self.segments[:2], 2)
+
+    def test_same(self):
+        """same segments: only the final ascent is calculated."""
+        self.replan(list(self.segments), 3)
+
+    def test_multilevel(self):
+        """multilevel mode: the ascents between the levels are kept."""
+        settings.MULTILEVEL_MODE = True
+        try:
+            for tank in self.tanks:
+                tank.refill()
+            self.dive = Dive(list(self.segments), self.tanks)
+            self.dive.do_dive()
+            self.replan(self.segments[:2] +
+                        [SegmentDive(30, 5 * 60, self.txhypo, 0)], 2)
+        finally:
+            settings.MULTILEVEL_MODE = False
@@ -0,0 +1,191 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the gas plans of the dives."""
+import copy
+import math
+
+from dipplanner.dive import Dive
+from dipplanner.gas_plan import GasPlan
+from dipplanner.plan_settings import current_settings
+from dipplanner.segment import SegmentDive
+from dipplanner.tank import Tank
+
+from dipplanner.tests.common import TestDive
+
+
+class TestGasPlan(TestDive):
+    """Test the gas consumption over the segment arrays."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.dive = Dive([SegmentDive(45, 25 * 60, self.airdouble, 0)],
+                         [self.airdouble, self.decoo2])
+        self.dive.do_dive()
+        self.gas_plan = GasPlan.from_dive(self.dive)
+
+    def test_segments(self):
+        """one entry per output segment."""
+        self.assertEqual(len(self.gas_plan), len(self.dive.output_segments))
+        self.assertEqual(list(self.gas_plan.run_times),
+                         [segment.run_time
+                          for segment in self.dive.output_segments])
+
+    def test_same_as_dive(self):
+        """with the rates of the dive: same gas as do_gas_calcs."""
+        result = self.gas_plan.consumption()
+        for index, tank in enumerate(self.dive.tanks):
+            self.assertAlmostEqual(result.used_gas[index], tank.used_gas)
+            self.assertAlmostEqual(result.remaining_gas[index],
+                                   tank.remaining_gas)
+        self.assertIsNone(result.violation_time)
+        self.assertIsNone(result.violation_tank)
+        tank_indexes = self.dive.segment_tank_indexes()
+        self.assertAlmostEqual(result.timeline[-1],
+                               self.dive.tanks[tank_indexes[-1]].remaining_gas)
+
+    def test_higher_rate(self):
+        """the rule is violated during the dive with a higher rate."""
+        result = self.gas_plan.consumption(dive_rate=40.0 / 60)
+        self.assertEqual(self.dive.tanks[result.violation_tank].name,
+                         self.airdouble.name)
+        self.assertGreater(result.violation_time, 0)
+        self.assertLess(result.violation_time, self.dive.run_time)
+        self.assertLess(result.remaining_gas[result.violation_tank],
+                        self.gas_plan.min_gas[result.violation_tank])
+
+    def test_violation_instant(self):
+        """at the violation instant, the remaining gas is the rule."""
+        rate = 60.0 / 60
+        result = self.gas_plan.consumption(dive_rate=rate, deco_rate=rate)
+        tank_index = result.violation_tank
+        remaining_gas = self.gas_plan.start_gas[tank_index]
+        for position in range(len(self.gas_plan)):
+            if self.gas_plan.tank_indexes[position] != tank_index:
+                continue
+            if self.gas_plan.run_times[position] >= result.violation_time:
+                break
+            remaining_gas -= self.gas_plan.volumes[position] * rate
+        # the segment of the violation is at constant depth or a ramp:
+        # consume until the violation instant
+        time = result.violation_time - (self.gas_plan.run_times[position] -
+                                        self.gas_plan.times[position])
+        start_pressure = self.gas_plan.start_pressures[position]
+        change = self.gas_plan.pressure_changes[position]
+        remaining_gas -= rate * (start_pressure * time + change * time ** 2 /
+                                 (2 * self.gas_plan.times[position]))
+        self.assertAlmostEqual(remaining_gas,
+                               self.gas_plan.min_gas[tank_index], 6)
+
+    def test_min_gas(self):
+        """other tank rules."""
+        result = self.gas_plan.consumption(
+            min_gas=[tank.total_gas for tank in self.dive.tanks])
+        self.assertEqual(result.violation_time, 0)
+        result = self.gas_plan.consumption(min_gas=[0, 0])
+        self.assertIsNone(result.violation_time)
+
+    def test_same_gas(self):
+        """tanks with the same gas are not mixed up."""
+        back = Tank(tank_vol=24.0, tank_pressure=230)
+        stage = Tank(tank_vol=11.1, tank_pressure=200)
+        dive = Dive([SegmentDive(30, 10 * 60, stage, 0),
+                     SegmentDive(30, 15 * 60, back, 0)], [back, stage])
+        dive.do_dive()
+        gas_plan = GasPlan.from_dive(dive)
+        self.assertEqual(set(gas_plan.tank_indexes), {0, 1})
+        result = gas_plan.consumption()
+        for index, tank in enumerate(dive.tanks):
+            self.assertGreater(tank.used_gas, 0)
+            self.assertAlmostEqual(result.used_gas[index], tank.used_gas)
+            self.assertAlmostEqual(gas_plan.start_gas[index],
+                                   tank.total_gas)
+            self.assertEqual(result.violation_tank == index,
+                             not tank.check_rule())
+
+    def test_ccr(self):
+        """segments in CCR mode do not use gas."""
+        dive = Dive([SegmentDive(30, 20 * 60, self.airtank, 1.2)],
+                    [self.airtank])
+        dive.do_dive()
+        result = GasPlan.from_dive(dive).consumption(dive_rate=1.0)
+        self.assertEqual(result.used_gas, [0.0])
+        self.assertTrue(all(math.isnan(gas) for gas in result.timeline))
+        self.assertIsNone(result.violation_time)
+
+
+class TestGasPlanSweep(TestDive):
+    """Test the gas consumption for several rates."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.segments = [SegmentDive(45, 25 * 60, self.airdouble, 0)]
+        self.tanks = [self.airdouble, self.decoo2]
+        dive = Dive(*copy.deepcopy((self.segments, self.tanks)))
+        dive.do_dive()
+        self.gas_plan = GasPlan.from_dive(dive)
+
+    def test_same_as_replan(self):
+        """same results as the dive planned with these rates."""
+        plan_settings = current_settings()._replace(
+            DIVE_CONSUMPTION_RATE=30.0 / 60, DECO_CONSUMPTION_RATE=25.0 / 60)
+        segments, tanks = copy.deepcopy((self.segments, self.tanks))
+        for segment in segments:
+            segment.plan_settings = plan_settings
+        dive = Dive(segments, tanks, plan_settings=plan_settings)
+        dive.do_dive()
+        result = self.gas_plan.sweep([30.0 / 60], [25.0 / 60])[0]
+        for index, tank in enumerate(dive.tanks):
+            self.assertAlmostEqual(result.used_gas[index], tank.used_gas)
+            self.assertAlmostEqual(result.remaining_gas[index],
+                                   tank.remaining_gas)
+            self.assertEqual(result.rules_ok[index], tank.check_rule())
+
+    def test_same_as_consumption(self):
+        """same results as the consumption of each rate."""
+        rates = [rate / 60.0 for rate in range(10, 61, 5)]
+        results = self.gas_plan.sweep(rates)
+        self.assertEqual([result.dive_rate for result in results], rates)
+        for result in results:
+            consumption = self.gas_plan.consumption(result.dive_rate,
+                                                    result.deco_rate)
+            for index in range(len(self.gas_plan.tanks)):
+                self.assertAlmostEqual(result.used_gas[index],
+                                       consumption.used_gas[index])
+            self.assertEqual(all(result.rules_ok),
+                             consumption.violation_time is None)
+        # the deco rate is scaled like the dive rate
+        self.assertAlmostEqual(results[0].deco_rate, 10.0 / 60 * 17 / 20)
+
+    def test_reserve_fractions(self):
+        """one result per rate and reserve fraction."""
+        results = self.gas_plan.sweep([20.0 / 60, 40.0 / 60],
+                                      reserve_fractions=[0, 1.0 / 3, 1])
+        self.assertEqual([(result.dive_rate, result.reserve_fraction)
+                          for result in results],
+                         [(rate, fraction)
+                          for rate in (20.0 / 60, 40.0 / 60)
+                          for fraction in (0, 1.0 / 3, 1)])
+        self.assertTrue(all(results[0].rules_ok))
+        self.assertFalse(any(results[2].rules_ok))
+        self.assertFalse(all(results[4].rules_ok))
@@ -0,0 +1,119 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the gradient factors optimizer."""
+import copy
+
+from dipplanner.dive import Dive
+from dipplanner.gf_optimizer import optimize_gradient_factors
+from dipplanner.plan_limits import PlanLimits, plan_within_limits
+from dipplanner.plan_settings import current_settings
+from dipplanner.segment import SegmentDive
+
+from dipplanner.tests.common import TestDive
+
+
+class TestGfOptimizer(TestDive):
+    """Test the gradient factors optimizer."""
+
+    gf_lows = (0.2, 0.3, 0.4, 0.5)
+    gf_highs = (0.7, 0.8, 0.9)
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.segments = [SegmentDive(50, 25 * 60, self.airdouble, 0)]
+        self.tanks = [self.airdouble, self.decoo2]
+
+    def dive(self, gf_low, gf_high, segments=None):
+        """Return the dive calculated with the gradient factors."""
+        dive = Dive(*copy.deepcopy((segments or self.segments, self.tanks)),
+                    plan_settings=current_settings(GF_LOW=gf_low,
+                                                   GF_HIGH=gf_high))
+        dive.do_dive()
+        return dive
+
+    def optimize(self, limits, **kwargs):
+        """Return the result of the optimizer on the small grid."""
+        return optimize_gradient_factors(self.segments, self.tanks, limits,
+                                         self.gf_lows, self.gf_highs,
+                                         **kwargs)
+
+    def test_most_conservative(self):
+        """result is the most conservative candidate meeting the limits."""
+        limit = self.dive(0.3, 0.8).run_time
+        result = self.optimize(PlanLimits(max_run_time=limit))
+        self.assertEqual(str(result.dive),
+                         str(self.dive(result.gf_low, result.gf_high)))
+        self.assertLessEqual(result.dive.run_time, limit)
+        # every candidate with a lower GF_HIGH violates the limit
+        for gf_low in self.gf_lows:
+            for gf_high in self.gf_highs:
+                if gf_low <= gf_high < result.gf_high:
+                    self.assertGreater(self.dive(gf_low, gf_high).run_time,
+                                       limit)
+        self.assertEqual(result.gf_high, 0.8)
+        self.assertEqual(result.gf_low,
+                         min(low for low, high in result.frontier.items()
+                             if high == 0.8))
+
+    def test_frontier(self):
+        """lowest GF_HIGH for each GF_LOW, with pruning."""
+        limits = PlanLimits(max_run_time=self.dive(0.4, 0.8).run_time)
+        result = self.optimize(limits)
+        for gf_low, gf_high in result.frontier.items():
+            if gf_high is None:
+                continue
+            self.assertIsNone(plan_within_limits(
+                Dive(*copy.deepcopy((self.segments, self.tanks)),
+                     plan_settings=current_settings(GF_LOW=gf_low,
+                                                    GF_HIGH=gf_high)),
+                limits))
+        self.assertLess(result.evaluated,
+                        len(self.gf_lows) * len(self.gf_highs))
+
+    def test_no_candidate(self):
+        """no candidate meets the limits."""
+        result = self.optimize(PlanLimits(max_run_time=30 * 60))
+        self.assertIsNone(result.gf_low)
+        self.assertIsNone(result.dive)
+        self.assertEqual(list(result.frontier.values()),
+                         [None] * len(self.gf_lows))
+
+    def test_inputs_not_modified(self):
+        """given tanks are not consumed."""
+        self.optimize(PlanLimits())
+        self.assertEqual(self.airdouble.used_gas, 0.0)
+
+    def test_multilevel(self):
+        """dive with an ascent in its input segments."""
+        self.segments = [SegmentDive(50, 15 * 60, self.airdouble, 0),
+                         SegmentDive(20, 20 * 60, self.airdouble, 0)]
+        limit = self.dive(0.3, 0.8).run_time
+        result = self.optimize(PlanLimits(max_run_time=limit))
+        self.assertEqual(str(result.dive),
+                         str(self.dive(result.gf_low, result.gf_high)))
+
+    def test_jobs(self):
+        """same result on several processes."""
+        limits = PlanLimits(max_run_time=self.dive(0.3, 0.8).run_time)
+        result = self.optimize(limits, jobs=2)
+        self.assertEqual(result[:2], self.optimize(limits)[:2])
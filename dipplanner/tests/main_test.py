@@ -22,9 +22,15 @@
 # pylint: disable=missing-docstring
 """Test for main: arguments in command line and config files."""
 import unittest
+import io
+import json
+import logging
+import os
+import tempfile
+from contextlib import redirect_stdout
 # import here the module / classes to be tested
 from dipplanner import settings
-from dipplanner.main import activate_debug_for_tests
+from dipplanner.main import activate_debug_for_tests, main
 from dipplanner.parse_cli_args import DipplannerCliArguments
 from dipplanner.tools import altitude_to_pressure
 
@@ -282,6 +288,36 @@ class TestAllCli(TestCliArguments):
                          "Wrong template: %s" %
                          settings.TEMPLATE)
 
+    def test_format(self):
+        cli_args = ["dipplanner",
+                    "-t", "airtank;0.21;0.0;12;200;50b",
+                    "-s", "30;25*60;airtank;0.0",
+                    "--format=jsonl", ]
+        dipplanner_arguments = DipplannerCliArguments(cli_args)
+        self.assertEqual(dipplanner_arguments.args.format, 'jsonl',
+                         "Wrong format: %s" %
+                         dipplanner_arguments.args.format)
+
+    def test_cache(self):
+        cli_args = ["dipplanner",
+                    "-t", "airtank;0.21;0.0;12;200;50b",
+                    "-s", "30;25*60;airtank;0.0",
+                    "--cache=plans.cache", ]
+        dipplanner_arguments = DipplannerCliArguments(cli_args)
+        self.assertEqual(dipplanner_arguments.args.cache, 'plans.cache',
+                         "Wrong cache: %s" %
+                         dipplanner_arguments.args.cache)
+
+    def test_table(self):
+        cli_args = ["dipplanner",
+                    "-t", "airtank;0.21;0.0;12;200;50b",
+                    "-s", "30;25*60;airtank;0.0",
+                    "--table=20,30;10*60,20*60,30*60", ]
+        dipplanner_arguments = DipplannerCliArguments(cli_args)
+        self.assertEqual(dipplanner_arguments.table,
+                         ([20.0, 30.0], [600.0, 1200.0, 1800.0]),
+                         "Wrong table: %s" % (dipplanner_arguments.table, ))
+
 
 class TestAllConfig(TestCliArguments):
 
@@ -510,3 +546,52 @@ class TestAllConfig(TestCliArguments):
                          2699,
                          "Wrong flight_altitude: %s" %
                          settings.FLIGHT_ALTITUDE)
+
+
+class TestMainCache(TestCliArguments):
+    """Test the plan cache of the command line."""
+
+    def setUp(self):
+        TestCliArguments.setUp(self)
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        # main writes its log in the current directory
+        os.chdir(self.directory.name)
+        self.handlers = list(logging.getLogger("dipplanner").handlers)
+        self.version = settings.__VERSION__
+
+    def tearDown(self):
+        dipplanner_logger = logging.getLogger("dipplanner")
+        for handler in dipplanner_logger.handlers[:]:
+            if handler not in self.handlers:
+                dipplanner_logger.removeHandler(handler)
+                handler.close()
+        settings.__VERSION__ = self.version
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def used_gas(self, tank, cache=True):
+        """Plan a dive on one of two identical tanks.
+
+        :returns: gas used in each tank
+        """
+        cli_args = ["dipplanner",
+                    "-t", "left;0.21;0.0;12;200;50b",
+                    "-t", "right;0.21;0.0;12;200;50b",
+                    "-s", "30;20*60;%s;0.0" % tank,
+                    "--format=jsonl"]
+        if cache:
+            cli_args.append("--cache=plans.cache")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(cli_args)
+        dive = json.loads(output.getvalue().splitlines()[0])
+        return [dive_tank['used_gas'] for dive_tank in dive['tanks']]
+
+    def test_identical_tanks(self):
+        left = self.used_gas("left")
+        self.assertTrue(os.path.exists("plans.cache"))
+        right = self.used_gas("right")
+        self.assertEqual(right, self.used_gas("right", cache=False))
+        self.assertEqual(right, list(reversed(left)))
+        self.assertEqual(right[0], 0.0)
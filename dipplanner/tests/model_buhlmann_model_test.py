@@ -21,6 +21,7 @@
 # pylint: disable=too-many-ancestors, attribute-defined-outside-init
 """Test for Model class."""
 import unittest
+import copy
 # import here the module / classes to be tested
 from dipplanner.main import activate_debug_for_tests
 
@@ -159,3 +160,102 @@ C:13 He:0.000000 N2:1.289557 gf:0.30 mv_at:1.322662 max_amb:1.194140 MV:0.974971
 C:14 He:0.000000 N2:1.182002 gf:0.30 mv_at:1.303249 max_amb:1.093999 MV:0.906966
 C:15 He:0.000000 N2:1.097863 gf:0.30 mv_at:1.282374 max_amb:1.017084 MV:0.856118
 """, "Error in model output : %s" % str(self.model2))
+
+
+class TestModelBuhlmannStopTime(unittest.TestCase):
+    """Test the deco stop time solver."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+        self.model = Model()
+        self.model.const_depth(5, 30 * 60, 0.0, 0.79, 0.0)
+        self.model.gradient.gf = 0.8
+        self.stop_pressure = 9 / 10.0
+
+    def stepping_stop_time(self, next_stop_depth):
+        """stop time found by looping on const_depth."""
+        stop_time = 0
+        while True:
+            self.model.const_depth(self.stop_pressure, 1, 0.0, 0.79, 0.0)
+            stop_time += 1
+            if next_stop_depth >= self.model.ceiling():
+                return stop_time
+
+    def test_stop_time_same_as_stepping(self):
+        """solver gives the stepping stop time."""
+        stop_time = self.model.stop_time(self.stop_pressure, 0.0, 0.79, 0.0,
+                                         6.0, 1, 300000)
+        self.assertEqual(stop_time, self.stepping_stop_time(6.0))
+
+    def test_stop_time_model_unchanged(self):
+        """solver does not change the model."""
+        pp_n2 = list(self.model.tissue_state.pp_n2)
+        self.model.stop_time(self.stop_pressure, 0.0, 0.79, 0.0, 6.0, 1,
+                             300000)
+        self.assertEqual(self.model.tissue_state.pp_n2, pp_n2)
+
+    def test_stop_time_minimum(self):
+        """already cleared ceiling gives one increment."""
+        self.assertEqual(self.model.stop_time(self.stop_pressure, 0.0, 0.79,
+                                              0.0, 40.0, 10, 300000), 10)
+
+    def test_stop_time_too_long(self):
+        """stop longer than the max time."""
+        self.assertIsNone(self.model.stop_time(self.stop_pressure, 0.0, 0.79,
+                                               0.0, 6.0, 1, 10))
+
+
+class TestModelBuhlmannSnapshot(unittest.TestCase):
+    """Test the snapshots and copies of the model."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+        self.model = Model()
+        self.model.const_depth(5, 30 * 60, 0.2, 0.6, 0.0)
+        self.model.gradient.set_gf_slope_at_depth(40)
+
+    def dive(self):
+        """continue the dive of self.model."""
+        self.model.asc_desc(5, 3, -10, 0.2, 0.6, 0.0)
+        self.model.const_depth(3, 10 * 60, 0.0, 0.5, 0.0)
+        self.model.gradient.set_gf_at_depth(20)
+
+    def test_snapshot_flat(self):
+        """snapshot is a flat tuple."""
+        snapshot = self.model.snapshot()
+        self.assertIsInstance(snapshot, tuple)
+        self.assertEqual(len(snapshot), 2 * Model.COMPS + 5 + 3)
+
+    def test_restore(self):
+        """restore goes back to the state of the snapshot."""
+        snapshot = self.model.snapshot()
+        expected = repr(self.model)
+        self.dive()
+        self.assertNotEqual(repr(self.model), expected)
+        self.model.restore(snapshot)
+        self.assertEqual(repr(self.model), expected)
+        self.assertEqual(self.model.snapshot(), snapshot)
+
+    def test_restore_same_dive(self):
+        """a restored model gives the same results."""
+        snapshot = self.model.snapshot()
+        self.dive()
+        expected = self.model.snapshot()
+        self.model.restore(snapshot)
+        self.dive()
+        self.assertEqual(self.model.snapshot(), expected)
+
+    def test_deepcopy(self):
+        """a copy is the same model, and is independent."""
+        model_copy = copy.deepcopy(self.model)
+        self.assertEqual(model_copy.snapshot(), self.model.snapshot())
+        self.assertEqual(repr(model_copy), repr(self.model))
+        self.dive()
+        self.assertNotEqual(model_copy.snapshot(), self.model.snapshot())
+        self.model, model_copy = model_copy, self.model
+        self.dive()
+        self.assertEqual(self.model.snapshot(), model_copy.snapshot())
@@ -0,0 +1,221 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for TissueState class."""
+import unittest
+import copy
+import math
+import pickle
+# import here the module / classes to be tested
+from dipplanner.main import activate_debug_for_tests
+
+from dipplanner.model.buhlmann.compartment import Compartment
+from dipplanner.model.buhlmann.tissue_state import ExpTable, TissueState
+from dipplanner.model.buhlmann.tissue_state import time_to_pressure
+from dipplanner.model.buhlmann.model import Model
+from dipplanner.model.buhlmann.model_exceptions import ModelStateException
+
+
+class TestModelBuhlmannTissueState(unittest.TestCase):
+    """Test the array backed tissue state."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+        self.state = TissueState(2)
+        self.state.set_time_constants(0, 1.88, 5.0,
+                                      1.6189, 0.4770, 1.1696, 0.5578)
+        self.state.set_time_constants(1, 3.02, 8.0,
+                                      1.3830, 0.5747, 1.0000, 0.6514)
+        self.comps = [Compartment(1.88, 5.0, 1.6189, 0.4770, 1.1696, 0.5578),
+                      Compartment(3.02, 8.0, 1.3830, 0.5747, 1.0000, 0.6514)]
+        for index, comp in enumerate(self.comps):
+            self.state.set_pp(index, 0.3, 1.2)
+            comp.set_pp(0.3, 1.2)
+
+    def test_const_depth(self):
+        """vectorized const_depth gives the compartment results."""
+        self.state.const_depth(1.5, 2.8, 5 * 60)
+        for index, comp in enumerate(self.comps):
+            comp.const_depth(1.5, 2.8, 5 * 60)
+            self.assertEqual(self.state.pp_he[index], comp.pp_he)
+            self.assertEqual(self.state.pp_n2[index], comp.pp_n2)
+            self.assertEqual(self.state.a_he_n2[index], comp.a_he_n2)
+            self.assertEqual(self.state.b_he_n2[index], comp.b_he_n2)
+
+    def test_asc_desc(self):
+        """vectorized asc_desc gives the compartment results."""
+        self.state.asc_desc(1.5, 2.8, -0.01, -0.02, 90)
+        for index, comp in enumerate(self.comps):
+            comp.asc_desc(1.5, 2.8, -0.01, -0.02, 90)
+            self.assertEqual(self.state.pp_he[index], comp.pp_he)
+            self.assertEqual(self.state.pp_n2[index], comp.pp_n2)
+
+    def test_max_amb(self):
+        """vectorized max_amb gives the compartment results."""
+        self.assertEqual(self.state.max_amb(0.3),
+                         [comp.get_max_amb(0.3) for comp in self.comps])
+
+    def test_m_values(self):
+        """vectorized m_values gives the compartment results."""
+        self.assertEqual(self.state.m_values(1.5),
+                         [comp.get_mv(1.5) for comp in self.comps])
+
+    def test_time_to_pressure(self):
+        """time to pressure inverts the constant depth equation."""
+        self.state.const_depth(0.0, 0.79, 10 * 60)
+        self.assertAlmostEqual(
+            time_to_pressure(1.2, 0.79, self.state.k_n2[0],
+                             self.state.pp_n2[0]), 10 * 60, 6)
+        self.assertEqual(time_to_pressure(0.5, 0.79, 0.1, 0.8), 0.0)
+        self.assertIsNone(time_to_pressure(1.2, 0.79, 0.1, 0.7))
+
+    def test_tolerance_times(self):
+        """closed form tolerance time gives the searched one."""
+        self.state.set_pp(1, 0.0, 2.5)
+        times = self.state.tolerance_times(0.0, 0.79, 0.8, 1.0, 300000)
+        self.assertAlmostEqual(
+            times[1],
+            self.state._tolerance_time_search(1, 0.0, 0.79, 0.8, 1.0,
+                                              300000),
+            1)
+        self.assertEqual(
+            self.state.tolerance_times(0.0, 0.79, 0.8, 3.0, 300000),
+            [0.0, 0.0])
+        self.assertEqual(
+            self.state.tolerance_times(0.0, 0.79, 0.8, 1.0, 10)[1], None)
+
+    def test_negative_time(self):
+        """negative time raises an exception."""
+        self.assertRaises(ModelStateException,
+                          self.state.const_depth, 1.5, 2.8, -1)
+
+    def test_lazy_coefficients(self):
+        """adjusted coefficients are only calculated when read."""
+        self.state.const_depth(1.5, 2.8, 5 * 60)
+        self.assertTrue(self.state._coefs_dirty)
+        pp_he = self.state.pp_he[1]
+        pp_n2 = self.state.pp_n2[1]
+        self.assertEqual(self.state.a_he_n2[1],
+                         (1.3830 * pp_he + 1.0000 * pp_n2) / (pp_he + pp_n2))
+        self.assertEqual(self.state.b_he_n2[1],
+                         (0.5747 * pp_he + 0.6514 * pp_n2) / (pp_he + pp_n2))
+        self.assertFalse(self.state._coefs_dirty)
+
+    def test_restore_coefficients(self):
+        """restore gives back the coefficients of the snapshot."""
+        snapshot = self.state.snapshot()
+        self.assertEqual(len(snapshot), 2 * self.state.size)
+        max_amb = self.state.max_amb(0.8)
+        self.state.const_depth(1.5, 2.8, 5 * 60)
+        self.assertNotEqual(self.state.max_amb(0.8), max_amb)
+        self.state.restore(snapshot)
+        self.assertEqual(self.state.max_amb(0.8), max_amb)
+
+
+class TestModelBuhlmannCompartmentView(unittest.TestCase):
+    """Test the compartments of a model are views onto its tissue state."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+        self.model = Model()
+
+    def test_view_read(self):
+        """compartment reads the model tissue state."""
+        self.model.const_depth(3.0, 10 * 60, 0.3, 0.49, 0.0)
+        self.assertEqual(self.model.tissues[3].pp_he,
+                         self.model.tissue_state.pp_he[3])
+
+    def test_view_write(self):
+        """compartment writes into the model tissue state."""
+        self.model.tissues[5].set_pp(0.5, 2.0)
+        self.assertEqual(self.model.tissue_state.pp_n2[5], 2.0)
+
+    def test_deepcopy_keeps_views(self):
+        """deepcopied model has its own tissue state."""
+        model_copy = copy.deepcopy(self.model)
+        model_copy.const_depth(3.0, 10 * 60, 0.3, 0.49, 0.0)
+        self.assertEqual(model_copy.tissues[0].pp_he,
+                         model_copy.tissue_state.pp_he[0])
+        self.assertEqual(self.model.tissues[0].pp_he, 0.0)
+
+
+class TestModelBuhlmannExpTable(unittest.TestCase):
+    """Test the shared tables of exponential factors."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+
+    def test_factors(self):
+        """factors are e^-kt."""
+        table = ExpTable.get([0.1, 0.2])
+        self.assertEqual(table.exp(3.0), (math.exp(-0.1 * 3.0),
+                                          math.exp(-0.2 * 3.0)))
+
+    def test_shared(self):
+        """models with the same coefficients share the tables."""
+        model1 = Model()
+        model2 = Model()
+        model1.const_depth(3.0, 60, 0.0, 0.79, 0.0)
+        model2.const_depth(3.0, 60, 0.0, 0.79, 0.0)
+        self.assertIs(model1.tissue_state._exp_tables()[1],
+                      model2.tissue_state._exp_tables()[1])
+        self.assertIs(ExpTable.get(model1.tissue_state.k_n2),
+                      model1.tissue_state._exp_tables()[1])
+
+    def test_max_size(self):
+        """full tables are emptied."""
+        table = ExpTable((0.5, ))
+        for seg_time in range(ExpTable.MAX_SIZE + 10):
+            table.exp(float(seg_time))
+        self.assertLessEqual(len(table.factors), ExpTable.MAX_SIZE)
+        self.assertEqual(table.exp(2.0), (math.exp(-0.5 * 2.0), ))
+
+    def test_time_constants_changed(self):
+        """new time constants use new tables."""
+        state = TissueState(1)
+        state.set_time_constants(0, 1.51, 4.0, 1.7424, 0.4245, 1.2599,
+                                 0.5050)
+        state.set_all_pp([0.0], [0.79])
+        state.const_depth(0.0, 0.79 * 2, 60)
+        state.set_time_constants(0, 3.02, 8.0, 1.3830, 0.5747, 1.0000,
+                                 0.6514)
+        state.set_all_pp([0.0], [0.79])
+        state.const_depth(0.0, 0.79 * 2, 60)
+        self.assertAlmostEqual(state.pp_n2[0],
+                               0.79 + 0.79 * (1 - math.exp(-math.log(2) / 8)))
+
+    def test_pickle(self):
+        """pickled tissue states do not carry the tables."""
+        model = Model()
+        model.const_depth(3.0, 60, 0.0, 0.79, 0.0)
+        data = pickle.dumps(model.tissue_state)
+        state = pickle.loads(data)
+        self.assertIsNone(state._exp_he)
+        self.assertNotIn(b'ExpTable', data)
+        state.const_depth(0.0, 0.79, 60)
+        model.tissue_state.const_depth(0.0, 0.79, 60)
+        self.assertEqual(state.pp_n2, model.tissue_state.pp_n2)
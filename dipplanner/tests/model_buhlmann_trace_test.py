@@ -0,0 +1,86 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the trace of the Buhlmann model."""
+import unittest
+import copy
+import io
+from contextlib import redirect_stdout
+# import here the module / classes to be tested
+from dipplanner.main import activate_debug_for_tests
+
+from dipplanner.model.buhlmann.model import Model
+from dipplanner.model.buhlmann.trace import TraceBuffer
+
+
+class TestModelBuhlmannTrace(unittest.TestCase):
+    """Test the trace of the model."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+        self.model = Model()
+
+    def dive(self):
+        """small dive on self.model."""
+        self.model.asc_desc(0.0, 3.0, 2.0, 0.0, 0.79, 0.0)
+        self.model.const_depth(3.0, 20 * 60, 0.0, 0.79, 0.0)
+        self.model.asc_desc(3.0, 0.0, -1.0, 0.0, 0.79, 0.0)
+
+    def test_disabled(self):
+        """the trace is disabled by default, and nothing is printed."""
+        self.assertIsNone(self.model.trace)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.dive()
+        self.assertEqual(output.getvalue(), "")
+
+    def test_records(self):
+        """each update of the model is recorded."""
+        buffer = TraceBuffer()
+        self.model.trace = buffer
+        self.dive()
+        self.assertEqual([record.event for record in buffer],
+                         ['asc_desc', 'const', 'asc_desc'])
+        records = list(buffer)
+        self.assertEqual((records[1].start, records[1].finish,
+                          records[1].seg_time), (3.0, 3.0, 20 * 60))
+        self.assertEqual((records[2].start, records[2].finish), (3.0, 0.0))
+        self.assertEqual(records[-1].snapshot, self.model.snapshot())
+
+    def test_maxlen(self):
+        """only the last records are kept."""
+        buffer = TraceBuffer(maxlen=2)
+        self.model.trace = buffer
+        self.dive()
+        self.assertEqual([record.event for record in buffer],
+                         ['const', 'asc_desc'])
+        buffer.clear()
+        self.assertEqual(len(buffer), 0)
+
+    def test_copy_not_traced(self):
+        """copies of a traced model are not traced."""
+        buffer = TraceBuffer()
+        self.model.trace = buffer
+        self.model = copy.deepcopy(self.model)
+        self.dive()
+        self.assertEqual(len(buffer), 0)
@@ -0,0 +1,198 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the cache of calculated dives."""
+import os
+import copy
+import tempfile
+from collections import OrderedDict
+
+from dipplanner import settings
+from dipplanner.batch import plan_chain
+from dipplanner.dive import Dive
+from dipplanner.plan_cache import PlanCache, plan_key
+from dipplanner.plan_settings import current_settings
+from dipplanner.segment import SegmentDive
+from dipplanner.tank import Tank
+from dipplanner.model.buhlmann import model as buhlmann_model
+
+from dipplanner.tests.common import TestDive
+
+
+class TestPlanCache(TestDive):
+    """Test the plan cache."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.cache = PlanCache(maxsize=2)
+        self.segments = [SegmentDive(40, 20 * 60, self.airtank, 0)]
+        self.tanks = [self.airtank, self.decoo2]
+
+    def test_same_result(self):
+        """cached dive is the calculated dive."""
+        dive = Dive(*copy.deepcopy((self.segments, self.tanks)))
+        dive.do_dive()
+        first = self.cache.plan(self.segments, self.tanks)
+        second = self.cache.plan(self.segments, self.tanks)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        for cached in (first, second):
+            self.assertEqual(str(cached), str(dive))
+            self.assertEqual(cached.model.ox_tox.otu, dive.model.ox_tox.otu)
+            self.assertEqual(cached.tanks[0].remaining_gas,
+                             dive.tanks[0].remaining_gas)
+        self.assertIsNot(first.output_segments[0],
+                         second.output_segments[0])
+
+    def test_tanks_not_modified(self):
+        """given tanks are not consumed."""
+        self.cache.plan(self.segments, self.tanks)
+        self.assertEqual(self.airtank.used_gas, 0.0)
+
+    def test_key(self):
+        """key changes with the segments, tanks and settings."""
+        key = plan_key(self.segments, self.tanks)
+        self.assertEqual(plan_key(self.segments, self.tanks), key)
+        self.assertEqual(
+            plan_key(self.segments, self.tanks,
+                     plan_settings=current_settings(TEMPLATE="other")),
+            key)
+        self.assertNotEqual(
+            plan_key([SegmentDive(40, 21 * 60, self.airtank, 0)],
+                     self.tanks), key)
+        self.assertNotEqual(plan_key(self.segments, [self.airtank]), key)
+        self.assertNotEqual(
+            plan_key(self.segments, self.tanks,
+                     plan_settings=current_settings(GF_LOW=0.2)), key)
+
+    def test_identical_tanks(self):
+        """identical tanks are not mixed up."""
+        tanks = [Tank(tank_vol=12.0, tank_pressure=200),
+                 Tank(tank_vol=12.0, tank_pressure=200)]
+        first = self.cache.plan([SegmentDive(30, 20 * 60, tanks[0], 0)],
+                                tanks)
+        second = self.cache.plan([SegmentDive(30, 20 * 60, tanks[1], 0)],
+                                 tanks)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertEqual(first.tanks[1].used_gas, 0.0)
+        self.assertEqual(second.tanks[0].used_gas, 0.0)
+        self.assertEqual(second.tanks[1].used_gas, first.tanks[0].used_gas)
+        self.assertEqual(set(second.segment_tank_indexes()), {1})
+
+    def test_lru(self):
+        """least recently used dive is dropped."""
+        for minutes in (20, 21, 20, 22, 20):
+            self.cache.plan([SegmentDive(40, minutes * 60, self.airtank, 0)],
+                            self.tanks)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 3))
+
+    def test_coefficients_change(self):
+        """cache is emptied when the coefficients change."""
+        self.cache.plan(self.segments, self.tanks)
+        saved = buhlmann_model.FIRST_COMPARTMENT_COEFFICIENTS['1b']
+        try:
+            buhlmann_model.FIRST_COMPARTMENT_COEFFICIENTS['1b'] = (
+                saved[:2] + (1.7, ) + saved[3:])
+            self.assertEqual(len(self.cache), 0)
+        finally:
+            buhlmann_model.FIRST_COMPARTMENT_COEFFICIENTS['1b'] = saved
+
+    def test_save_load(self):
+        """cache is saved in a file."""
+        dive = self.cache.plan(self.segments, self.tanks)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "plans.cache")
+            self.cache.save(path)
+            cache = PlanCache(path=path)
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(str(cache.plan(self.segments, self.tanks)),
+                             str(dive))
+            self.assertEqual(cache.hits, 1)
+
+    def test_other_version(self):
+        """file saved by another version is ignored."""
+        self.cache.plan(self.segments, self.tanks)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "plans.cache")
+            self.cache.save(path)
+            saved = settings.__VERSION__
+            try:
+                settings.__VERSION__ = "0.0"
+                self.assertEqual(len(PlanCache(path=path)), 0)
+            finally:
+                settings.__VERSION__ = saved
+            self.assertEqual(len(PlanCache(path=path)), 1)
+
+    def test_unreadable_file(self):
+        """file which can not be unpickled is ignored."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "plans.cache")
+            with open(path, "wb") as cache_file:
+                cache_file.write(b"not a plan cache")
+            self.assertEqual(len(PlanCache(path=path)), 0)
+
+    def test_repetitive_chain(self):
+        """cached repetitive dives are the calculated ones."""
+        chain = [{'tanks': OrderedDict([('airtank', self.airtank)]),
+                  'segments': OrderedDict(
+                      [('segment1', SegmentDive(30, 20 * 60, self.airtank,
+                                                0))]),
+                  'surface_interval': 0},
+                 {'tanks': OrderedDict([('airtank', self.airtank12)]),
+                  'segments': OrderedDict(
+                      [('segment1', SegmentDive(25, 25 * 60,
+                                                self.airtank12, 0))]),
+                  'surface_interval': 60 * 60}]
+        cached = plan_chain(chain, cache=self.cache)
+        cached_again = plan_chain(chain, cache=self.cache)
+        expected = plan_chain(chain)
+        self.assertEqual(self.cache.hits, 2)
+        for dives in (cached, cached_again):
+            self.assertEqual(str(dives[-1]), str(expected[-1]))
+            self.assertEqual(dives[0].output_segments[-1].run_time,
+                             expected[0].output_segments[-1].run_time)
+            # each cached dive keeps the model state of its own end
+            self.assertLess(dives[0].model.ox_tox.otu,
+                            dives[1].model.ox_tox.otu)
+
+    def test_changed_chain(self):
+        """a changed dive: the chain resumes from the previous dive."""
+        def chain(last_time):
+            """Return a chain of 3 repetitive dives."""
+            return [{'tanks': OrderedDict([('airtank', self.airtank)]),
+                     'segments': OrderedDict(
+                         [('segment1', SegmentDive(depth, time,
+                                                   self.airtank, 0))]),
+                     'surface_interval': surface_interval}
+                    for (depth, time, surface_interval) in (
+                        (30, 20 * 60, 0), (25, 20 * 60, 60 * 60),
+                        (20, last_time, 2 * 60 * 60))]
+
+        cache = PlanCache(maxsize=8)
+        plan_chain(chain(20 * 60), cache=cache)
+        self.assertEqual(cache.misses, 3)
+        cached = plan_chain(chain(30 * 60), cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        expected = plan_chain(chain(30 * 60))
+        self.assertEqual(str(cached[-1]), str(expected[-1]))
+        self.assertEqual(cached[-1].model.snapshot(),
+                         expected[-1].model.snapshot())
@@ -0,0 +1,107 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the hard limits of the plans."""
+import copy
+
+from dipplanner.dive import Dive
+from dipplanner.plan_limits import PlanLimits, plan_within_limits
+from dipplanner.segment import SegmentDive
+
+from dipplanner.tests.common import TestDive
+
+
+class TestPlanLimits(TestDive):
+    """Test the plans with limits."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.segments = [SegmentDive(45, 25 * 60, self.airdouble, 0)]
+        self.tanks = [self.airdouble, self.decoo2]
+        self.full_dive = self.new_dive()
+        self.full_dive.do_dive()
+
+    def new_dive(self):
+        """Return a new dive, on copies of the segments and tanks."""
+        return Dive(*copy.deepcopy((self.segments, self.tanks)))
+
+    def check_violation(self, limits, limit):
+        """The limit is violated before the end of the dive."""
+        dive = self.new_dive()
+        violation = plan_within_limits(dive, limits)
+        self.assertIsNotNone(violation)
+        self.assertEqual(violation.limit, limit)
+        self.assertIn(violation, dive.dive_exceptions)
+        self.assertLess(len(dive.output_segments),
+                        len(self.full_dive.output_segments))
+        return violation
+
+    def test_no_violation(self):
+        """without violation, the dive is terminated."""
+        dive = self.new_dive()
+        limits = PlanLimits(max_run_time=self.full_dive.run_time,
+                            max_otu=100, tank_rules=True)
+        self.assertIsNone(plan_within_limits(dive, limits))
+        self.assertEqual(str(dive), str(self.full_dive))
+        self.assertEqual(dive.dive_exceptions, [])
+
+    def test_max_run_time(self):
+        """run time is violated before the surface."""
+        violation = self.check_violation(
+            PlanLimits(max_run_time=self.full_dive.run_time - 60),
+            'max_run_time')
+        self.assertEqual(violation.threshold, self.full_dive.run_time - 60)
+        self.assertGreater(violation.depth, 0)
+
+    def test_max_run_time_bottom(self):
+        """run time is violated at the bottom: no ascent is calculated."""
+        violation = self.check_violation(PlanLimits(max_run_time=28 * 60),
+                                         'max_run_time')
+        self.assertEqual(violation.depth, 45)
+        # bottom time plus the direct ascent
+        self.assertEqual(violation.value, 25 * 60 + 45 * 6)
+
+    def test_max_deco_time(self):
+        """deco time is violated during the deco stops."""
+        violation = self.check_violation(PlanLimits(max_deco_time=5 * 60),
+                                         'max_deco_time')
+        self.assertGreater(violation.value, 5 * 60)
+
+    def test_min_reserve(self):
+        """reserve is violated when the gas is consumed."""
+        remaining = min(tank.remaining_gas for tank in self.full_dive.tanks)
+        violation = self.check_violation(
+            PlanLimits(min_reserve=remaining + 500), 'min_reserve')
+        self.assertLess(violation.value, remaining + 500)
+
+    def test_tank_rules(self):
+        """rule of the tank is violated."""
+        self.segments = [SegmentDive(45, 25 * 60, self.airtank12, 0)]
+        self.tanks = [self.airtank12, self.decoo2]
+        self.full_dive = self.new_dive()
+        self.full_dive.do_dive()
+        self.check_violation(PlanLimits(tank_rules=True), 'tank_rules')
+
+    def test_oxygen_toxicity(self):
+        """oxygen toxicity is violated."""
+        self.check_violation(PlanLimits(max_otu=10), 'max_otu')
+        self.check_violation(PlanLimits(max_cns=0.05), 'max_cns')
@@ -0,0 +1,113 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the per plan settings."""
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+# import here the module / classes to be tested
+from dipplanner.main import activate_debug_for_tests
+
+from dipplanner import settings
+from dipplanner.dive import Dive
+from dipplanner.segment import SegmentDive
+from dipplanner.tank import Tank
+from dipplanner.plan_settings import current_settings
+from dipplanner.tools import altitude_to_pressure, depth_to_pressure
+
+
+class TestPlanSettings(unittest.TestCase):
+    """Test the plan settings object."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+
+    def test_current_settings(self):
+        """plan settings are built from the global settings."""
+        plan_settings = current_settings(GF_LOW=0.1)
+        self.assertEqual(plan_settings.GF_LOW, 0.1)
+        self.assertEqual(plan_settings.GF_HIGH, settings.GF_HIGH)
+        self.assertNotEqual(settings.GF_LOW, 0.1)
+
+    def test_unknown_setting(self):
+        """unknown settings are refused."""
+        self.assertRaises(ValueError, current_settings, GF_LOWW=0.1)
+
+    def test_tools(self):
+        """tools use the given plan settings."""
+        fresh = current_settings(
+            WATER_DENSITY=settings.FRESH_WATER_DENSITY)
+        self.assertLess(depth_to_pressure(10, plan_settings=fresh),
+                        depth_to_pressure(10))
+
+
+class TestPlanSettingsDive(unittest.TestCase):
+    """Test dives planned with different plan settings."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        activate_debug_for_tests()
+
+    @staticmethod
+    def plan(plan_settings=None):
+        """plan a 45m dive, returns the run time and segments."""
+        airtank = Tank(tank_vol=18.0, tank_pressure=200, tank_rule="10b",
+                       plan_settings=plan_settings)
+        dive = Dive([SegmentDive(45, 25 * 60, airtank, 0,
+                                 plan_settings=plan_settings)],
+                    [airtank], plan_settings=plan_settings)
+        dive.do_dive()
+        return (dive.run_time,
+                [str(segment) for segment in dive.output_segments])
+
+    def test_default(self):
+        """current settings give the global settings result."""
+        self.assertEqual(self.plan(current_settings()), self.plan())
+
+    def test_same_as_global(self):
+        """plan settings give the same result as global settings."""
+        gf_low = settings.GF_LOW
+        pressure = settings.AMBIANT_PRESSURE_SURFACE
+        try:
+            settings.GF_LOW = 0.15
+            settings.AMBIANT_PRESSURE_SURFACE = altitude_to_pressure(1500)
+            expected = self.plan()
+        finally:
+            settings.GF_LOW = gf_low
+            settings.AMBIANT_PRESSURE_SURFACE = pressure
+        self.assertEqual(
+            self.plan(current_settings(
+                GF_LOW=0.15,
+                AMBIANT_PRESSURE_SURFACE=altitude_to_pressure(1500))),
+            expected)
+
+    def test_concurrent_plans(self):
+        """plans with different settings can run at the same time."""
+        plans = [current_settings(GF_LOW=gf_low, GF_HIGH=gf_high)
+                 for gf_low, gf_high in ((0.3, 0.8), (0.1, 0.7),
+                                         (0.5, 0.9), (0.2, 0.85))] * 2
+        expected = [self.plan(plan_settings) for plan_settings in plans]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.plan, plans))
+        self.assertEqual(results, expected)
+        self.assertNotEqual(results[0], results[1])
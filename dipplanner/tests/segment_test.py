@@ -21,6 +21,7 @@
 # pylint: disable=too-many-ancestors, attribute-defined-outside-init
 """Test for Segment class."""
 import unittest
+import pickle
 # import here the module / classes to be tested
 from dipplanner.main import activate_debug_for_tests
 
@@ -165,3 +166,14 @@ class TestSegment(unittest.TestCase):
             pass
         else:
             self.fail("should raise UnauthorizedMod")
+
+    def test_slots(self):
+        """segments have no per instance dict."""
+        for segment in (self.diveseg1, self.decoseg1, self.ascseg1):
+            self.assertFalse(hasattr(segment, '__dict__'))
+
+    def test_pickle(self):
+        """segments can be pickled (batch results)."""
+        for segment in (self.diveseg1, self.decoseg1, self.ascseg1):
+            self.assertEqual(str(pickle.loads(pickle.dumps(segment))),
+                             str(segment))
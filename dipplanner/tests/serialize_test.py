@@ -0,0 +1,117 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the machine readable output of the dives."""
+import io
+import csv
+import json
+
+from dipplanner.dipp_exception import DipplannerException
+from dipplanner.dive import Dive
+from dipplanner.segment import SegmentDive
+from dipplanner.serialize import (dive_record, read_binary, write_binary,
+                                  write_csv, write_jsonl)
+
+from dipplanner.tests.common import TestDive
+
+
+class TestSerialize(TestDive):
+    """Test the serializers."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.dives = []
+        for depth in (30, 40):
+            dive = Dive([SegmentDive(depth, 20 * 60, self.airtank, 0)],
+                        [self.airtank, self.decoo2])
+            dive.do_dive_without_exceptions()
+            self.dives.append(dive)
+        self.dives[0].no_flight_time_wo_exception()
+
+    def test_dive_record(self):
+        """record contains the results of the dive."""
+        record = dive_record(self.dives[0])
+        self.assertEqual(record['run_time'], self.dives[0].run_time)
+        self.assertEqual(record['otu'], self.dives[0].model.ox_tox.otu)
+        self.assertEqual(len(record['segments']),
+                         len(self.dives[0].output_segments))
+        self.assertEqual(sorted(tank['gas'] for tank in record['tanks']),
+                         ['Air', 'Oxygen'])
+        self.assertIsNotNone(record['no_flight_time'])
+        self.assertIsNone(record['full_desat_time'])
+        self.assertEqual(record['errors'], [])
+
+    def test_jsonl(self):
+        """one JSON object per dive and per line."""
+        stream = io.StringIO()
+        self.assertEqual(write_jsonl(iter(self.dives), stream), 2)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [dive_record(dive) for dive in self.dives])
+
+    def test_csv_segments(self):
+        """one row per output segment."""
+        stream = io.StringIO(newline='')
+        write_csv(self.dives, stream)
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        self.assertEqual(rows[0][:3], ['dive', 'type', 'depth'])
+        self.assertEqual(len(rows) - 1,
+                         sum(len(dive.output_segments)
+                             for dive in self.dives))
+        self.assertEqual(rows[-1][0], '2')
+        self.assertEqual(float(rows[-1][4]),
+                         self.dives[1].output_segments[-1].run_time)
+
+    def test_csv_tables(self):
+        """tanks and dives tables."""
+        stream = io.StringIO(newline='')
+        write_csv(self.dives, stream, table='tanks')
+        self.assertEqual(len(stream.getvalue().splitlines()), 5)
+        stream = io.StringIO(newline='')
+        write_csv(self.dives, stream, table='dives')
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(float(rows[1][1]), self.dives[0].run_time)
+        with self.assertRaises(DipplannerException):
+            write_csv(self.dives, stream, table='unknown')
+
+    def test_binary(self):
+        """binary records are read back."""
+        dive = Dive([SegmentDive(90, 60 * 60, self.airtank, 0)],
+                    [self.airtank])
+        dive.do_dive_without_exceptions()
+        self.dives.append(dive)
+        stream = io.BytesIO()
+        self.assertEqual(write_binary(self.dives, stream), 3)
+        stream.seek(0)
+        self.assertEqual(list(read_binary(stream)),
+                         [dive_record(dive) for dive in self.dives])
+        self.assertNotEqual(dive_record(dive)['errors'], [])
+
+    def test_binary_errors(self):
+        """invalid and truncated streams."""
+        with self.assertRaises(DipplannerException):
+            list(read_binary(io.BytesIO(b'NONE\x01\x00')))
+        stream = io.BytesIO()
+        write_binary(self.dives, stream)
+        with self.assertRaises(DipplannerException):
+            list(read_binary(io.BytesIO(stream.getvalue()[:-3])))
@@ -0,0 +1,224 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the planning service."""
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from dipplanner.dive import Dive
+from dipplanner.service import PlanningService, plan, no_flight, table
+from dipplanner.segment import SegmentDive
+
+from dipplanner.tests.common import TestDive
+
+
+class TestServiceDive(TestDive):
+    """Request and dive used by the tests of the planning service."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.request = {
+            'tanks': [{'name': 'airtank', 'tank_vol': 18.0,
+                       'tank_pressure': 200, 'tank_rule': '10b'},
+                      {'name': 'decoo2', 'f_o2': 1.0, 'tank_vol': 7.0,
+                       'tank_pressure': 200, 'tank_rule': '10b'}],
+            'segments': [{'depth': 40, 'time': 25 * 60,
+                          'tank': 'airtank'}]}
+        self.dive = Dive([SegmentDive(40, 25 * 60, self.airtank, 0)],
+                         [self.airtank, self.decoo2])
+        self.dive.do_dive()
+
+
+class TestService(TestServiceDive):
+    """Test the request handlers of the planning service."""
+
+    def test_plan(self):
+        """plan gives the results of the dive."""
+        status, result = plan(self.request)
+        self.assertEqual(status, 200)
+        self.assertEqual(result['run_time'], self.dive.run_time)
+        self.assertEqual(result['otu'], self.dive.model.ox_tox.otu)
+        self.assertEqual([segment['run_time']
+                          for segment in result['segments']],
+                         [segment.run_time
+                          for segment in self.dive.output_segments])
+        self.assertEqual([tank['used_gas'] for tank in result['tanks']],
+                         [tank.used_gas for tank in self.dive.tanks])
+        self.assertEqual(result['errors'], [])
+
+    def test_settings(self):
+        """settings of the request are used."""
+        self.request['settings'] = {'GF_LOW': 0.2, 'GF_HIGH': 0.7}
+        self.assertGreater(plan(self.request)[1]['run_time'],
+                           self.dive.run_time)
+
+    def test_identical_tanks(self):
+        """plan on the second of two identical tanks uses this tank."""
+        tank = {'tank_vol': 12.0, 'tank_pressure': 200}
+        request = {'tanks': [dict(tank, name='left'),
+                             dict(tank, name='right')],
+                   'segments': [{'depth': 30, 'time': 20 * 60,
+                                 'tank': 'left'}]}
+        left = plan(request)[1]
+        request['segments'][0]['tank'] = 'right'
+        status, right = plan(request)
+        self.assertEqual(status, 200)
+        self.assertEqual(right['tanks'][0]['used_gas'], 0.0)
+        self.assertEqual(right['tanks'][1]['used_gas'],
+                         left['tanks'][0]['used_gas'])
+
+    def test_no_flight(self):
+        """no_flight gives the no flight and full desat times."""
+        self.request['exact'] = True
+        status, result = no_flight(self.request)
+        self.assertEqual(status, 200)
+        self.assertEqual(result['no_flight_time'],
+                         self.dive.no_flight_time(exact=True))
+        self.assertEqual(result['full_desat_time'],
+                         self.dive.full_desat_time(exact=True))
+
+    def test_table(self):
+        """table gives one result per depth and time."""
+        self.request['depths'] = [30, 40]
+        self.request['times'] = [10 * 60, 25 * 60]
+        status, result = table(self.request)
+        self.assertEqual(status, 200)
+        self.assertEqual([(cell['depth'], cell['time']) for cell in result],
+                         [(30, 600), (30, 1500), (40, 600), (40, 1500)])
+        self.assertEqual(result[3]['run_time'], self.dive.run_time)
+
+    def test_invalid_request(self):
+        """invalid requests are refused."""
+        self.request['segments'][0]['tank'] = 'unknown'
+        self.assertEqual(plan(self.request)[0], 400)
+        self.assertEqual(plan({'tanks': []})[0], 400)
+        self.assertEqual(plan({'tanks': [{'name': 'tank', 'f_o2': 2.0}],
+                               'segments': []})[0], 400)
+        self.assertEqual(plan({'tanks': [], 'segments': [],
+                               'settings': {'UNKNOWN': 1}})[0], 400)
+
+    def test_invalid_settings(self):
+        """settings must have the type of their default value."""
+        for changes in ({'GF_LOW': "x"}, {'GF_LOW': None},
+                        {'RUN_TIME': 1}, {'LAST_STOP_DEPTH': True},
+                        {'TRAVEL_SWITCH': 2}, ['GF_LOW']):
+            self.request['settings'] = changes
+            self.assertEqual(plan(self.request)[0], 400)
+        # numeric settings take any number
+        self.request['settings'] = {'LAST_STOP_DEPTH': 3.0, 'GF_LOW': 1}
+        self.assertEqual(plan(self.request)[0], 200)
+
+    def test_table_too_large(self):
+        """table with too many dives is refused."""
+        self.request['depths'] = list(range(10, 110))
+        self.request['times'] = list(range(60, 60 * 12, 60))
+        status, result = table(self.request)
+        self.assertEqual(status, 400)
+        self.assertIn("too large", result['error'])
+
+
+class TestPlanningService(TestServiceDive):
+    """Test the HTTP server of the planning service."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.service = PlanningService(ThreadPoolExecutor(2))
+        server = self.loop.run_until_complete(self.service.start(port=0))
+        self.port = server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        """Stop the service."""
+        self.loop.run_until_complete(self.service.stop())
+        self.loop.close()
+        super().tearDown()
+
+    async def http(self, method, path, request=None):
+        """Send an HTTP request to the service.
+
+        :returns: (HTTP status, JSON response)
+        """
+        reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                       self.port)
+        body = json.dumps(request).encode('utf-8')
+        writer.write(("%s %s HTTP/1.1\r\nContent-Length: %s\r\n"
+                      "Connection: close\r\n\r\n" % (
+                          method, path, len(body))).encode('latin-1') +
+                     body)
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body.decode('utf-8'))
+
+    def test_http_plan(self):
+        """dive is planned through HTTP."""
+        status, result = self.loop.run_until_complete(
+            self.http("POST", "/plan", self.request))
+        self.assertEqual(status, 200)
+        self.assertEqual(result['run_time'], self.dive.run_time)
+
+    def test_http_errors(self):
+        """HTTP errors."""
+        self.assertEqual(self.loop.run_until_complete(
+            self.http("POST", "/unknown", self.request))[0], 404)
+        self.assertEqual(self.loop.run_until_complete(
+            self.http("GET", "/plan"))[0], 405)
+        self.assertEqual(self.loop.run_until_complete(
+            self.http("POST", "/plan", [1, 2]))[0], 400)
+
+    def test_negative_length(self):
+        """negative Content-Length is refused."""
+        async def send():
+            """Send a request with a negative Content-Length."""
+            reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                           self.port)
+            writer.write(b"POST /plan HTTP/1.1\r\nContent-Length: -1\r\n"
+                         b"\r\n")
+            response = await reader.read()
+            writer.close()
+            return response
+        response = self.loop.run_until_complete(send())
+        self.assertEqual(int(response.split()[1]), 400)
+
+    def test_status(self):
+        """status gives the counters of the service."""
+        status, result = self.loop.run_until_complete(
+            self.http("GET", "/status"))
+        self.assertEqual(status, 200)
+        self.assertEqual(result['requests'], 0)
+
+    def test_coalescing(self):
+        """identical concurrent requests are calculated once."""
+        async def concurrent_calls():
+            """call the service 3 times at once."""
+            return await asyncio.gather(
+                *[self.service.call('/plan', self.request)
+                  for _ in range(3)])
+        results = self.loop.run_until_complete(concurrent_calls())
+        self.assertEqual(self.service.requests, 1)
+        self.assertEqual(self.service.coalesced, 2)
+        self.assertEqual(results[0], results[2])
+        self.loop.run_until_complete(self.service.call('/plan',
+                                                       self.request))
+        self.assertEqual(self.service.requests, 2)
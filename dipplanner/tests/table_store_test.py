@@ -0,0 +1,168 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the table store files."""
+import os
+import tempfile
+
+from dipplanner.dive import Dive
+from dipplanner.dive_table import dive_table
+from dipplanner.plan_settings import current_settings
+from dipplanner.table_store import (TableStore, TableStoreException,
+                                    write_table_store)
+from dipplanner.model.buhlmann import model as buhlmann_model
+from dipplanner.segment import SegmentDive
+
+from dipplanner.tests.common import TestDive
+
+
+class TestTableStore(TestDive):
+    """Test the table store."""
+
+    def setUp(self):
+        """Init of the tests."""
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "table.dipt")
+        self.table = dive_table([30, 40], [10 * 60, 20 * 60],
+                                [self.airtank, self.decoo2])
+        write_table_store(self.path, self.table)
+
+    def tearDown(self):
+        """Clean up the tests."""
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_lookup(self):
+        """stored results are the ones of the dives."""
+        with TableStore(self.path) as store:
+            self.assertEqual(len(store), 4)
+            for (depth, time), dive in self.table.items():
+                result = store.lookup(0.21, 0.0, depth, time, 0.3, 0.8)
+                self.assertEqual(result.run_time, dive.run_time)
+                self.assertEqual(result.otu, dive.model.ox_tox.otu)
+                self.assertEqual(result.cns, dive.model.ox_tox.cns)
+                gases = [(tank.f_o2, tank.f_he) for tank in dive.tanks]
+                self.assertEqual(
+                    result.segments,
+                    [(seg.type, gases.index((seg.tank.f_o2, seg.tank.f_he)),
+                      seg.depth, seg.time, seg.run_time)
+                     for seg in dive.output_segments])
+                self.assertEqual([tank[2] for tank in result.tanks],
+                                 [tank.used_gas for tank in dive.tanks])
+
+    def test_travel_gas(self):
+        """dives with a travel gas are identified by their bottom gas."""
+        table = dive_table([90, 100], [10 * 60, 20 * 60],
+                           [self.txhypo, self.txtravel, self.deco2],
+                           dive_tank=self.txhypo)
+        self.assertEqual(write_table_store(self.path, table), 4)
+        with TableStore(self.path) as store:
+            for (depth, time), dive in table.items():
+                result = store.lookup(0.10, 0.50, depth, time, 0.3, 0.8)
+                self.assertEqual(result.run_time, dive.run_time)
+
+    def test_setpoint(self):
+        """OC and CCR dives are different results."""
+        ccr_table = dive_table([30, 40], [10 * 60, 20 * 60],
+                               [self.airtank, self.decoo2], setpoint=1.3)
+        dives = list(self.table.values()) + list(ccr_table.values())
+        self.assertEqual(write_table_store(self.path, dives), 8)
+        with TableStore(self.path) as store:
+            for table, setpoint in ((self.table, 0.0), (ccr_table, 1.3)):
+                for (depth, time), dive in table.items():
+                    result = store.lookup(0.21, 0.0, depth, time, 0.3, 0.8,
+                                          setpoint)
+                    self.assertEqual(result.run_time, dive.run_time)
+
+    def test_same_key(self):
+        """two dives with the same key are refused."""
+        dives = list(self.table.values())
+        dives.append(dives[0])
+        self.assertRaises(TableStoreException, write_table_store, self.path,
+                          dives)
+
+    def test_multilevel(self):
+        """dives with several bottom segments are refused."""
+        dive = Dive([SegmentDive(30, 10 * 60, self.airtank, 0),
+                     SegmentDive(20, 10 * 60, self.airtank, 0)],
+                    [self.airtank])
+        dive.do_dive()
+        self.assertRaises(TableStoreException, write_table_store, self.path,
+                          [dive])
+
+    def test_missing(self):
+        """unknown dive is not found."""
+        with TableStore(self.path) as store:
+            self.assertIsNone(store.lookup(0.21, 0.0, 35, 10 * 60,
+                                           0.3, 0.8))
+            self.assertIsNone(store.lookup(0.21, 0.0, 40, 20 * 60,
+                                           0.3, 0.85))
+            self.assertIsNone(store.lookup(0.32, 0.0, 50, 30 * 60,
+                                           0.3, 0.8))
+
+    def test_keys_sorted(self):
+        """keys are sorted."""
+        with TableStore(self.path) as store:
+            keys = store.keys()
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(keys[0], (0.21, 0.0, 30.0, 600.0, 0.0, 0.3, 0.8))
+
+    def test_other_settings(self):
+        """file calculated with other settings can not be opened."""
+        self.assertRaises(TableStoreException, TableStore, self.path,
+                          current_settings(DESCENT_RATE=10.0))
+        # gradient factors are part of the keys
+        TableStore(self.path, current_settings(GF_LOW=0.2)).close()
+
+    def test_plan_settings(self):
+        """the digest is the one of the settings of the dives."""
+        plan_settings = current_settings(DESCENT_RATE=10.0)
+        table = dive_table([30], [10 * 60], [self.airtank],
+                           plan_settings=plan_settings)
+        write_table_store(self.path, table)
+        self.assertRaises(TableStoreException, TableStore, self.path)
+        TableStore(self.path, plan_settings).close()
+        # the gradient factors of the dives can be different
+        dives = list(table.values()) + list(dive_table(
+            [40], [10 * 60], [self.airtank],
+            plan_settings=plan_settings._replace(GF_LOW=0.2)).values())
+        self.assertEqual(write_table_store(self.path, dives), 2)
+        # not the other settings
+        dives.extend(self.table.values())
+        self.assertRaises(TableStoreException, write_table_store, self.path,
+                          dives)
+
+    def test_other_coefficients(self):
+        """file calculated with other coefficients can not be opened."""
+        saved = buhlmann_model.FIRST_COMPARTMENT_COEFFICIENTS['1b']
+        try:
+            buhlmann_model.FIRST_COMPARTMENT_COEFFICIENTS['1b'] = (
+                saved[:2] + (1.7, ) + saved[3:])
+            self.assertRaises(TableStoreException, TableStore, self.path)
+        finally:
+            buhlmann_model.FIRST_COMPARTMENT_COEFFICIENTS['1b'] = saved
+
+    def test_not_a_store(self):
+        """other files can not be opened."""
+        with open(self.path, "wb") as store_file:
+            store_file.write(b"not a table store file, at all" * 3)
+        self.assertRaises(TableStoreException, TableStore, self.path)
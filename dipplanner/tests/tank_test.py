@@ -25,7 +25,9 @@ import unittest
 # local imports
 from dipplanner.main import activate_debug_for_tests
 
+from dipplanner import settings
 from dipplanner.tank import Tank, InvalidGas, InvalidTank, InvalidMod
+from dipplanner.tank import GAS_CONSTANT, _mix_coefficients, real_volume
 
 
 class TestTank(unittest.TestCase):
@@ -70,7 +72,7 @@ class TestTankisAir(TestTank):
     def test_tank_info(self):
         """Check str output."""
         self.assertEqual(self.mytank.tank_info,
-                         '12.0l-100.0% (2423.10/2423.10l)',
+                         '12.0l-100.0% (2423.11/2423.11l)',
                          "Wrong Tank infos: %s"
                          % self.mytank.tank_info)
 
@@ -436,7 +438,7 @@ class TestTankVolume2(TestTank):
 
     def test_vol(self):
         """Test volume calc."""
-        self.assertAlmostEqual(self.mytank.total_gas, 4064.6008, 4,
+        self.assertAlmostEqual(self.mytank.total_gas, 4064.6362, 4,
                                'Wrong Tank Volume : %s'
                                % self.mytank.total_gas)
 
@@ -644,20 +646,54 @@ class TestTankRules(TestTank):
     def test_rule_bar_1(self):
         """Check rule rem bars."""
         mytank = Tank(tank_vol=15, tank_pressure=200, tank_rule="50b")
-        self.assertAlmostEqual(mytank.min_gas, 767.5548, 4,
+        self.assertAlmostEqual(mytank.min_gas, 767.5255, 4,
                                "bad Tank rule calculation: %s"
                                % mytank.min_gas)
 
     def test_rule_bar_2(self):
         """Check rule 1/3."""
         mytank = Tank(tank_vol=15, tank_pressure=200, tank_rule="1/3")
-        self.assertAlmostEqual(mytank.min_gas, 1009.62376, 4,
+        self.assertAlmostEqual(mytank.min_gas, 1009.63086, 4,
                                "bad Tank rule calculation: %s"
                                % mytank.min_gas)
 
     def test_rule_bar_3(self):
         """Check rule 1/6."""
         mytank = Tank(tank_vol=15, tank_pressure=200, tank_rule="1/6")
-        self.assertAlmostEqual(mytank.min_gas, 2019.24752, 4,
+        self.assertAlmostEqual(mytank.min_gas, 2019.26173, 4,
                                "bad Tank rule calculation: %s"
                                % mytank.min_gas)
+
+
+class TestTankRealVolume(TestTank):
+    """Test the Van der Waals solver."""
+
+    def test_van_der_waals(self):
+        """quantity of gas solves the Van der Waals equation."""
+        for (f_o2, f_he, pressure) in ((0.21, 0.0, 200), (0.18, 0.45, 230),
+                                       (1.0, 0.0, 200), (0.1, 0.5, 300)):
+            a_gas, b_gas = _mix_coefficients(f_o2, f_he)
+            r_t = GAS_CONSTANT * (273.15 + 15)
+            volume = real_volume(12.0, pressure, f_o2, f_he, 15, 1.0)
+            # expanded at 1 bar: V = nR3T3/(R2T2+a) + nb
+            quantity = volume / (r_t ** 3 / (r_t ** 2 + a_gas) + b_gas)
+            self.assertAlmostEqual(
+                quantity * r_t / (12.0 - quantity * b_gas) -
+                quantity * quantity * a_gas / 144.0, pressure, 9)
+
+    def test_cache(self):
+        """same tanks are calculated once."""
+        real_volume.cache_clear()
+        Tank(tank_vol=12.0, tank_pressure=200)
+        Tank(tank_vol=12.0, tank_pressure=200)
+        info = real_volume.cache_info()
+        # total gas and min gas (default rule: 10b)
+        self.assertEqual((info.hits, info.misses), (2, 2))
+
+    def test_surface_pressure(self):
+        """volume depends on the surface pressure."""
+        self.assertNotEqual(
+            real_volume(12.0, 200, 0.21, 0.0, 15,
+                        settings.AMBIANT_PRESSURE_SURFACE),
+            real_volume(12.0, 200, 0.21, 0.0, 15,
+                        settings.AMBIANT_PRESSURE_SURFACE * 0.8))
@@ -0,0 +1,60 @@
+#
+# Copyright 2011-2016 Thomas Chiroux
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.
+# If not, see <http://www.gnu.org/licenses/gpl.html>
+#
+# This module is part of dipplanner, a Dive planning Tool written in python
+# pylint: disable=too-many-public-methods, protected-access, no-self-use
+# pylint: disable=too-few-public-methods, duplicate-code, invalid-name
+# pylint: disable=too-many-ancestors, attribute-defined-outside-init
+"""Test for the rendering of the dives."""
+import os
+import sys
+import subprocess
+
+from dipplanner import settings
+from dipplanner.dive import Dive
+from dipplanner.segment import SegmentDive
+from dipplanner.templating import get_template, render
+
+from dipplanner.tests.common import TestDive
+
+
+class TestTemplating(TestDive):
+    """Test the rendering of the dives."""
+
+    def test_lazy_import(self):
+        """calculating a dive does not import jinja2."""
+        output = subprocess.check_output(
+            [sys.executable, "-c",
+             "import sys, dipplanner.dive, dipplanner.batch; "
+             "print('jinja2' in sys.modules)"],
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.abspath(__file__)))))
+        self.assertEqual(output.strip(), b"False")
+
+    def test_template_cached(self):
+        """templates are compiled once."""
+        self.assertIs(get_template(settings.TEMPLATE),
+                      get_template(settings.TEMPLATE))
+
+    def test_render(self):
+        """output of a dive is the render of the dive."""
+        dive = Dive([SegmentDive(30, 20 * 60, self.airtank, 0)],
+                    [self.airtank])
+        dive.do_dive()
+        self.assertEqual(dive.output(),
+                         render(settings.TEMPLATE, settings, [dive]))
+        self.assertIn("30", dive.output("default.html"))
@@ -24,7 +24,7 @@ import math
 import re
 
 # local imports
-from dipplanner import settings
+from dipplanner.plan_settings import get_settings
 
 
 def safe_eval_calculator(text_to_eval):
@@ -103,13 +103,16 @@ def seconds_to_hhmmss(seconds):
     return "%02i:%02i:%02i" % (hours, minutes, seconds)
 
 
-def altitude_or_depth_to_absolute_pressure(altitude_or_depth):
+def altitude_or_depth_to_absolute_pressure(altitude_or_depth,
+                                           plan_settings=None):
     """Output absolute pressure for give "depth" in meter.
 
     * If depth is positive it's considered altitude depth
     * If depth is negative it's considered depth in water
 
     :param float altitude_or_depth: in meter
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
     :returns: resulting absolute pressure in bar
     :rtype: float
@@ -117,19 +120,22 @@ def altitude_or_depth_to_absolute_pressure(altitude_or_depth):
     :raises ValueError: if altitude > 10000m
     """
     if altitude_or_depth < 0:
-        return (depth_to_pressure(-altitude_or_depth) +
-                settings.AMBIANT_PRESSURE_SURFACE)
+        return (depth_to_pressure(-altitude_or_depth,
+                                  plan_settings=plan_settings) +
+                get_settings(plan_settings).AMBIANT_PRESSURE_SURFACE)
     else:
-        return altitude_to_pressure(altitude_or_depth)
+        return altitude_to_pressure(altitude_or_depth, plan_settings)
 
 
-def altitude_to_pressure(altitude):
+def altitude_to_pressure(altitude, plan_settings=None):
     """Convert a given altitude in pressure in bar.
 
     uses the formula:
     p = 101325.(1-2.25577.10^-5.h)^5.25588
 
     :param float altitude: current altitude in meter
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
     :returns: resulting pressure in bar
     :rtype: float
@@ -142,10 +148,10 @@ def altitude_to_pressure(altitude):
         raise ValueError("altitude can not higher than 10000m")
 
     return (math.pow(1 - 2.25577 * math.pow(10, -5) * altitude, 5.25588) *
-            settings.AMBIANT_PRESSURE_SEA_LEVEL)
+            get_settings(plan_settings).AMBIANT_PRESSURE_SEA_LEVEL)
 
 
-def depth_to_pressure(depth, method=None):
+def depth_to_pressure(depth, method=None, plan_settings=None):
     """Calculate pressure based on given depth.
 
     depending of choosen mehod (complex or not), the calculation is done
@@ -154,20 +160,23 @@ def depth_to_pressure(depth, method=None):
     :param float depth: in meter
     :param str method: 'complex' for complex method, any other string for
                        simple method.
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
     :returns: depth pressure in bar
     :rtype: float
     """
+    conf = get_settings(plan_settings)
     if method is None:
-        method = settings.METHOD_FOR_DEPTH_CALCULATION
+        method = conf.METHOD_FOR_DEPTH_CALCULATION
     if method == 'complex':
         g = 9.81
-        return settings.WATER_DENSITY * 1E3 * g * float(depth) * 1E-5
+        return conf.WATER_DENSITY * 1E3 * g * float(depth) * 1E-5
     else:
         return depth / 10
 
 
-def pressure_to_depth(pressure, method=None):
+def pressure_to_depth(pressure, method=None, plan_settings=None):
     """Calculate depth based on given pressure.
 
     depending of choosen mehod (complex or not), the calculation is done
@@ -176,15 +185,18 @@ def pressure_to_depth(pressure, method=None):
     :param float pressure: pressure in bar
     :param str method: 'complex' for complex method, any other string for
                        simple method.
+    :param plan_settings: settings of the plan (default: global settings)
+    :type plan_settings: :class:`dipplanner.plan_settings.PlanSettings`
 
     :returns: depth in meter
     :rtype: float
     """
+    conf = get_settings(plan_settings)
     if method is None:
-        method = settings.METHOD_FOR_DEPTH_CALCULATION
+        method = conf.METHOD_FOR_DEPTH_CALCULATION
     if method == 'complex':
         g = 9.81
-        return pressure / (settings.WATER_DENSITY * 1E3 * g * 1E-5)
+        return pressure / (conf.WATER_DENSITY * 1E3 * g * 1E-5)
     else:
         return pressure * 10
 
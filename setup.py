@@ -103,7 +103,9 @@ setup(name='dipplanner',
       url='http://dipplanner.org',
       license='GPLv3',
       entry_points={
-          'console_scripts': ['dipplanner = dipplanner.main:main', ],
+          'console_scripts': ['dipplanner = dipplanner.main:main',
+                              'dipplanner-service = '
+                              'dipplanner.service:main', ],
       },
       packages=find_packages(),
       package_data={'dipplanner': ['RELEASE-VERSION', 'templates/*', ]},